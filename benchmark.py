@@ -0,0 +1,337 @@
+"""Benchmarks every relation type at a range of sizes.
+
+Run `python benchmark.py --help` for the options. The results are
+written as JSON, one record per relation type, size, and operation, so
+that they can be tracked over time. The traversal kernels of
+`traversal.py` are benchmarked on random graphs with the
+`--graph-nodes` option.
+
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import objrelations
+import objrelations2
+from bitmaprelations import bitmapmultidict
+from customabcs import BiMapping
+from relations import bidict, dictofsets, multidict, inversedict
+from relations import invertibledict, bagdict
+from traversal import csrgraph, bfs, khop, reachable, components
+
+def makepairs(n, shape, rng):
+    """Returns a list of `n` distinct pairs of integer IDs with the
+    given shape. Keys and values are drawn from disjoint ranges, and
+    there are about ten values per key (or keys per value) in the
+    shapes that allow it.
+
+    """
+    fan = max(n // 10, 1)
+    if shape == 'onetoone':
+        vals = list(range(n, 2 * n))
+        rng.shuffle(vals)
+        return list(zip(range(n), vals))
+    if shape == 'onetomany':
+        return [(rng.randrange(fan), n + val) for val in range(n)]
+    if shape == 'manytoone':
+        return [(key, n + rng.randrange(fan)) for key in range(n)]
+    pairs = set()
+    while len(pairs) < n:
+        pairs.add((rng.randrange(fan), n + rng.randrange(fan)))
+    pairs = list(pairs)
+    rng.shuffle(pairs)
+    return pairs
+
+class Case():
+    """A relation type under benchmark.
+
+    Attributes:
+        name (str): The name under which results are reported.
+        shape (str): The shape of the pairs it holds.
+        bimapping (bool): Whether it is a one-to-one relation, so that
+            membership is tested on keys rather than pairs.
+        inverse (bool): Whether it has an inverse.
+
+    """
+
+    def __init__(self, name, factory, shape, inverse=True):
+        self.name = name
+        self.factory = factory
+        self.shape = shape
+        self.inverse = inverse
+        self.bimapping = shape == 'onetoone'
+
+    def prepare(self, idpairs):
+        """Returns the pairs to insert, built from the given ID pairs.
+        The time taken is reported as the `prepare` operation, which for
+        object relations measures the creation of the managed objects.
+
+        """
+        return idpairs
+
+    def new(self):
+        """Returns a new, empty relation."""
+        return self.factory()
+
+    def finish(self):
+        """Releases anything created by `prepare`."""
+
+class ManagerCase(Case):
+    """A relation from `objrelations`, whose objects are created by a
+    `Manager`.
+
+    """
+
+    def prepare(self, idpairs):
+        self.manager = objrelations.Manager()
+        objects = {}
+        for pair in idpairs:
+            for elem in pair:
+                if elem not in objects:
+                    objects[elem] = self.manager.make(Entity)
+        return [(objects[key], objects[val]) for key, val in idpairs]
+
+    def new(self):
+        return self.manager.make(self.factory)
+
+    def finish(self):
+        self.manager = None
+
+class ManagedCase(Case):
+    """A relation from `objrelations2`, whose objects are `Managed`."""
+
+    def prepare(self, idpairs):
+        objects = {}
+        for pair in idpairs:
+            for elem in pair:
+                if elem not in objects:
+                    objects[elem] = ManagedEntity()
+        return [(objects[key], objects[val]) for key, val in idpairs]
+
+    def finish(self):
+        objrelations2.Managed.objects.clear()
+
+class Entity():
+    """An object related by the `objrelations` benchmarks."""
+
+class ManagedEntity(objrelations2.Managed):
+    """An object related by the `objrelations2` benchmarks."""
+
+CASES = [
+    Case('bidict', bidict, 'onetoone'),
+    Case('dictofsets', dictofsets, 'manytomany', inverse=False),
+    Case('multidict', multidict, 'manytomany'),
+    Case('bitmapmultidict', bitmapmultidict, 'manytomany'),
+    Case('bagdict', bagdict, 'manytomany'),
+    Case('inversedict', inversedict, 'onetomany'),
+    Case('invertibledict', invertibledict, 'manytoone'),
+    ManagerCase('objrelations.OneToOne', objrelations.OneToOne, 'onetoone'),
+    ManagerCase(
+        'objrelations.ManyToMany', objrelations.ManyToMany, 'manytomany'
+    ),
+    ManagerCase(
+        'objrelations.OneToMany', objrelations.OneToMany, 'onetomany'
+    ),
+    ManagerCase(
+        'objrelations.ManyToOne', objrelations.ManyToOne, 'manytoone'
+    ),
+    ManagedCase(
+        'objrelations2.OneToOne', objrelations2.OneToOne, 'onetoone'
+    ),
+    ManagedCase(
+        'objrelations2.ManyToMany', objrelations2.ManyToMany, 'manytomany'
+    ),
+    ManagedCase(
+        'objrelations2.OneToMany', objrelations2.OneToMany, 'onetomany'
+    ),
+    ManagedCase(
+        'objrelations2.ManyToOne', objrelations2.ManyToOne, 'manytoone'
+    ),
+]
+
+def timed(func, count):
+    """Runs `func` once and returns a result record for `count`
+    operations.
+
+    """
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    return {
+        'ops': count,
+        'seconds': seconds,
+        'ns_per_op': seconds * 1e9 / count if count else None,
+    }
+
+def fill(rel, pairs):
+    for key, val in pairs:
+        rel[key] = val
+
+def lookup(rel, keys):
+    for key in keys:
+        rel[key]
+
+def contains(rel, elems):
+    for elem in elems:
+        elem in rel
+
+def iterate(rel):
+    for elem in rel:
+        pass
+
+def delete(rel, keys):
+    for key in keys:
+        del rel[key]
+
+def measurememory(case, pairs):
+    """Returns the number of bytes allocated while filling a new
+    relation with the given pairs.
+
+    """
+    gc.collect()
+    tracemalloc.start()
+    rel = case.new()
+    fill(rel, pairs)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rel
+    return size
+
+def runcase(case, size, sample, memory, rng):
+    """Benchmarks one relation type at one size and returns a list of
+    result records.
+
+    """
+    idpairs = makepairs(size, case.shape, rng)
+    pairs = []
+    def prepare():
+        pairs.extend(case.prepare(idpairs))
+    results = {'prepare': timed(prepare, size)}
+    picked = rng.sample(pairs, min(sample, len(pairs)))
+    keys = list({key: None for key, _ in picked})
+    vals = list({val: None for _, val in picked})
+    rel = case.new()
+    results['insert'] = timed(lambda: fill(rel, pairs), len(pairs))
+    results['lookup'] = timed(lambda: lookup(rel, keys), len(keys))
+    elems = keys if case.bimapping else picked
+    results['contains'] = timed(lambda: contains(rel, elems), len(elems))
+    if case.inverse:
+        inverse = rel.inverse
+        results['inverse'] = timed(lambda: lookup(inverse, vals), len(vals))
+    results['iterate'] = timed(lambda: iterate(rel), len(rel))
+    if hasattr(rel, 'copy') and not isinstance(rel, BiMapping):
+        results['copy'] = timed(rel.copy, len(rel))
+    allkeys = list(rel.keys())
+    doomed = allkeys[:len(allkeys) // 2]
+    results['delete'] = timed(lambda: delete(rel, doomed), len(doomed))
+    remaining = len(rel)
+    results['clear'] = timed(rel.clear, remaining)
+    if memory:
+        used = measurememory(case, pairs)
+        results['memory'] = {
+            'bytes': used, 'bytes_per_pair': used / len(pairs),
+        }
+    case.finish()
+    return [
+        dict(type=case.name, size=size, op=op, **record)
+        for op, record in results.items()
+    ]
+
+def rungraph(nodes, degree, rng):
+    """Benchmarks the traversal kernels on a random directed graph with
+    the given number of nodes and about `degree` edges per node, and
+    returns a list of result records.
+
+    """
+    edges = nodes * degree
+    pairs = [
+        (rng.randrange(nodes), rng.randrange(nodes)) for _ in range(edges)
+    ]
+    graph = []
+    results = {
+        'csr': timed(lambda: graph.append(csrgraph(pairs)), edges)
+    }
+    graph = graph[0]
+    source = rng.randrange(nodes)
+    target = rng.randrange(nodes)
+    results['bfs'] = timed(lambda: bfs(graph, [source]), edges)
+    results['khop2'] = timed(lambda: khop(graph, [source], 2), 1)
+    results['reachable'] = timed(
+        lambda: reachable(graph, source, target), 1
+    )
+    results['components'] = timed(lambda: components(graph), edges)
+    return [
+        dict(type='traversal', size=nodes, op=op, **record)
+        for op, record in results.items()
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--sizes', type=float, nargs='+', default=[1e3, 1e4, 1e5],
+        help='numbers of pairs, such as 1e3 1e5 1e7 (default: 1e3 1e4 1e5)'
+    )
+    parser.add_argument(
+        '--types', nargs='+', metavar='TYPE',
+        choices=[case.name for case in CASES],
+        help='relation types to benchmark (default: all)'
+    )
+    parser.add_argument(
+        '--sample', type=int, default=100000,
+        help='number of lookups per operation (default: 100000)'
+    )
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help='skip the memory measurement'
+    )
+    parser.add_argument(
+        '--graph-nodes', type=float, nargs='+', default=[],
+        help='numbers of nodes of the random graphs on which to benchmark'
+        ' the traversal kernels, such as 1e6 (default: none)'
+    )
+    parser.add_argument(
+        '--graph-degree', type=int, default=4,
+        help='average number of edges per node (default: 4)'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', default='-',
+        help='file to write the JSON results to (default: stdout)'
+    )
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    results = []
+    for case in CASES:
+        if args.types and case.name not in args.types:
+            continue
+        for size in args.sizes:
+            print('{0} {1:.0e}'.format(case.name, size), file=sys.stderr)
+            results.extend(
+                runcase(case, int(size), args.sample, args.memory, rng)
+            )
+    for nodes in args.graph_nodes:
+        print('traversal {0:.0e}'.format(nodes), file=sys.stderr)
+        results.extend(rungraph(int(nodes), args.graph_degree, rng))
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+if __name__ == '__main__':
+    main()
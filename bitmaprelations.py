@@ -0,0 +1,679 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableSet
+from operator import and_, or_, sub, xor
+from customabcs import MultiMapping
+from relations import dictofsets, multidict
+
+CHUNKBITS = 16
+LOWMASK = (1 << CHUNKBITS) - 1
+BITMAPSIZE = (1 << CHUNKBITS) // 8
+ARRAYMAX = 4096
+SMALLMAX = 32
+SMALLHIGH = (1 << 64 - CHUNKBITS) - 1
+
+def _andnot(x, y):
+    return x & ~y
+
+OPS = {
+    'and': (and_, and_),
+    'or': (or_, or_),
+    'sub': (sub, _andnot),
+    'xor': (xor, xor),
+}
+
+def _isarray(chunk):
+    return type(chunk) is array and chunk.typecode == 'H'
+
+def _isruns(chunk):
+    return type(chunk) is array and chunk.typecode == 'I'
+
+def _wordlows(data):
+    """Yields the positions of the set bits of a bitmap of `BITMAPSIZE`
+    bytes, in ascending order, scanning it a 64-bit word at a time.
+
+    """
+    words = array('Q')
+    words.frombytes(data)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    for pos, word in enumerate(words):
+        if word:
+            base = pos << 6
+            while word:
+                low = word & -word
+                yield base + low.bit_length() - 1
+                word ^= low
+
+def _lows(chunk):
+    """Yields the low bits of the elements of a chunk, in ascending
+    order.
+
+    """
+    if _isarray(chunk):
+        return iter(chunk)
+    if _isruns(chunk):
+        return (
+            low for run in chunk
+            for low in range(run >> CHUNKBITS, (run & LOWMASK) + 1)
+        )
+    return _wordlows(chunk)
+
+def _toint(chunk):
+    """Returns the elements of a chunk as the set bits of an integer."""
+    if type(chunk) is bytearray:
+        return int.from_bytes(chunk, 'little')
+    if _isruns(chunk):
+        bits = 0
+        for run in chunk:
+            start = run >> CHUNKBITS
+            bits |= ((1 << (run & LOWMASK) - start + 1) - 1) << start
+        return bits
+    return int.from_bytes(_tobitmap(chunk), 'little')
+
+def _tobitmap(lows):
+    bitmap = bytearray(BITMAPSIZE)
+    for low in lows:
+        bitmap[low >> 3] |= 1 << (low & 7)
+    return bitmap
+
+def _fromlows(lows, count):
+    """Returns a chunk holding the given sorted low bits, as an array if
+    there are at most `ARRAYMAX` of them, and as a bitmap otherwise.
+
+    """
+    if count <= ARRAYMAX:
+        return array('H', lows)
+    return _tobitmap(lows)
+
+def _fromint(bits):
+    """Returns a chunk holding the set bits of an integer, and their
+    number.
+
+    """
+    count = bits.bit_count()
+    data = bits.to_bytes(BITMAPSIZE, 'little')
+    if count <= ARRAYMAX:
+        return array('H', _wordlows(data)), count
+    return bytearray(data), count
+
+class bitmapset(MutableSet):
+    """A compressed set of non-negative integers, in the style of a
+    roaring bitmap.
+
+    A set of at most `SMALLMAX` integers below 2**64 is a sorted `array`
+    of 8-byte integers. Larger sets are split by the high bits of their
+    elements into chunks of 65536 consecutive integers, each holding the
+    low 16 bits of its elements in the most compact of three containers:
+    a sorted `array` of up to 4096 elements, a bitmap of 8 KiB for
+    denser chunks, or, after `optimize`, a sorted `array` of runs of
+    consecutive elements. An element thus costs at most two bytes,
+    instead of the 50 to 70 bytes of a member of a `set`, and a small
+    set costs a fraction of an empty `set`.
+
+    Membership is a bisection or a bit test within a single chunk.
+    Unions, intersections, differences, and comparisons of bitmapsets
+    combine whole chunks at once, as Python integers, so that the work
+    is done a machine word at a time.
+
+    """
+    __slots__ = ('_small', '_chunks', '_counts', '_len')
+    _structures = ('_small', '_chunks', '_counts')
+
+    def __init__(self, iterable=()):
+        """Creates a bitmapset containing the integers of `iterable`.
+
+        Raises:
+            TypeError: If an element is not an integer.
+            ValueError: If an element is negative.
+
+        """
+        self._small = array('Q')
+        self._chunks = None
+        self._counts = None
+        self._len = 0
+        if isinstance(iterable, bitmapset):
+            if iterable._small is not None:
+                self._small = iterable._small[:]
+                self._len = iterable._len
+                return
+            self._promote()
+            for high, chunk in iterable._chunks.items():
+                self._put(high, chunk[:], iterable._card(high, chunk))
+            return
+        groups = {}
+        for elem in iterable:
+            self._check(elem)
+            groups.setdefault(elem >> CHUNKBITS, set()).add(elem & LOWMASK)
+        count = sum(map(len, groups.values()))
+        if count <= SMALLMAX and max(groups, default=0) <= SMALLHIGH:
+            self._small = array('Q', sorted(
+                high << CHUNKBITS | low
+                for high, lows in groups.items() for low in lows
+            ))
+            self._len = count
+            return
+        self._promote()
+        for high, lows in groups.items():
+            self._put(high, _fromlows(sorted(lows), len(lows)), len(lows))
+
+    @staticmethod
+    def _check(elem):
+        if not isinstance(elem, int):
+            raise TypeError(elem)
+        if elem < 0:
+            raise ValueError(elem)
+
+    def _promote(self):
+        """Moves the elements of a small set into chunks."""
+        small = self._small
+        self._small = None
+        self._chunks = {}
+        self._counts = {}
+        self._len = 0
+        groups = {}
+        for elem in small:
+            groups.setdefault(elem >> CHUNKBITS, []).append(elem & LOWMASK)
+        for high, lows in groups.items():
+            self._put(high, array('H', lows), len(lows))
+
+    def _shrink(self):
+        """Moves the elements of a set split into chunks back into a small
+        set, if there are few enough of them.
+
+        """
+        if (self._small is None and self._len <= SMALLMAX
+            and max(self._chunks, default=0) <= SMALLHIGH
+        ):
+            small = array('Q', self)
+            self._chunks = None
+            self._counts = None
+            self._small = small
+
+    def _card(self, high, chunk):
+        if _isarray(chunk):
+            return len(chunk)
+        return self._counts[high]
+
+    def _put(self, high, chunk, count):
+        self._chunks[high] = chunk
+        if not _isarray(chunk):
+            self._counts[high] = count
+        self._len += count
+
+    def _remove(self, high):
+        self._len -= self._card(high, self._chunks.pop(high))
+        self._counts.pop(high, None)
+
+    def _expand(self, high):
+        """Replaces a run chunk by an array or bitmap chunk, so that it
+        can be modified.
+
+        """
+        chunk = self._chunks[high]
+        count = self._counts.pop(high)
+        self._len -= count
+        self._put(high, _fromlows(_lows(chunk), count), count)
+
+    def __contains__(self, elem):
+        if not isinstance(elem, int) or elem < 0:
+            return False
+        small = self._small
+        if small is not None:
+            pos = bisect_left(small, elem)
+            return pos < len(small) and small[pos] == elem
+        chunk = self._chunks.get(elem >> CHUNKBITS)
+        if chunk is None:
+            return False
+        low = elem & LOWMASK
+        if type(chunk) is bytearray:
+            return bool(chunk[low >> 3] >> (low & 7) & 1)
+        if _isarray(chunk):
+            pos = bisect_left(chunk, low)
+            return pos < len(chunk) and chunk[pos] == low
+        pos = bisect_right(chunk, low << CHUNKBITS | LOWMASK) - 1
+        return pos >= 0 and chunk[pos] & LOWMASK >= low
+
+    def __iter__(self):
+        if self._small is not None:
+            yield from self._small
+            return
+        for high in sorted(self._chunks):
+            base = high << CHUNKBITS
+            for low in _lows(self._chunks[high]):
+                yield base | low
+
+    def __len__(self):
+        return self._len
+
+    def add(self, elem):
+        """Adds the given integer to the set.
+
+        Raises:
+            TypeError: If `elem` is not an integer.
+            ValueError: If `elem` is negative.
+
+        """
+        self._check(elem)
+        small = self._small
+        if small is not None:
+            pos = bisect_left(small, elem)
+            if pos < len(small) and small[pos] == elem:
+                return
+            if len(small) < SMALLMAX and elem >> CHUNKBITS <= SMALLHIGH:
+                small.insert(pos, elem)
+                self._len += 1
+                return
+            self._promote()
+        high = elem >> CHUNKBITS
+        low = elem & LOWMASK
+        chunk = self._chunks.get(high)
+        if chunk is None:
+            self._put(high, array('H', (low,)), 1)
+            return
+        if _isruns(chunk):
+            if elem in self:
+                return
+            self._expand(high)
+            chunk = self._chunks[high]
+        if type(chunk) is bytearray:
+            mask = 1 << (low & 7)
+            if not chunk[low >> 3] & mask:
+                chunk[low >> 3] |= mask
+                self._counts[high] += 1
+                self._len += 1
+            return
+        pos = bisect_left(chunk, low)
+        if pos < len(chunk) and chunk[pos] == low:
+            return
+        chunk.insert(pos, low)
+        self._len += 1
+        if len(chunk) > ARRAYMAX:
+            self._chunks[high] = _tobitmap(chunk)
+            self._counts[high] = len(chunk)
+
+    def discard(self, elem):
+        """Removes the given integer from the set, if present."""
+        if elem not in self:
+            return
+        self._len -= 1
+        if self._small is not None:
+            self._small.pop(bisect_left(self._small, elem))
+            return
+        high = elem >> CHUNKBITS
+        low = elem & LOWMASK
+        if _isruns(self._chunks[high]):
+            self._expand(high)
+        chunk = self._chunks[high]
+        if _isarray(chunk):
+            chunk.pop(bisect_left(chunk, low))
+            if not chunk:
+                del self._chunks[high]
+        else:
+            chunk[low >> 3] &= ~(1 << (low & 7))
+            self._counts[high] -= 1
+            if self._counts[high] <= ARRAYMAX:
+                self._chunks[high] = array('H', _wordlows(chunk))
+                del self._counts[high]
+        if self._len <= SMALLMAX // 2:
+            self._shrink()
+
+    def clear(self):
+        """Removes all elements from the set."""
+        self._small = array('Q')
+        self._chunks = None
+        self._counts = None
+        self._len = 0
+
+    def copy(self):
+        """Creates and returns a copy of the bitmapset."""
+        return bitmapset(self)
+
+    def optimize(self):
+        """Stores each chunk as runs of consecutive elements, if that
+        takes less memory than its array or bitmap, as after adding a
+        range of integers. A run chunk is converted back to an array or
+        bitmap when it is modified. Small sets are left as they are.
+
+        """
+        if self._small is not None:
+            return
+        for high, chunk in list(self._chunks.items()):
+            count = self._card(high, chunk)
+            bits = _toint(chunk)
+            starts = bits & ~(bits << 1)
+            size = 2 * count if count <= ARRAYMAX else BITMAPSIZE
+            if 4 * starts.bit_count() < size:
+                ends = bits & ~(bits >> 1)
+                runs = array('I', (
+                    start << CHUNKBITS | end for start, end in zip(
+                        _wordlows(starts.to_bytes(BITMAPSIZE, 'little')),
+                        _wordlows(ends.to_bytes(BITMAPSIZE, 'little'))
+                    )
+                ))
+            elif _isruns(chunk):
+                runs = _fromint(bits)[0]
+            else:
+                continue
+            self._remove(high)
+            self._put(high, runs, count)
+
+    def _combine(self, other, op):
+        """Returns a new bitmapset combining this one and `other` with
+        the named operation of `OPS`, chunk by chunk.
+
+        """
+        if self._small is not None or other._small is not None:
+            return self._combinesmall(other, op)
+        setop, intop = OPS[op]
+        if op == 'and':
+            highs = self._chunks.keys() & other._chunks.keys()
+        elif op == 'sub':
+            highs = self._chunks.keys()
+        else:
+            highs = self._chunks.keys() | other._chunks.keys()
+        new = bitmapset()
+        new._promote()
+        for high in highs:
+            chunk = self._chunks.get(high)
+            otherchunk = other._chunks.get(high)
+            if otherchunk is None:
+                new._put(high, chunk[:], self._card(high, chunk))
+            elif chunk is None:
+                new._put(high, otherchunk[:], other._card(high, otherchunk))
+            elif _isarray(chunk) and _isarray(otherchunk):
+                lows = setop(set(chunk), set(otherchunk))
+                if lows:
+                    new._put(
+                        high, _fromlows(sorted(lows), len(lows)), len(lows)
+                    )
+            else:
+                bits = intop(_toint(chunk), _toint(otherchunk))
+                if bits:
+                    new._put(high, *_fromint(bits))
+        new._shrink()
+        return new
+
+    def _combinesmall(self, other, op):
+        """Combines two bitmapsets of which at least one is small, by
+        testing or updating the other with the elements of the small one.
+
+        """
+        if op == 'and':
+            small, big = (
+                (self, other) if self._small is not None else (other, self)
+            )
+            return bitmapset(elem for elem in small._small if elem in big)
+        if op == 'sub':
+            if self._small is not None:
+                return bitmapset(
+                    elem for elem in self._small if elem not in other
+                )
+            new = self.copy()
+            for elem in other._small:
+                new.discard(elem)
+            return new
+        big, small = (
+            (self, other) if other._small is not None else (other, self)
+        )
+        new = big.copy()
+        for elem in small._small:
+            if op == 'xor' and elem in new:
+                new.discard(elem)
+            else:
+                new.add(elem)
+        return new
+
+    def _assign(self, other):
+        self._small = other._small
+        self._chunks = other._chunks
+        self._counts = other._counts
+        self._len = other._len
+        return self
+
+    def __and__(self, other):
+        if isinstance(other, bitmapset):
+            return self._combine(other, 'and')
+        return MutableSet.__and__(self, other)
+
+    def __or__(self, other):
+        if isinstance(other, bitmapset):
+            return self._combine(other, 'or')
+        return MutableSet.__or__(self, other)
+
+    def __sub__(self, other):
+        if isinstance(other, bitmapset):
+            return self._combine(other, 'sub')
+        return MutableSet.__sub__(self, other)
+
+    def __xor__(self, other):
+        if isinstance(other, bitmapset):
+            return self._combine(other, 'xor')
+        return MutableSet.__xor__(self, other)
+
+    __rand__ = __and__
+    __ror__ = __or__
+    __rxor__ = __xor__
+
+    def __iand__(self, other):
+        if isinstance(other, bitmapset):
+            return self._assign(self._combine(other, 'and'))
+        return MutableSet.__iand__(self, other)
+
+    def __ior__(self, other):
+        if isinstance(other, bitmapset):
+            return self._assign(self._combine(other, 'or'))
+        return MutableSet.__ior__(self, other)
+
+    def __isub__(self, other):
+        if isinstance(other, bitmapset):
+            return self._assign(self._combine(other, 'sub'))
+        return MutableSet.__isub__(self, other)
+
+    def __ixor__(self, other):
+        if isinstance(other, bitmapset):
+            return self._assign(self._combine(other, 'xor'))
+        return MutableSet.__ixor__(self, other)
+
+    def union(self, *others):
+        """Returns a new bitmapset holding the elements of this set and
+        of all the others.
+
+        """
+        new = self.copy()
+        for other in others:
+            if not isinstance(other, bitmapset):
+                other = bitmapset(other)
+            new |= other
+        return new
+
+    def intersection(self, *others):
+        """Returns a new bitmapset holding the elements common to this set
+        and all the others.
+
+        """
+        new = self.copy()
+        for other in others:
+            if not isinstance(other, bitmapset):
+                other = bitmapset(other)
+            new &= other
+        return new
+
+    def isdisjoint(self, other):
+        if not isinstance(other, bitmapset):
+            return MutableSet.isdisjoint(self, other)
+        if self._small is not None:
+            return not any(elem in other for elem in self._small)
+        if other._small is not None:
+            return not any(elem in self for elem in other._small)
+        for high in self._chunks.keys() & other._chunks.keys():
+            if _toint(self._chunks[high]) & _toint(other._chunks[high]):
+                return False
+        return True
+
+    def __le__(self, other):
+        if not isinstance(other, bitmapset):
+            return MutableSet.__le__(self, other)
+        if len(self) > len(other):
+            return False
+        if self._small is not None or other._small is not None:
+            return all(elem in other for elem in self)
+        for high, chunk in self._chunks.items():
+            otherchunk = other._chunks.get(high)
+            if otherchunk is None:
+                return False
+            if _toint(chunk) & ~_toint(otherchunk):
+                return False
+        return True
+
+    def __ge__(self, other):
+        if not isinstance(other, bitmapset):
+            return MutableSet.__ge__(self, other)
+        return other <= self
+
+    def __eq__(self, other):
+        if not isinstance(other, bitmapset):
+            return MutableSet.__eq__(self, other)
+        if len(self) != len(other):
+            return False
+        if self._small is not None or other._small is not None:
+            return all(elem in other for elem in self)
+        if self._chunks.keys() != other._chunks.keys():
+            return False
+        return all(
+            chunk == other._chunks[high]
+            or _toint(chunk) == _toint(other._chunks[high])
+            for high, chunk in self._chunks.items()
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'bitmapset(' + repr(list(self)) + ')'
+
+class bitmapmultidict(multidict):
+    """A `multidict` of non-negative integers, such as the IDs of a
+    `Manager`, whose sets of values are `bitmapset` objects.
+
+    The sets of values of the keys, and of the keys of the values in the
+    inverse, take at most two bytes per element once they are large, or
+    eight while they are small, and `__getitem__` returns a copy of the
+    bitmapset of a key, so that the values of several keys can be
+    combined and compared a machine word at a time, as in
+    `rel[a] & rel[b]`. Unlike a `multidict`, a `bitmapmultidict` keeps
+    no sets of pairs: a pair is looked up in the bitmapset of its key,
+    and its number of pairs is counted as they are added and removed.
+
+    """
+    _structures = ('_forward', '_backward')
+
+    def __init__(self):
+        """Constructs an empty bitmapmultidict."""
+        self._forward = dictofsets(bitmapset)
+        self._backward = dictofsets(bitmapset)
+        self._size = [0]
+        self._listeners = []
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+        except (TypeError, ValueError):
+            return False
+        vals = self._forward._dict.get(key)
+        return vals is not None and val in vals
+
+    def __iter__(self):
+        for key, vals in self._forward._dict.items():
+            for val in vals:
+                yield key, val
+
+    def __len__(self):
+        return self._size[0]
+
+    def discard(self, elem):
+        """Removes the given key-value pair, if present.
+
+        Args:
+            elem (2-tuple): The key-value pair to discard.
+
+        """
+        if elem in self:
+            key, val = elem
+            self._forward.discard((key, val))
+            self._backward.discard((val, key))
+            self._size[0] -= 1
+            if self._listeners:
+                self._pairremoved(key, val)
+
+    def __getitem__(self, key):
+        vals = self._forward._dict.get(key)
+        if not vals:
+            raise KeyError(key)
+        return vals.copy()
+
+    def __setitem__(self, key, val):
+        bitmapset._check(key)
+        bitmapset._check(val)
+        if (key, val) in self:
+            return
+        self._forward._dict[key].add(val)
+        self._backward._dict[val].add(key)
+        self._size[0] += 1
+        if self._listeners:
+            self._pairadded(key, val)
+
+    def update(self, *others):
+        """Adds all pairs from the given relations, or iterables of
+        pairs. Unless the bitmapmultidict has listeners, the pairs are
+        added directly to its bitmapsets.
+
+        """
+        if self._listeners:
+            return MultiMapping.update(self, *others)
+        forward = self._forward._dict
+        backward = self._backward._dict
+        check = bitmapset._check
+        size = self._size
+        for other in others:
+            for key, val in other:
+                check(key)
+                check(val)
+                vals = forward[key]
+                if val not in vals:
+                    vals.add(val)
+                    backward[val].add(key)
+                    size[0] += 1
+
+    def optimize(self):
+        """Compresses the runs of consecutive values and keys. See
+        `bitmapset.optimize`.
+
+        """
+        for vals in self._forward._dict.values():
+            vals.optimize()
+        for keys in self._backward._dict.values():
+            keys.optimize()
+
+    def __inverse__(self):
+        inverse = bitmapmultidict()
+        return self._inverseinit(inverse)
+
+    def _inverseinit(self, inverse):
+        inverse._forward = self._backward
+        inverse._backward = self._forward
+        inverse._size = self._size
+        inverse._listeners = self._listeners
+        inverse._isinverse = True
+        return inverse
+
+    def copy(self):
+        """Creates and returns a copy of the bitmapmultidict object."""
+        new = bitmapmultidict()
+        new.update(self)
+        return new
+
+    def __repr__(self):
+        return 'bitmapmultidict(' + repr(
+            {key: set(vals) for key, vals in self._forward._dict.items()}
+        ) + ')'
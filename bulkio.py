@@ -0,0 +1,135 @@
+"""Streams relations to and from CSV and JSON Lines files.
+
+A CSV file holds one pair per row, as a key column and a value column,
+optionally preceded by a header row. A JSON Lines file holds one pair
+per line, as an object with `key` and `val` members. An empty CSV field
+and a JSON null both stand for None.
+
+Pairs are read and written in chunks, so that the memory used does not
+depend on the size of the file or of the relation. The relations of a
+`Manager` are read and written as pairs of object IDs.
+
+"""
+import csv
+import json
+from itertools import islice
+from customabcs import BiMapping
+from objrelations import Relation
+
+FORMATS = ('csv', 'jsonl')
+
+def _convert(elem, type_):
+    return None if elem is None or elem == '' else type_(elem)
+
+def readchunks(file, format='csv', chunksize=10000, header=True,
+               keytype=int, valtype=int):
+    """Yields the pairs of a relation file in lists of at most
+    `chunksize` pairs.
+
+    Args:
+        file (file): The file to read, opened in text mode (with
+            `newline=''` for CSV).
+        format (str): Either `'csv'` or `'jsonl'`.
+        chunksize (int): The maximum number of pairs per chunk.
+        header (bool): Whether the first row of a CSV file is a header
+            to skip.
+        keytype, valtype (callable): The functions converting the keys
+            and values read, such as `int` for object IDs or `str`.
+
+    """
+    if format not in FORMATS:
+        raise ValueError(format)
+    if format == 'csv':
+        rows = csv.reader(file)
+        if header:
+            next(rows, None)
+    else:
+        rows = (
+            (record['key'], record['val'])
+            for record in map(json.loads, filter(str.strip, file))
+        )
+    while True:
+        chunk = [
+            (_convert(key, keytype), _convert(val, valtype))
+            for key, val in islice(rows, chunksize)
+        ]
+        if not chunk:
+            return
+        yield chunk
+
+def load(rel, file, format='csv', chunksize=10000, header=True,
+         keytype=int, valtype=int):
+    """Adds the pairs of a relation file to a relation, one chunk at a
+    time, and returns the number of pairs read.
+
+    Each chunk is added with the `update` method of the relation, which
+    is its bulk insertion path. For a relation of a `Manager`, the chunk
+    of IDs is added with `Relation.updateids`, which passes it to the
+    `update` method of the map, resolving the IDs to objects only for
+    relations that override `validate`.
+
+    The arguments are the same as for `readchunks`.
+
+    """
+    count = 0
+    for chunk in readchunks(
+        file, format, chunksize, header, keytype, valtype
+    ):
+        if isinstance(rel, Relation):
+            rel.updateids(chunk)
+        else:
+            rel.update(chunk)
+        count += len(chunk)
+    return count
+
+def _pairs(rel):
+    """Returns an iterator over the pairs of a relation, or over the
+    pairs of IDs of a relation of a `Manager`.
+
+    """
+    if isinstance(rel, Relation):
+        return rel._idpairs()
+    if isinstance(rel, BiMapping):
+        return iter(rel.items())
+    return iter(rel)
+
+def dump(rel, file, format='csv', chunksize=10000, header=True):
+    """Writes the pairs of a relation to a file, one chunk at a time, and
+    returns the number of pairs written.
+
+    The pairs are read from the relation as it stores them, without
+    building a list of them, so the relation must not be modified while
+    it is written.
+
+    Args:
+        rel (BiMapping or MultiMapping): The relation to write.
+        file (file): The file to write, opened in text mode (with
+            `newline=''` for CSV).
+        format (str): Either `'csv'` or `'jsonl'`.
+        chunksize (int): The number of pairs written at once.
+        header (bool): Whether to write a header row to a CSV file.
+
+    """
+    if format not in FORMATS:
+        raise ValueError(format)
+    pairs = _pairs(rel)
+    count = 0
+    if format == 'csv':
+        writer = csv.writer(file)
+        if header:
+            writer.writerow(('key', 'val'))
+        while True:
+            chunk = list(islice(pairs, chunksize))
+            if not chunk:
+                return count
+            writer.writerows(chunk)
+            count += len(chunk)
+    while True:
+        chunk = list(islice(pairs, chunksize))
+        if not chunk:
+            return count
+        file.write(''.join(
+            json.dumps({'key': key, 'val': val}) + '\n'
+            for key, val in chunk
+        ))
+        count += len(chunk)
@@ -0,0 +1,217 @@
+"""Tracks the changes to a relation, so that they can be replicated."""
+from array import array
+
+def columns(pairs):
+    """Splits a list of key-value pairs into a sequence of keys and a
+    sequence of values. If they are all integers that fit in 64 bits,
+    the sequences are packed arrays. Otherwise, they are lists.
+
+    """
+    keys = [key for key, _ in pairs]
+    vals = [val for _, val in pairs]
+    if all(type(elem) is int for elem in keys + vals):
+        try:
+            return array('q', keys), array('q', vals)
+        except OverflowError:
+            pass
+    return keys, vals
+
+class Patch():
+    """The net changes to a mapping between two versions, as returned by
+    `Trackable.diff` and accepted by `Trackable.apply`.
+
+    A pair that was added and then removed again (or removed and then
+    added again) between the two versions does not appear in the added
+    or removed pairs. The pairs of a mapping counting copies, such as
+    `bagdict`, whose number of copies changed also appear in the counted
+    pairs, with their number of copies at `version`.
+
+    Attributes:
+        since (int): The version the patch starts from.
+        version (int): The version the patch leads to.
+        addedkeys, addedvals (sequence): The keys and values of the
+            added pairs, as returned by `columns`.
+        removedkeys, removedvals (sequence): The keys and values of the
+            removed pairs, as returned by `columns`.
+        countedkeys, countedvals (sequence): The keys and values of the
+            counted pairs, as returned by `columns`.
+        counts (array of int): The number of copies of each counted
+            pair.
+
+    """
+
+    def __init__(self, since, version, added, removed, counted=None):
+        """Creates a patch from the lists of added and removed pairs, and
+        the dictionary mapping each counted pair to its count.
+
+        """
+        counted = counted or {}
+        self.since = since
+        self.version = version
+        self.addedkeys, self.addedvals = columns(added)
+        self.removedkeys, self.removedvals = columns(removed)
+        self.countedkeys, self.countedvals = columns(list(counted))
+        self.counts = array('q', counted.values())
+
+    def __len__(self):
+        return (
+            len(self.addedkeys) + len(self.removedkeys) + len(self.counts)
+        )
+
+    def inverted(self):
+        """Returns the same patch for the inverse mapping, with the keys
+        and values swapped.
+
+        """
+        patch = Patch.__new__(Patch)
+        patch.since = self.since
+        patch.version = self.version
+        patch.addedkeys, patch.addedvals = self.addedvals, self.addedkeys
+        patch.removedkeys = self.removedvals
+        patch.removedvals = self.removedkeys
+        patch.countedkeys = self.countedvals
+        patch.countedvals = self.countedkeys
+        patch.counts = self.counts
+        return patch
+
+    def __repr__(self):
+        return 'Patch({0}, {1}, added={2}, removed={3}, counts={4})'.format(
+            self.since, self.version,
+            list(zip(self.addedkeys, self.addedvals)),
+            list(zip(self.removedkeys, self.removedvals)),
+            dict(zip(zip(self.countedkeys, self.countedvals), self.counts))
+        )
+
+class Changelog():
+    """A listener recording the changes to a mapping, for `diff`.
+
+    Every change increments the version of the mapping, and is appended
+    to a log, so that the changes since a given version are found
+    without scanning the mapping, in time proportional to their number.
+    A change in the number of copies of a pair, reported by
+    `paircounted`, is a change of its own, logged with the new count
+    in place of whether the pair was added.
+
+    Attributes:
+        version (int): The number of changes recorded.
+        floor (int): The oldest version from which changes can be
+            computed. The changes up to it have been discarded by
+            `trim`.
+
+    """
+
+    def __init__(self):
+        """Creates a Changelog object at version 0."""
+        self.version = 0
+        self.floor = 0
+        self._log = []
+
+    def pairadded(self, key, val):
+        self._log.append(((key, val), True))
+        self.version += 1
+
+    def pairremoved(self, key, val):
+        self._log.append(((key, val), False))
+        self.version += 1
+
+    def paircounted(self, key, val, old, new):
+        self._log.append(((key, val), new))
+        self.version += 1
+
+    def diff(self, since):
+        """Returns the `Patch` leading from version `since` to the
+        current version. Raises a ValueError if `since` is older than
+        `floor` or newer than `version`.
+
+        """
+        if not self.floor <= since <= self.version:
+            raise ValueError(since)
+        first = {}
+        last = {}
+        counted = {}
+        for pair, change in self._log[since - self.floor:]:
+            if change is True or change is False:
+                first.setdefault(pair, change)
+                last[pair] = change
+            else:
+                counted[pair] = change
+        added, removed = [], []
+        for pair, isadd in last.items():
+            if first[pair] == isadd:
+                (added if isadd else removed).append(pair)
+        return Patch(since, self.version, added, removed, counted)
+
+    def trim(self, version):
+        """Discards the changes up to the given version, which can no
+        longer be diffed from.
+
+        """
+        if not self.floor <= version <= self.version:
+            raise ValueError(version)
+        del self._log[:version - self.floor]
+        self.floor = version
+
+class Trackable():
+    """A mixin for `Observable` mappings whose changes can be tracked with
+    `track`, and replicated to another mapping with `diff` and `apply`.
+    The changes are recorded by a `Changelog` listener shared by the
+    mapping and its inverse.
+
+    """
+
+    def track(self):
+        """Starts recording the changes to the mapping and its inverse,
+        if not already recording, and returns the current version.
+
+        """
+        return self._shared(Changelog, True)[1].version
+
+    @property
+    def version(self):
+        """The number of changes recorded since `track` was first
+        called, or None if changes are not tracked.
+
+        """
+        log = self._shared(Changelog)[1]
+        return None if log is None else log.version
+
+    def diff(self, since):
+        """Returns the `Patch` holding the net changes to the mapping
+        since the given version, in time proportional to the number of
+        changes. Raises a ValueError if changes are not tracked, or if
+        `since` has been trimmed.
+
+        """
+        owner, log = self._shared(Changelog)
+        if log is None:
+            raise ValueError('changes are not tracked')
+        patch = log.diff(since)
+        return patch if owner is self else patch.inverted()
+
+    def apply(self, patch):
+        """Applies a `Patch` computed by `diff` on another mapping,
+        removing its removed pairs and then adding its added pairs. A
+        mapping counting copies, such as `bagdict`, then sets the number
+        of copies of the counted pairs.
+
+        """
+        for key, val in zip(patch.removedkeys, patch.removedvals):
+            self._discardpair(key, val)
+        for key, val in zip(patch.addedkeys, patch.addedvals):
+            self[key] = val
+        setcount = getattr(self, '_setcount', None)
+        if setcount is not None:
+            for key, val, count in zip(
+                patch.countedkeys, patch.countedvals, patch.counts
+            ):
+                setcount(key, val, count)
+
+    def trim(self, version):
+        """Discards the changes recorded up to the given version, once no
+        replica needs to be diffed from an older version.
+
+        """
+        owner, log = self._shared(Changelog)
+        if log is None:
+            raise ValueError('changes are not tracked')
+        log.trim(version)
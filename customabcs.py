@@ -1,5 +1,95 @@
 from collections.abc import MutableMapping, Collection
 
+class Observable():
+    """A mixin for invertible mappings that notify listeners of changes.
+
+    A listener is any object with `pairadded` and `pairremoved` methods,
+    each taking a key and a value. The listener is notified whenever a
+    key-value pair is added to or removed from the mapping, whether the
+    change is made through the mapping itself or through its inverse.
+    In the latter case, the key and value are swapped, so that every
+    listener sees the pairs oriented as in the mapping on which it was
+    registered.
+
+    Subclasses must create the list `_listeners` when they are
+    constructed, share it with their inverse, and call `_pairadded` and
+    `_pairremoved` whenever they add or remove a pair. Callers should
+    check that `_listeners` is nonempty before calling them, so that
+    mappings without listeners pay nothing for this mixin.
+
+    Mappings holding several copies of a pair, such as `bagdict`, also
+    call `_paircounted` whenever the number of copies of a pair changes,
+    including when the pair is added or removed. It notifies only the
+    listeners with a `paircounted` method, taking a key, a value, and
+    the old and new numbers of copies.
+
+    The features built on listeners are further mixins, each in a
+    module of its own, which the relation types that support them
+    inherit along with `Observable`:
+
+    * `expiry.Expirable`: Pairs with a time to live.
+    * `changelog.Trackable`: Change tracking and replication.
+    * `degrees.DegreeIndexed`: Degree histograms and top-k queries.
+    * `history.Versionable`: Reads of past versions.
+    * `edgeattributes.Attributable`: Attributes of the pairs.
+
+    """
+
+    def addlistener(self, listener):
+        """Registers the given listener on the mapping."""
+        self._listeners.append((self, listener))
+
+    def removelistener(self, listener):
+        """Unregisters the given listener. Raises a ValueError if it is
+        not registered on the mapping.
+
+        """
+        for pos, (owner, other) in enumerate(self._listeners):
+            if owner is self and other is listener:
+                del self._listeners[pos]
+                return
+        raise ValueError(listener)
+
+    def _shared(self, cls, create=False):
+        """Returns the listener of type `cls` registered on the mapping
+        or its inverse, and the mapping on which it is registered. If
+        there is none, a new one is registered on this mapping if
+        `create` is true, and `(None, None)` is returned otherwise.
+
+        """
+        for owner, listener in self._listeners:
+            if isinstance(listener, cls):
+                return owner, listener
+        if not create:
+            return None, None
+        listener = cls()
+        self.addlistener(listener)
+        return self, listener
+
+    def _pairadded(self, key, val):
+        for owner, listener in self._listeners:
+            if owner is self:
+                listener.pairadded(key, val)
+            else:
+                listener.pairadded(val, key)
+
+    def _pairremoved(self, key, val):
+        for owner, listener in self._listeners:
+            if owner is self:
+                listener.pairremoved(key, val)
+            else:
+                listener.pairremoved(val, key)
+
+    def _paircounted(self, key, val, old, new):
+        for owner, listener in self._listeners:
+            paircounted = getattr(listener, 'paircounted', None)
+            if paircounted is None:
+                continue
+            if owner is self:
+                paircounted(key, val, old, new)
+            else:
+                paircounted(val, key, old, new)
+
 class BiMapping(MutableMapping):
     """An abstract base class for one-to-one mappings.
 
@@ -19,6 +109,7 @@ class BiMapping(MutableMapping):
     that is already assigned to a different key.
 
     """
+    _single = True
     @property
     def inverse(self):
         """The inverse bi-mapping."""
@@ -54,6 +145,13 @@ class BiMapping(MutableMapping):
     def __inverse__(self):
         raise NotImplementedError
 
+    def _discardpair(self, key, val):
+        if key in self and self[key] == val:
+            del self[key]
+
+    def _allpairs(self):
+        return self.items()
+
 class RelSet(Collection):
     """A relational set.
 
@@ -189,7 +287,12 @@ class MultiMapping(MutableRelSet):
     although `clear` and `update` are also used for dictionaries and
     function the same.
 
+    Subclasses whose `__getitem__` returns the single value of a key,
+    rather than a set of values, should set the class attribute
+    `_single` to True.
+
     """
+    _single = False
 
     @property
     def inverse(self):
@@ -246,3 +349,9 @@ class MultiMapping(MutableRelSet):
     def values(self):
         """`m.values()` is equivalent to `m.inverse.keys()`."""
         return self.inverse.keys()
+
+    def _discardpair(self, key, val):
+        self.discard((key, val))
+
+    def _allpairs(self):
+        return iter(self)
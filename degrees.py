@@ -0,0 +1,134 @@
+"""Maintains the degrees of the keys and values of a relation."""
+
+class DegreeTable():
+    """The number of pairs of each key of a mapping, grouped by degree.
+
+    Attributes:
+        degrees (dict): A dictionary mapping each key to its number of
+            pairs.
+        buckets (dict of int:set): A dictionary mapping each degree to
+            the set of keys with that degree.
+
+    """
+
+    def __init__(self):
+        """Creates an empty DegreeTable."""
+        self.degrees = {}
+        self.buckets = {}
+
+    def increment(self, key):
+        """Adds one to the degree of the given key."""
+        degree = self.degrees.get(key, 0)
+        if degree:
+            self._leave(key, degree)
+        self.degrees[key] = degree + 1
+        self.buckets.setdefault(degree + 1, set()).add(key)
+
+    def decrement(self, key):
+        """Subtracts one from the degree of the given key."""
+        degree = self.degrees[key]
+        self._leave(key, degree)
+        if degree == 1:
+            del self.degrees[key]
+        else:
+            self.degrees[key] = degree - 1
+            self.buckets.setdefault(degree - 1, set()).add(key)
+
+    def _leave(self, key, degree):
+        bucket = self.buckets[degree]
+        bucket.discard(key)
+        if not bucket:
+            del self.buckets[degree]
+
+    def histogram(self):
+        """Returns a dictionary mapping each degree to the number of keys
+        with that degree.
+
+        """
+        return {
+            degree: len(bucket)
+            for degree, bucket in sorted(self.buckets.items())
+        }
+
+    def top(self, k):
+        """Returns a list of the `k` keys with the highest degrees, as
+        `(key, degree)` tuples, in decreasing order of degree. Ties are
+        broken arbitrarily.
+
+        """
+        top = []
+        for degree in sorted(self.buckets, reverse=True):
+            for key in self.buckets[degree]:
+                if len(top) == k:
+                    return top
+                top.append((key, degree))
+        return top
+
+class Degrees():
+    """A listener maintaining a `DegreeTable` for the keys of a mapping
+    and another for its values.
+
+    Attributes:
+        tables (2-tuple of DegreeTable): The degrees of the keys and of
+            the values.
+
+    """
+
+    def __init__(self):
+        """Creates a Degrees object with empty tables."""
+        self.tables = (DegreeTable(), DegreeTable())
+
+    def pairadded(self, key, val):
+        self.tables[0].increment(key)
+        self.tables[1].increment(val)
+
+    def pairremoved(self, key, val):
+        self.tables[0].decrement(key)
+        self.tables[1].decrement(val)
+
+class DegreeIndexed():
+    """A mixin for `Observable` mappings answering degree queries with
+    `degree_histogram`, `top_k_keys`, and `top_k_values`. The degrees of
+    the keys and values are maintained by a `Degrees` listener, created
+    the first time they are queried.
+
+    """
+
+    def _degreetables(self):
+        """Returns the degree tables of the keys and of the values of the
+        mapping, creating a `Degrees` listener from the current pairs if
+        there is none.
+
+        """
+        owner, degrees = self._shared(Degrees)
+        if degrees is None:
+            owner, degrees = self, Degrees()
+            for key, val in self._allpairs():
+                degrees.pairadded(key, val)
+            self.addlistener(degrees)
+        if owner is self:
+            return degrees.tables
+        return degrees.tables[::-1]
+
+    def degree_histogram(self):
+        """Returns a dictionary mapping each degree to the number of keys
+        with that many values. The degrees are maintained incrementally
+        once this method, `top_k_keys`, or `top_k_values` has been
+        called.
+
+        """
+        return self._degreetables()[0].histogram()
+
+    def top_k_keys(self, k):
+        """Returns a list of the `k` keys with the most values, as
+        `(key, degree)` tuples in decreasing order of degree.
+
+        """
+        return self._degreetables()[0].top(k)
+
+    def top_k_values(self, k):
+        """Returns a list of the `k` values with the most keys, as
+        `(value, degree)` tuples in decreasing order of degree.
+
+        """
+        return self._degreetables()[1].top(k)
@@ -0,0 +1,548 @@
+import sqlite3
+from collections import OrderedDict
+from collections.abc import Set
+from itertools import chain, groupby
+from changelog import Trackable
+from customabcs import BiMapping, MultiMapping, Observable
+from degrees import DegreeIndexed
+from edgeattributes import Attributable
+from expiry import Expirable
+from history import Versionable
+from relations import memoryusage
+
+COLUMNS = ('key', 'val')
+PAGESIZE = 1000
+_EMPTY = frozenset()
+
+class sqlitestore():
+    """The on-disk storage shared by a disk relation and its inverse.
+
+    The key-value pairs are stored as the rows of a single sqlite table,
+    indexed both by key and by value, so that the forward and backward
+    lookups are both indexed. Lookups are made through a pair of bounded
+    LRU caches of adjacency sets, one for each direction, and writes are
+    applied to the caches immediately but buffered and written to the
+    table in batches. The elements found to have no pairs are remembered
+    in a separate bounded set for each direction, so that lookups of
+    absent elements neither query the table again nor evict the cached
+    adjacency sets.
+
+    The store does not check whether a pair is already present before
+    adding it or absent before removing it. That is the job of the
+    relations using it. It keeps the number of pairs up to date as they
+    are added and removed, counting the rows of the table only when it
+    is opened, so the table should not be written to by another store
+    while it is open.
+
+    Iterations read the table in pages of `PAGESIZE` rows, each by a
+    query of its own that resumes after the last row read, so that
+    neither the whole table nor an open statement is held in between.
+
+    Attributes:
+        connection (sqlite3.Connection): The connection to the database.
+        table (str): The name of the table holding the pairs.
+        cachesize (int): The maximum number of adjacency sets to keep in
+            each cache.
+        batchsize (int): The number of buffered writes that triggers a
+            write-back.
+        caches (2-tuple of OrderedDict): The forward and backward caches,
+            mapping a key (or value) to the set of its values (or keys).
+        misses (2-tuple of OrderedDict): The keys and the values known
+            to have no pairs, as the keys of insertion-ordered
+            dictionaries, the oldest first.
+        pending (list of 3-tuple): The buffered writes, as tuples
+            `(isadd, key, val)`.
+        size (int): The number of pairs, including the buffered writes.
+
+    """
+    _structures = ('caches', 'misses', 'pending')
+
+    def __init__(self, path, table, cachesize, batchsize):
+        """Opens the database at `path` and creates the table and its
+        indexes if they do not exist.
+
+        """
+        self.connection = sqlite3.connect(path)
+        self.table = table
+        self.cachesize = cachesize
+        self.batchsize = batchsize
+        self.caches = (OrderedDict(), OrderedDict())
+        self.misses = (OrderedDict(), OrderedDict())
+        self.pending = []
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS "{0}" (key, val)'.format(table)
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS "{0}_forward" ON "{0}" (key, val)'
+            .format(table)
+        )
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS "{0}_backward" ON "{0}" (val, key)'
+            .format(table)
+        )
+        self.connection.commit()
+        self.size = self.connection.execute(
+            'SELECT COUNT(*) FROM "{0}"'.format(table)
+        ).fetchone()[0]
+
+    def lookup(self, side, elem):
+        """Returns the adjacency set of `elem`. If `side` is 0, this is
+        the set of values of the key `elem`, and if `side` is 1, it is
+        the set of keys of the value `elem`. The set should not be
+        modified.
+
+        """
+        cache = self.caches[side]
+        try:
+            adjacent = cache[elem]
+        except KeyError:
+            pass
+        else:
+            cache.move_to_end(elem)
+            return adjacent
+        misses = self.misses[side]
+        if elem in misses:
+            return _EMPTY
+        self.flush()
+        rows = self.connection.execute(
+            'SELECT {1} FROM "{2}" WHERE {0} IS ?'.format(
+                COLUMNS[side], COLUMNS[1 - side], self.table
+            ),
+            (elem,)
+        )
+        adjacent = {row[0] for row in rows}
+        if not adjacent:
+            misses[elem] = None
+            if len(misses) > self.cachesize:
+                misses.popitem(last=False)
+            return _EMPTY
+        cache[elem] = adjacent
+        if len(cache) > self.cachesize:
+            cache.popitem(last=False)
+        return adjacent
+
+    def add(self, key, val):
+        """Adds the given pair, which must not be present."""
+        self.misses[0].pop(key, None)
+        self.misses[1].pop(val, None)
+        if key in self.caches[0]:
+            self.caches[0][key].add(val)
+        if val in self.caches[1]:
+            self.caches[1][val].add(key)
+        self.size += 1
+        self._write(True, key, val)
+
+    def remove(self, key, val):
+        """Removes the given pair, which must be present."""
+        if key in self.caches[0]:
+            self.caches[0][key].discard(val)
+        if val in self.caches[1]:
+            self.caches[1][val].discard(key)
+        self.size -= 1
+        self._write(False, key, val)
+
+    def _write(self, isadd, key, val):
+        self.pending.append((isadd, key, val))
+        if len(self.pending) >= self.batchsize:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered writes to the database."""
+        if not self.pending:
+            return
+        for isadd, writes in groupby(self.pending, key=lambda w: w[0]):
+            if isadd:
+                query = 'INSERT INTO "{0}" (key, val) VALUES (?, ?)'
+            else:
+                query = 'DELETE FROM "{0}" WHERE key IS ? AND val IS ?'
+            self.connection.executemany(
+                query.format(self.table),
+                ((key, val) for _, key, val in writes)
+            )
+        self.pending = []
+        self.connection.commit()
+
+    def count(self):
+        """Returns the number of pairs."""
+        return self.size
+
+    def _pages(self, first, after):
+        """Yields the rows of a query one page at a time. The query
+        `first` reads the first page and `after` the next ones, resuming
+        after the first column of the last row read. Both must return the
+        rows sorted by their first column, and take the last value of it
+        read, if any, and the page size as parameters.
+
+        """
+        self.flush()
+        rows = self.connection.execute(first, (PAGESIZE,)).fetchall()
+        while True:
+            yield from rows
+            if len(rows) < PAGESIZE:
+                return
+            self.flush()
+            rows = self.connection.execute(
+                after, (rows[-1][0], PAGESIZE)
+            ).fetchall()
+
+    def pairs(self, side):
+        """Returns an iterator over the pairs, reversed if `side` is 1."""
+        select = 'SELECT rowid, {0}, {1} FROM "{2}" '.format(
+            COLUMNS[side], COLUMNS[1 - side], self.table
+        )
+        order = ' ORDER BY rowid LIMIT ?'
+        rows = self._pages(select + order, select + 'WHERE rowid > ?' + order)
+        return (row[1:] for row in rows)
+
+    def distinct(self, side):
+        """Returns an iterator over the keys if `side` is 0, or over the
+        values if `side` is 1. They are read in order from the index on
+        their column, after None, if present.
+
+        """
+        self.flush()
+        hasnull = self.connection.execute(
+            'SELECT EXISTS(SELECT 1 FROM "{1}" WHERE {0} IS NULL)'.format(
+                COLUMNS[side], self.table
+            )
+        ).fetchone()[0]
+        select = 'SELECT DISTINCT {0} FROM "{1}" WHERE {0} '.format(
+            COLUMNS[side], self.table
+        )
+        order = ' ORDER BY {0} LIMIT ?'.format(COLUMNS[side])
+        rows = self._pages(
+            select + 'IS NOT NULL' + order, select + '> ?' + order
+        )
+        elems = (row[0] for row in rows)
+        return chain((None,), elems) if hasnull else elems
+
+    def countdistinct(self, side):
+        """Returns the number of keys if `side` is 0, or the number of
+        values if `side` is 1.
+
+        """
+        self.flush()
+        return self.connection.execute(
+            'SELECT COUNT(DISTINCT {0}) FROM "{1}"'.format(
+                COLUMNS[side], self.table
+            )
+        ).fetchone()[0] + self.connection.execute(
+            'SELECT EXISTS(SELECT 1 FROM "{1}" WHERE {0} IS NULL)'.format(
+                COLUMNS[side], self.table
+            )
+        ).fetchone()[0]
+
+    def truncate(self):
+        """Removes all pairs."""
+        self.pending = []
+        self.size = 0
+        self.caches[0].clear()
+        self.caches[1].clear()
+        self.misses[0].clear()
+        self.misses[1].clear()
+        self.connection.execute('DELETE FROM "{0}"'.format(self.table))
+        self.connection.commit()
+
+    def close(self):
+        """Writes all buffered writes and closes the connection."""
+        self.flush()
+        self.connection.close()
+
+class diskkeys(Set):
+    """A view of the keys of a disk relation."""
+
+    def __init__(self, rel):
+        self._rel = rel
+
+    def __contains__(self, key):
+        return bool(self._rel._store.lookup(self._rel._side, key))
+
+    def __iter__(self):
+        return self._rel._store.distinct(self._rel._side)
+
+    def __len__(self):
+        return self._rel._store.countdistinct(self._rel._side)
+
+class _diskmixin():
+    """Methods common to the disk relations, which store their pairs in
+    the `sqlitestore` object `_store`, viewed from the side `_side`.
+
+    """
+    _structures = ('_store',)
+
+    def _lookup(self, elem):
+        return self._store.lookup(self._side, elem)
+
+    def _add(self, key, val):
+        if self._side:
+            key, val = val, key
+        self._store.add(key, val)
+
+    def _remove(self, key, val):
+        if self._side:
+            key, val = val, key
+        self._store.remove(key, val)
+
+    def _share(self, inverse):
+        inverse._store = self._store
+        inverse._side = 1 - self._side
+        inverse._listeners = self._listeners
+        return inverse
+
+    def flush(self):
+        """Writes all buffered writes to the database."""
+        self._store.flush()
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes of memory used by the relation,
+        which is the memory used by its caches and buffered writes. The
+        database is not counted. See `relations.memoryusage`.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        caches = self._store.caches
+        misses = self._store.misses
+        return chain(
+            caches[0].keys(), caches[1].keys(),
+            misses[0].keys(), misses[1].keys(),
+            chain.from_iterable(caches[0].values()),
+            chain.from_iterable(caches[1].values()),
+            chain.from_iterable(write[1:] for write in self._store.pending)
+        )
+
+    def close(self):
+        """Writes all buffered writes and closes the database. The
+        relation and its inverse cannot be used afterwards.
+
+        """
+        self._store.close()
+
+class diskbidict(_diskmixin, BiMapping, Observable, Expirable,
+                 Trackable, DegreeIndexed, Versionable, Attributable):
+    """An invertible, one-to-one dictionary stored in a sqlite database.
+
+    A `diskbidict` object functions just like a `bidict` object, but its
+    pairs are stored on disk rather than in memory, apart from a bounded
+    cache of recently used keys and values. It can therefore hold more
+    pairs than fit in memory. All keys and values must be storable in
+    sqlite, which means they must be None, integers, floats, strings, or
+    bytes.
+
+    Writes are buffered and written to the database in batches, so the
+    `flush` or `close` method should be called before the program ends.
+
+    """
+
+    def __init__(self, path=':memory:', table='relation', cachesize=4096,
+        batchsize=1000
+    ):
+        """Opens or creates a diskbidict.
+
+        Args:
+            path (str): The path of the database file. Defaults to an
+                in-memory database.
+            table (str): The name of the table holding the pairs, so that
+                several relations can share one database file.
+            cachesize (int): The number of keys, and of values, whose
+                lookups are cached in memory.
+            batchsize (int): The number of writes buffered before they
+                are written to the database.
+
+        """
+        self._store = sqlitestore(path, table, cachesize, batchsize)
+        self._side = 0
+        self._listeners = []
+
+    def __contains__(self, key):
+        return bool(self._lookup(key))
+
+    def __getitem__(self, key):
+        for val in self._lookup(key):
+            return val
+        raise KeyError(key)
+
+    def __delitem__(self, key):
+        val = self[key]
+        self._remove(key, val)
+        if self._listeners:
+            self._pairremoved(key, val)
+
+    def __iter__(self):
+        return self._store.distinct(self._side)
+
+    def __len__(self):
+        return self._store.count()
+
+    def __setfreeval__(self, key, val):
+        if key in self:
+            if self[key] == val:
+                return
+            del self[key]
+        self._add(key, val)
+        if self._listeners:
+            self._pairadded(key, val)
+
+    def __inverse__(self):
+        inverse = diskbidict.__new__(diskbidict)
+        return self._share(inverse)
+
+    def clear(self):
+        if self._listeners:
+            BiMapping.clear(self)
+        else:
+            self._store.truncate()
+
+    def __repr__(self):
+        return 'diskbidict(' + repr(dict(self._store.pairs(self._side))) + ')'
+
+class diskmultidict(_diskmixin, MultiMapping, Observable, Expirable,
+                    Trackable, DegreeIndexed, Versionable,
+                    Attributable):
+    """A multi-valued dictionary stored in a sqlite database.
+
+    A `diskmultidict` object functions just like a `multidict` object,
+    but its pairs are stored on disk rather than in memory, apart from a
+    bounded cache of the value sets of recently used keys and the key
+    sets of recently used values. It can therefore hold more pairs than
+    fit in memory. All keys and values must be storable in sqlite, which
+    means they must be None, integers, floats, strings, or bytes.
+
+    Writes are buffered and written to the database in batches, so the
+    `flush` or `close` method should be called before the program ends.
+
+    A disk relation can be used as the `map` of a relation from
+    `objrelations`. For example:
+
+        knows = mgr.make(Knows)
+        knows.map = diskmultidict('world.db', 'knows')
+
+    """
+
+    def __init__(self, path=':memory:', table='relation', cachesize=4096,
+        batchsize=1000
+    ):
+        """Opens or creates a diskmultidict. The arguments are the same
+        as for `diskbidict`.
+
+        """
+        self._store = sqlitestore(path, table, cachesize, batchsize)
+        self._side = 0
+        self._listeners = []
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+        except (TypeError, ValueError):
+            return False
+        return val in self._lookup(key)
+
+    def __iter__(self):
+        return self._store.pairs(self._side)
+
+    def __len__(self):
+        return self._store.count()
+
+    def discard(self, elem):
+        """Removes the given key-value pair, if present.
+
+        Args:
+            elem (2-tuple): The key-value pair to discard.
+
+        """
+        if elem in self:
+            key, val = elem
+            self._remove(key, val)
+            if self._listeners:
+                self._pairremoved(key, val)
+
+    def __getitem__(self, key):
+        vals = self._lookup(key)
+        if not vals:
+            raise KeyError(key)
+        return frozenset(vals)
+
+    def __setitem__(self, key, val):
+        if val in self._lookup(key):
+            return
+        self._add(key, val)
+        if self._listeners:
+            self._pairadded(key, val)
+
+    def __delitem__(self, key):
+        vals = self._lookup(key)
+        if not vals:
+            raise KeyError(key)
+        for val in list(vals):
+            self.discard((key, val))
+
+    def keys(self):
+        """Returns a set-like view of the keys in the diskmultidict."""
+        return diskkeys(self)
+
+    def __inverse__(self):
+        inverse = diskmultidict.__new__(diskmultidict)
+        return self._share(inverse)
+
+    def clear(self):
+        """Removes all key-value pairs."""
+        if self._listeners:
+            MultiMapping.clear(self)
+        else:
+            self._store.truncate()
+
+    def __repr__(self):
+        return 'diskmultidict(' + repr(len(self)) + ' pairs)'
+
+class diskinversedict(diskmultidict):
+    """A `diskmultidict` whose values are disjoint sets.
+
+    It is the disk analogue of `inversedict`, and its inverse is a
+    `diskinvertibledict` object.
+
+    """
+
+    def __setitem__(self, key, val):
+        keys = self._store.lookup(1 - self._side, val)
+        if keys:
+            if key in keys:
+                return
+            raise ValueError(val)
+        diskmultidict.__setitem__(self, key, val)
+
+    def __inverse__(self):
+        inverse = diskinvertibledict.__new__(diskinvertibledict)
+        return self._share(inverse)
+
+    def __repr__(self):
+        return 'diskinversedict(' + repr(len(self)) + ' pairs)'
+
+class diskinvertibledict(diskmultidict):
+    """A dictionary stored in a sqlite database that is easily inverted.
+
+    It is the disk analogue of `invertibledict`, and its inverse is a
+    `diskinversedict` object.
+
+    """
+    _single = True
+
+    def __getitem__(self, key):
+        for val in self._lookup(key):
+            return val
+        raise KeyError(key)
+
+    def __setitem__(self, key, val):
+        vals = self._lookup(key)
+        if vals:
+            if val in vals:
+                return
+            self.discard((key, next(iter(vals))))
+        diskmultidict.__setitem__(self, key, val)
+
+    def __inverse__(self):
+        inverse = diskinversedict.__new__(diskinversedict)
+        return self._share(inverse)
+
+    def __repr__(self):
+        return 'diskinvertibledict(' + repr(len(self)) + ' pairs)'
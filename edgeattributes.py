@@ -0,0 +1,206 @@
+"""Stores attributes of the pairs of a relation in columns."""
+from array import array
+from customabcs import BiMapping
+
+class EdgeAttributes():
+    """A listener storing attributes of the pairs of a mapping in
+    columns.
+
+    Each pair of the mapping is given a row, and each attribute is a
+    column holding its value for every row, either as an `array` of the
+    given typecode or, without a typecode, as a list. The columns are
+    kept dense: a removed pair is replaced by the last row, so that they
+    can be aggregated as a whole by the builtin functions, such as
+    `sum(column)`.
+
+    The row of a pair is held in a slot of its key, without building a
+    tuple for the pair. If every key of the mapping has a single value,
+    or every value a single key, the slot of a pair is that of its key,
+    or of its value, alone. Otherwise, each key has a dictionary of the
+    rows of its values. The key and value of each row are kept in two
+    more columns, so that the slot of the last row can be moved.
+
+    Attributes:
+        keyed (int or None): 0 if the slots are those of the keys, 1 if
+            they are those of the values, or None if each key has a
+            dictionary of slots.
+        slots (dict): A dictionary mapping each key (or value) to its
+            row, or each key to a dictionary mapping its values to their
+            rows.
+        keys, vals (list): The key and the value of each row.
+        columns (dict of str:sequence): A dictionary mapping the name of
+            each attribute to its column.
+        defaults (dict of str:obj): A dictionary mapping the name of each
+            attribute to the value it takes for a new pair.
+
+    """
+    def __init__(self, keyed=None):
+        """Creates an EdgeAttributes object with no rows or columns, whose
+        slots are those of the keys if `keyed` is 0, of the values if it
+        is 1, or dictionaries of the values of each key if it is None.
+
+        """
+        self.keyed = keyed
+        self.slots = {}
+        self.keys = []
+        self.vals = []
+        self.columns = {}
+        self.defaults = {}
+
+    def row(self, key, val):
+        """Returns the row of the given pair. Raises a KeyError if the
+        pair is not present.
+
+        """
+        if self.keyed is None:
+            return self.slots[key][val]
+        if self.keyed:
+            row = self.slots[val]
+            found = self.keys[row] == key
+        else:
+            row = self.slots[key]
+            found = self.vals[row] == val
+        if not found:
+            raise KeyError((key, val))
+        return row
+
+    def _setslot(self, key, val, row):
+        if self.keyed is None:
+            self.slots.setdefault(key, {})[val] = row
+        else:
+            self.slots[val if self.keyed else key] = row
+
+    def _delslot(self, key, val):
+        if self.keyed is None:
+            slots = self.slots[key]
+            row = slots.pop(val)
+            if not slots:
+                del self.slots[key]
+            return row
+        return self.slots.pop(val if self.keyed else key)
+
+    def addcolumn(self, name, typecode=None, default=None):
+        """Adds a column for the attribute called `name`, filled with
+        `default`, which defaults to 0 for an array. Raises a ValueError
+        if the column already exists.
+
+        """
+        if name in self.columns:
+            raise ValueError(name)
+        if typecode is None:
+            column = [default] * len(self.keys)
+        else:
+            if default is None:
+                default = 0
+            column = array(typecode, [default]) * len(self.keys)
+        self.columns[name] = column
+        self.defaults[name] = default
+
+    def removecolumn(self, name):
+        """Removes the column for the attribute called `name`."""
+        del self.columns[name]
+        del self.defaults[name]
+
+    def pairadded(self, key, val):
+        self._setslot(key, val, len(self.keys))
+        self.keys.append(key)
+        self.vals.append(val)
+        for name, column in self.columns.items():
+            column.append(self.defaults[name])
+
+    def pairremoved(self, key, val):
+        row = self._delslot(key, val)
+        lastkey = self.keys.pop()
+        lastval = self.vals.pop()
+        for column in self.columns.values():
+            item = column.pop()
+            if row < len(self.keys):
+                column[row] = item
+        if row < len(self.keys):
+            self.keys[row] = lastkey
+            self.vals[row] = lastval
+            self._setslot(lastkey, lastval, row)
+
+class Attributable():
+    """A mixin for `Observable` mappings whose pairs can be given
+    attributes with `addattribute`. The attributes are stored in the
+    columns of an `EdgeAttributes` listener shared by the mapping and its
+    inverse, so that they are removed together with their pairs.
+    Attributes are not pickled.
+
+    """
+
+    def _edgeattributes(self, create=False):
+        """Returns the `EdgeAttributes` listener of the mapping, creating
+        it from the current pairs if there is none and `create` is true,
+        and whether its pairs are oriented as in this mapping.
+
+        """
+        owner, table = self._shared(EdgeAttributes)
+        if table is None:
+            if not create:
+                raise KeyError('no attributes')
+            if isinstance(self, BiMapping) or self._single:
+                keyed = 0
+            elif self.inverse._single:
+                keyed = 1
+            else:
+                keyed = None
+            owner, table = self, EdgeAttributes(keyed)
+            for key, val in self._allpairs():
+                table.pairadded(key, val)
+            self.addlistener(table)
+        return table, owner is self
+
+    def addattribute(self, name, typecode=None, default=None):
+        """Adds an attribute called `name` to every pair of the mapping
+        and its inverse, set to `default` until it is set with
+        `setattribute`. With a typecode, the attribute is stored in an
+        `array` of that type, and its default defaults to 0. Raises a
+        ValueError if the attribute already exists.
+
+        """
+        self._edgeattributes(True)[0].addcolumn(name, typecode, default)
+
+    def removeattribute(self, name):
+        """Removes the attribute called `name` from every pair."""
+        self._edgeattributes()[0].removecolumn(name)
+
+    def attribute(self, key, val, name):
+        """Returns the attribute called `name` of the given pair. Raises a
+        KeyError if the pair or the attribute does not exist.
+
+        """
+        table, forward = self._edgeattributes()
+        row = table.row(key, val) if forward else table.row(val, key)
+        return table.columns[name][row]
+
+    def setattribute(self, key, val, name, value):
+        """Sets the attribute called `name` of the given pair. Raises a
+        KeyError if the pair or the attribute does not exist.
+
+        """
+        table, forward = self._edgeattributes()
+        row = table.row(key, val) if forward else table.row(val, key)
+        table.columns[name][row] = value
+
+    def attributes(self, name):
+        """Returns the attribute called `name` of every pair, as the
+        column storing it. The column is ordered as the internal rows of
+        the pairs, and should not be modified. It is meant to be
+        aggregated as a whole, as in `sum(m.attributes('weight'))`.
+
+        """
+        return self._edgeattributes()[0].columns[name]
+
+    def keyattributes(self, key, name):
+        """Returns a list of the attribute called `name` of the pairs of
+        the given key. Raises a KeyError if the key is not present.
+
+        """
+        table, forward = self._edgeattributes()
+        column = table.columns[name]
+        vals = (self[key],) if self._single else self[key]
+        if forward:
+            return [column[table.row(key, val)] for val in vals]
+        return [column[table.row(val, key)] for val in vals]
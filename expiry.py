@@ -0,0 +1,120 @@
+"""Gives the pairs of a relation a time to live."""
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import monotonic
+
+class Expiry():
+    """A listener holding the deadlines of the pairs of a mapping.
+
+    The deadlines are kept in a heap, so that the pairs that are due are
+    found in time proportional to their number (times the logarithm of
+    the size of the heap) without scanning the mapping. When a pair is
+    removed before its deadline, its deadline is forgotten at once, but
+    its heap entry is only discarded when it reaches the top of the
+    heap, or when stale entries come to outnumber live ones and the heap
+    is rebuilt.
+
+    Attributes:
+        deadlines (dict of 2-tuple:2-tuple): A dictionary mapping each
+            key-value pair with a deadline to its deadline and the
+            sequence number of its heap entry.
+
+    """
+
+    def __init__(self):
+        """Creates an Expiry object with no deadlines."""
+        self.deadlines = {}
+        self._heap = []
+        self._seq = count()
+
+    def schedule(self, pair, deadline):
+        """Sets the deadline of the given key-value pair."""
+        seq = next(self._seq)
+        self.deadlines[pair] = deadline, seq
+        heappush(self._heap, (deadline, seq, pair))
+        if len(self._heap) > 2 * len(self.deadlines) + 64:
+            self._heap = [
+                (deadline, seq, pair)
+                for pair, (deadline, seq) in self.deadlines.items()
+            ]
+            heapify(self._heap)
+
+    def cancel(self, pair):
+        """Forgets the deadline of the given key-value pair, if any."""
+        self.deadlines.pop(pair, None)
+
+    def due(self, now):
+        """Forgets and returns the list of pairs whose deadline is at or
+        before `now`, in order of deadline.
+
+        """
+        heap = self._heap
+        pairs = []
+        while heap and heap[0][0] <= now:
+            deadline, seq, pair = heappop(heap)
+            if self.deadlines.get(pair) == (deadline, seq):
+                del self.deadlines[pair]
+                pairs.append(pair)
+        return pairs
+
+    def pairadded(self, key, val):
+        pass
+
+    def pairremoved(self, key, val):
+        self.deadlines.pop((key, val), None)
+
+class Expirable():
+    """A mixin for `Observable` mappings whose pairs can be given a time
+    to live with `set`, and removed once due with `expire`. The
+    deadlines are held by an `Expiry` listener shared by the mapping and
+    its inverse.
+
+    """
+
+    def set(self, key, val, ttl=None, now=None):
+        """Adds the given key-value pair, like `self[key] = val`, and sets
+        it to expire after `ttl` seconds.
+
+        The pair is removed by the first call of `expire` (on the
+        mapping or its inverse) made at or after its deadline. Setting
+        the pair again replaces its deadline, and setting it with no
+        `ttl` makes it permanent. Removing the pair by any other means
+        also cancels its deadline. Deadlines are not pickled.
+
+        Args:
+            key (obj): The key to set.
+            val (obj): The value to set.
+            ttl (float, optional): The time to live of the pair.
+            now (float, optional): The current time. Defaults to
+                `time.monotonic()`. Any other clock, such as a tick
+                count, may be used instead, as long as `expire` is given
+                times from the same clock.
+
+        """
+        self[key] = val
+        self._schedule(key, val, ttl, now)
+
+    def _schedule(self, key, val, ttl, now):
+        owner, expiry = self._shared(Expiry, ttl is not None)
+        if expiry is None:
+            return
+        pair = (key, val) if owner is self else (val, key)
+        if ttl is None:
+            expiry.cancel(pair)
+        else:
+            expiry.schedule(pair, (monotonic() if now is None else now) + ttl)
+
+    def expire(self, now=None):
+        """Removes the pairs whose deadline is at or before `now`, which
+        defaults to `time.monotonic()`, and returns the list of them.
+
+        """
+        owner, expiry = self._shared(Expiry)
+        if expiry is None:
+            return []
+        pairs = expiry.due(monotonic() if now is None else now)
+        for key, val in pairs:
+            owner._discardpair(key, val)
+        if owner is self:
+            return pairs
+        return [(val, key) for key, val in pairs]
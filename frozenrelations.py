@@ -0,0 +1,317 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Set
+from itertools import chain
+from customabcs import BiMapping, MultiMapping
+from relations import memoryusage, _pack, _unpack
+from relations import inversedict, invertibledict
+
+def freeze(rel):
+    """Compiles a relation into an immutable, array-backed relation.
+
+    A `bidict`, or any other `BiMapping`, becomes a `frozenbidict`. An
+    `invertibledict` becomes a `frozeninvertibledict`, whose inverse is
+    a `frozenmultidict`, and an `inversedict` becomes a
+    `frozenmultidict`, whose inverse is a `frozeninvertibledict`. Any
+    other `MultiMapping` becomes a `frozenmultidict`.
+
+    """
+    if isinstance(rel, BiMapping):
+        return _build((frozenbidict, frozenbidict), list(rel.items()))
+    if isinstance(rel, invertibledict):
+        classes = (frozeninvertibledict, frozenmultidict)
+    elif isinstance(rel, inversedict):
+        classes = (frozenmultidict, frozeninvertibledict)
+    else:
+        classes = (frozenmultidict, frozenmultidict)
+    return _build(classes, list(rel))
+
+def _build(classes, pairs):
+    store = frozenstore(classes, pairs)
+    return classes[0].__new__(classes[0])._share(store, 0)
+
+def _unpickle(classes, keys, vals):
+    keys, vals = _unpack(keys, vals)
+    return _build(classes, list(zip(keys, vals)))
+
+def _section(pairs, single):
+    """Returns the keys of the given pairs sorted by hash, their hashes,
+    and their values. If `single` is false, the values of each key are
+    sorted by hash and stored contiguously, and the offsets of the
+    values of each key and the hashes of the values are also returned.
+    Otherwise, the offsets and hashes of the values are None, and the
+    value of each key is stored at the same position as the key.
+
+    """
+    groups = {}
+    for key, val in pairs:
+        groups.setdefault(key, []).append(val)
+    keys = tuple(sorted(groups, key=hash))
+    hashes = array('q', map(hash, keys))
+    if single:
+        return hashes, keys, None, None, tuple(
+            groups[key][0] for key in keys
+        )
+    offsets = array('q', [0])
+    vals = []
+    for key in keys:
+        vals.extend(sorted(groups[key], key=hash))
+        offsets.append(len(vals))
+    return hashes, keys, offsets, array('q', map(hash, vals)), tuple(vals)
+
+class frozenstore():
+    """The arrays holding a frozen relation and its inverse.
+
+    Each side is stored as a tuple of keys sorted by hash, with a packed
+    array of their hashes, so that a key is located by bisecting the
+    hashes and comparing the few keys sharing its hash. The keys and
+    values are held in tuples, and nothing in the store is modified
+    after it is built, so frozen relations can be shared between
+    threads without locking.
+
+    Attributes:
+        classes (2-tuple of type): The types of the frozen relation and
+            of its inverse.
+        sections (2-tuple of 5-tuple): For each side, the hashes of the
+            keys, the keys, the offsets of their values, the hashes of
+            the values, and the values, as returned by `_section`. The
+            second side describes the inverse relation.
+
+    """
+    _structures = ('sections',)
+
+    def __init__(self, classes, pairs):
+        """Builds the arrays of a frozen relation holding the given list
+        of key-value pairs, whose type and inverse type are `classes`.
+
+        """
+        self.classes = classes
+        self.sections = (
+            _section(pairs, classes[0]._single),
+            _section(
+                [(val, key) for key, val in pairs], classes[1]._single
+            ),
+        )
+
+    def find(self, side, key):
+        """Returns the position of `key` on the given side, or -1 if it is
+        not present. Raises a TypeError if `key` is not hashable.
+
+        """
+        section = self.sections[side]
+        hashes = section[0]
+        keys = section[1]
+        code = hash(key)
+        pos = bisect_left(hashes, code)
+        while pos < len(hashes) and hashes[pos] == code:
+            if keys[pos] is key or keys[pos] == key:
+                return pos
+            pos += 1
+        return -1
+
+class frozenkeys(Set):
+    """A view of the keys of a frozen relation."""
+
+    def __init__(self, rel):
+        self._rel = rel
+
+    def __contains__(self, key):
+        try:
+            return self._rel._store.find(self._rel._side, key) >= 0
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._rel._sections[1])
+
+    def __len__(self):
+        return len(self._rel._sections[1])
+
+class _frozenmixin():
+    """Methods common to the frozen relations, which read their pairs
+    from the `frozenstore` object `_store`, viewed from the side
+    `_side`.
+
+    A frozen relation is hashable, and equal to any relation holding the
+    same pairs. A pickled frozen relation stores only its pairs, and its
+    inverse, if pickled, stores only a reference to it.
+
+    """
+    _structures = ('_store',)
+    _listeners = ()
+
+    def _share(self, store, side):
+        self._store = store
+        self._side = side
+        self._sections = store.sections[side]
+        self._hash = None
+        return self
+
+    def _readonly(self, *args):
+        raise TypeError('frozen relations are read-only')
+
+    __setitem__ = __delitem__ = __setfreeval__ = discard = _readonly
+    clear = update = pop = popitem = setdefault = _readonly
+
+    def addlistener(self, listener):
+        """Does nothing, since a frozen relation never changes and its
+        listeners would never be notified.
+
+        """
+
+    def removelistener(self, listener):
+        """Does nothing. See `addlistener`."""
+
+    def __inverse__(self):
+        cls = self._store.classes[1 - self._side]
+        inverse = cls.__new__(cls)
+        return inverse._share(self._store, 1 - self._side)
+
+    def freeze(self):
+        """Returns the frozen relation itself."""
+        return self
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._pairs()))
+        return self._hash
+
+    def __reduce_ex__(self, protocol):
+        if self._side:
+            return (getattr, (self.inverse, 'inverse'))
+        return (
+            _unpickle,
+            (self._store.classes,) + _pack(list(self._pairs()), protocol)
+        )
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the frozen relation. The
+        store is shared with the inverse, so it is counted only once if
+        the same `seen` set is used to measure both. See
+        `relations.memoryusage`.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        return chain(
+            self._store.sections[0][1], self._store.sections[1][1]
+        )
+
+class frozenbidict(_frozenmixin, BiMapping):
+    """An immutable, array-backed `bidict`.
+
+    It is created with `freeze`, or the `freeze` method of a `bidict`,
+    and supports all the non-mutating methods of a `bidict`. Attempts to
+    modify it raise a TypeError.
+
+    """
+
+    def __contains__(self, key):
+        try:
+            return self._store.find(self._side, key) >= 0
+        except TypeError:
+            return False
+
+    def __getitem__(self, key):
+        pos = self._store.find(self._side, key)
+        if pos < 0:
+            raise KeyError(key)
+        return self._sections[4][pos]
+
+    def __iter__(self):
+        return iter(self._sections[1])
+
+    def __len__(self):
+        return len(self._sections[1])
+
+    def _pairs(self):
+        return zip(self._sections[1], self._sections[4])
+
+    def __repr__(self):
+        return 'frozenbidict(' + repr(dict(self._pairs())) + ')'
+
+class frozenmultidict(_frozenmixin, MultiMapping):
+    """An immutable, array-backed `multidict`.
+
+    It is created with `freeze`, or the `freeze` method of a `multidict`,
+    and supports all the non-mutating methods of a `multidict`, except
+    that `__getitem__` returns a frozenset. Attempts to modify it raise
+    a TypeError.
+
+    """
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+            pos = self._store.find(self._side, key)
+            code = hash(val)
+        except (TypeError, ValueError):
+            return False
+        if pos < 0:
+            return False
+        _, _, offsets, hashes, vals = self._sections
+        end = offsets[pos + 1]
+        pos = bisect_left(hashes, code, offsets[pos], end)
+        while pos < end and hashes[pos] == code:
+            if vals[pos] is val or vals[pos] == val:
+                return True
+            pos += 1
+        return False
+
+    def __iter__(self):
+        return self._pairs()
+
+    def __len__(self):
+        return len(self._sections[4])
+
+    def __getitem__(self, key):
+        pos = self._store.find(self._side, key)
+        if pos < 0:
+            raise KeyError(key)
+        _, _, offsets, _, vals = self._sections
+        return frozenset(vals[offsets[pos]:offsets[pos + 1]])
+
+    def keys(self):
+        """Returns a set-like view of the keys in the frozenmultidict."""
+        return frozenkeys(self)
+
+    def _pairs(self):
+        _, keys, offsets, _, vals = self._sections
+        for pos, key in enumerate(keys):
+            for val in vals[offsets[pos]:offsets[pos + 1]]:
+                yield key, val
+
+    def __repr__(self):
+        return 'frozenmultidict(' + repr(
+            {key: set(self[key]) for key in self.keys()}
+        ) + ')'
+
+class frozeninvertibledict(frozenmultidict):
+    """An immutable, array-backed `invertibledict`.
+
+    Every key has a single value, stored at the same position as the
+    key, and `__getitem__` returns that value.
+
+    """
+    _single = True
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+            pos = self._store.find(self._side, key)
+        except (TypeError, ValueError):
+            return False
+        return pos >= 0 and self._sections[4][pos] == val
+
+    def __getitem__(self, key):
+        pos = self._store.find(self._side, key)
+        if pos < 0:
+            raise KeyError(key)
+        return self._sections[4][pos]
+
+    def _pairs(self):
+        return zip(self._sections[1], self._sections[4])
+
+    def __repr__(self):
+        return 'frozeninvertibledict(' + repr(dict(self._pairs())) + ')'
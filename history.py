@@ -0,0 +1,264 @@
+"""Keeps the history of a relation, so that past versions can be read."""
+from collections.abc import Mapping
+from weakref import finalize
+from customabcs import BiMapping, RelSet
+
+class History():
+    """A listener recording the version range over which each pair of a
+    mapping was present, for `Versionable.at`.
+
+    The version is the number of changes made since the history was
+    started. A pair added at version `s` and removed at version `e` was
+    present at the versions `s <= v < e`. Only the start versions of the
+    pairs currently present, and the ranges of the pairs since removed,
+    are stored, so a mapping whose history is kept costs little more
+    than the mapping itself as long as pairs are rarely removed.
+
+    When the last view of the oldest version viewed is closed or
+    garbage collected, the oldest readable version, `floor`, advances to
+    the oldest version still viewed, and the ranges that no open view
+    can read any longer are discarded. While no view is open, nothing is
+    recorded and `floor` follows the current version.
+
+    Attributes:
+        version (int): The current version.
+        floor (int): The oldest version that can be viewed.
+        starts (dict of 2-tuple:int): A dictionary mapping each pair
+            added since `floor` to the version at which it was added.
+        removed (2-tuple of dict): For the keys and for the values, a
+            dictionary mapping each element to a dictionary mapping each
+            element it was paired with to the list of version ranges
+            over which the pair was present, as `(start, end)` tuples.
+        readers (dict of int:int): The number of open views of each
+            version.
+
+    """
+
+    def __init__(self):
+        """Creates an empty History object at version 0."""
+        self.version = 0
+        self.floor = 0
+        self.starts = {}
+        self.removed = ({}, {})
+        self.readers = {}
+
+    def pairadded(self, key, val):
+        self.version += 1
+        if self.readers:
+            self.starts[(key, val)] = self.version
+        else:
+            self.floor = self.version
+
+    def pairremoved(self, key, val):
+        self.version += 1
+        span = self.starts.pop((key, val), self.floor), self.version
+        if not self.readers:
+            self.floor = self.version
+            return
+        self.removed[0].setdefault(key, {}).setdefault(val, []).append(span)
+        self.removed[1].setdefault(val, {}).setdefault(key, []).append(span)
+
+    def open(self, version):
+        """Registers a reader of the given version. Raises a ValueError
+        if the version has been discarded or does not exist yet.
+
+        """
+        if not self.floor <= version <= self.version:
+            raise ValueError(version)
+        self.readers[version] = self.readers.get(version, 0) + 1
+
+    def close(self, version):
+        """Unregisters a reader of the given version, and discards the
+        ranges that can no longer be read if it was the last reader of
+        the oldest version viewed.
+
+        """
+        self.readers[version] -= 1
+        if not self.readers[version]:
+            del self.readers[version]
+            if not self.readers or version < min(self.readers):
+                self.collect()
+
+    def collect(self):
+        """Advances `floor` to the oldest version still viewed, or to the
+        current version if there are no views, and discards the ranges
+        ending before it.
+
+        """
+        self.floor = min(self.readers, default=self.version)
+        self.starts = {
+            pair: start for pair, start in self.starts.items()
+            if start > self.floor
+        }
+        for side in self.removed:
+            for elem in list(side):
+                partners = side[elem]
+                for partner in list(partners):
+                    spans = [
+                        span for span in partners[partner]
+                        if span[1] > self.floor
+                    ]
+                    if spans:
+                        partners[partner] = spans
+                    else:
+                        del partners[partner]
+                if not partners:
+                    del side[elem]
+
+class Versionable():
+    """A mixin for `Observable` mappings whose past versions can be read
+    with `at` once their history is kept by a `History` listener, which
+    is started by `versioned`.
+
+    """
+
+    def versioned(self):
+        """Starts keeping the history of the mapping and its inverse, if
+        not already kept, and returns the current version, which counts
+        the changes made since. These versions are independent of those
+        of `track`.
+
+        """
+        return self._shared(History, True)[1].version
+
+    def at(self, version):
+        """Returns a read-only view of the mapping as it was at the given
+        version. The view reads the mapping and its history, so creating
+        it takes constant time. The history that it needs is kept for as
+        long as the view exists, but the versions that no view holds
+        are discarded whenever the last view of the oldest version
+        viewed is released. A version that may be read later should
+        therefore be held from the start, with `rel.at(rel.versioned())`.
+
+        A view of a `BiMapping` maps each key to its value. A view of a
+        `MultiMapping` is a set of key-value pairs, which also maps each
+        key to the frozenset of its values.
+
+        Raises:
+            ValueError: If the history of the mapping is not kept, or if
+                the version has been discarded or does not exist yet.
+
+        """
+        owner, history = self._shared(History)
+        if history is None:
+            raise ValueError('history is not kept')
+        if isinstance(self, BiMapping):
+            return BiMappingView(self, owner is not self, history, version)
+        return MultiMappingView(self, owner is not self, history, version)
+
+class _versionview():
+    """Methods common to the read-only views of a past version of a
+    mapping, returned by `Versionable.at`.
+
+    Attributes:
+        version (int): The version viewed.
+
+    """
+
+    def __init__(self, rel, swapped, history, version):
+        history.open(version)
+        self._rel = rel
+        self._swapped = swapped
+        self._history = history
+        self.version = version
+        self._finalizer = finalize(self, history.close, version)
+
+    def _values(self, key):
+        """Returns the set of values of `key` at the viewed version."""
+        version = self.version
+        starts = self._history.starts
+        vals = set()
+        if key in self._rel.keys():
+            current = self._rel[key]
+            if self._rel._single:
+                current = (current,)
+            for val in current:
+                pair = (val, key) if self._swapped else (key, val)
+                if starts.get(pair, 0) <= version:
+                    vals.add(val)
+        removed = self._history.removed[self._swapped].get(key, {})
+        for val, spans in removed.items():
+            if any(start <= version < end for start, end in spans):
+                vals.add(val)
+        return vals
+
+    def _keys(self):
+        """Returns an iterator over the keys present at the viewed
+        version.
+
+        """
+        removed = self._history.removed[self._swapped]
+        for key in self._rel.keys():
+            if key not in removed and self._values(key):
+                yield key
+        for key in removed:
+            if self._values(key):
+                yield key
+
+    @property
+    def inverse(self):
+        """The view of the inverse mapping at the same version."""
+        return self._rel.inverse.at(self.version)
+
+    def close(self):
+        """Releases the view, so that the history it needs can be
+        discarded. The view cannot be used afterwards.
+
+        """
+        self._finalizer()
+
+class BiMappingView(_versionview, Mapping):
+    """A read-only view of a `BiMapping` at a past version."""
+
+    def __getitem__(self, key):
+        vals = self._values(key)
+        if not vals:
+            raise KeyError(key)
+        return next(iter(vals))
+
+    def __iter__(self):
+        return self._keys()
+
+    def __len__(self):
+        return sum(1 for _ in self._keys())
+
+    def __repr__(self):
+        return 'BiMappingView({0}, {1})'.format(
+            self.version, dict(self.items())
+        )
+
+class MultiMappingView(_versionview, RelSet):
+    """A read-only view of a `MultiMapping` at a past version."""
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+            return val in self._values(key)
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        for key in self._keys():
+            for val in self._values(key):
+                yield key, val
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getitem__(self, key):
+        vals = self._values(key)
+        if not vals:
+            raise KeyError(key)
+        return frozenset(vals)
+
+    def keys(self):
+        """Returns an iterator over the keys present at the viewed
+        version.
+
+        """
+        return self._keys()
+
+    def __repr__(self):
+        return 'MultiMappingView({0}, {1})'.format(
+            self.version, {key: set(self[key]) for key in self.keys()}
+        )
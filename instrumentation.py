@@ -0,0 +1,181 @@
+from copyreg import __newobj__
+from time import perf_counter
+
+OPERATIONS = (
+    '__getitem__', '__setitem__', '__delitem__', '__contains__', '__iter__',
+    '__len__', 'discard', 'keys', 'add', 'update', 'clear', 'pop', 'copy',
+    'where', 'get',
+)
+MUTATIONS = ('__setitem__', 'add', 'update')
+
+class RelationStats():
+    """Operation counters and latency histograms for one relation.
+
+    Only the outermost operation is recorded when one instrumented
+    operation calls another on the same relation, so that, for example,
+    the membership test inside `BiMapping.__setitem__` is not counted as
+    a separate call. The time taken by `__iter__` and `keys` is the time
+    taken to create the iterator, not to exhaust it.
+
+    Attributes:
+        calls (dict of str:int): The number of calls of each operation.
+        seconds (dict of str:float): The cumulative time spent in each
+            operation.
+        histograms (dict of str:dict): For each operation, a dictionary
+            mapping `b` to the number of calls that took between
+            `2**(b-1)` and `2**b` nanoseconds.
+        validations (int): The number of calls of `validate`.
+        rejections (int): The number of calls of `validate` that
+            returned a false value.
+        highwater (int): The largest size the relation has reached since
+            it was instrumented.
+
+    """
+
+    def __init__(self):
+        """Creates a RelationStats object with all counters at zero."""
+        self.calls = {}
+        self.seconds = {}
+        self.histograms = {}
+        self.validations = 0
+        self.rejections = 0
+        self.highwater = 0
+        self._depth = 0
+        self._validate = None
+
+    def record(self, name, seconds):
+        """Records a call of the named operation that took the given
+        time.
+
+        """
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        histogram = self.histograms.setdefault(name, {})
+        bucket = int(seconds * 1e9).bit_length()
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+
+    def report(self):
+        """Returns the statistics as a dictionary of plain data, suitable
+        for serialization.
+
+        """
+        return {
+            'calls': dict(self.calls),
+            'seconds': dict(self.seconds),
+            'histograms': {
+                name: dict(histogram)
+                for name, histogram in self.histograms.items()
+            },
+            'validations': self.validations,
+            'rejections': self.rejections,
+            'highwater': self.highwater,
+        }
+
+def _wrap(name, method, mutates):
+    def wrapper(self, *args, **kargs):
+        stats = self._stats
+        if stats._depth:
+            return method(self, *args, **kargs)
+        stats._depth += 1
+        start = perf_counter()
+        try:
+            return method(self, *args, **kargs)
+        finally:
+            stats.record(name, perf_counter() - start)
+            if mutates:
+                size = len(self.map) if hasattr(self, 'map') else len(self)
+                if size > stats.highwater:
+                    stats.highwater = size
+            stats._depth -= 1
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def _wrapvalidate(validate):
+    def wrapper(self, key, val):
+        result = validate(self, key, val)
+        self._stats.validations += 1
+        if not result:
+            self._stats.rejections += 1
+        return result
+    wrapper.__doc__ = validate.__doc__
+    return wrapper
+
+def _new(cls):
+    return cls.__new__(cls)
+
+def _reduce_ex(self, protocol):
+    """Pickles an instrumented relation as an uninstrumented one."""
+    base = self._uninstrumented
+    reduced = base.__reduce_ex__(self, protocol)
+    func = _new if reduced[0] is __newobj__ else reduced[0]
+    args = tuple(base if arg is type(self) else arg for arg in reduced[1])
+    reduced = (func, args) + tuple(reduced[2:])
+    if len(reduced) > 2 and isinstance(reduced[2], dict):
+        state = dict(reduced[2])
+        state.pop('_stats', None)
+        reduced = reduced[:2] + (state,) + reduced[3:]
+    return reduced
+
+_classes = {}
+
+def _instrumentedclass(cls):
+    try:
+        return _classes[cls]
+    except KeyError:
+        pass
+    namespace = {
+        '_uninstrumented': cls,
+        '__reduce_ex__': _reduce_ex,
+        '__module__': cls.__module__,
+        '__doc__': cls.__doc__,
+    }
+    for name in OPERATIONS:
+        method = getattr(cls, name, None)
+        if method is not None:
+            namespace[name] = _wrap(name, method, name in MUTATIONS)
+    if hasattr(cls, 'validate'):
+        namespace['validate'] = _wrapvalidate(cls.validate)
+    _classes[cls] = type(cls.__name__, (cls,), namespace)
+    return _classes[cls]
+
+def instrument(rel):
+    """Starts recording statistics on the given relation, which may be
+    any `BiMapping` or `MultiMapping`, including the relations from
+    `objrelations`.
+
+    The relation is given an instrumented class, derived from its own,
+    whose operations record their calls and latencies in a new
+    `RelationStats` object stored in the `_stats` attribute of the
+    relation. Relations that are not instrumented are not slowed down at
+    all.
+
+    Returns:
+        RelationStats: The statistics of the relation.
+
+    """
+    if '_uninstrumented' in vars(type(rel)):
+        return rel._stats
+    rel._stats = RelationStats()
+    rel._stats.highwater = len(rel)
+    inverted = vars(rel).get('validate')
+    if inverted is not None:
+        rel._stats._validate = inverted
+        rel.validate = _wrapvalidate(inverted.__func__).__get__(rel)
+    rel.__class__ = _instrumentedclass(type(rel))
+    return rel._stats
+
+def uninstrument(rel):
+    """Stops recording statistics on the given relation and returns the
+    statistics recorded.
+
+    """
+    cls = type(rel)
+    if '_uninstrumented' not in vars(cls):
+        raise ValueError(rel)
+    rel.__class__ = cls._uninstrumented
+    stats = rel._stats
+    del rel._stats
+    if 'validate' in vars(rel):
+        rel.validate = stats._validate
+    return stats
@@ -1,6 +1,14 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from copyreg import __newobj__
+from functools import partial
+from itertools import chain
+from sys import getsizeof
 from types import MethodType
 from customabcs import BiMapping, MultiMapping
-from relations import bidict, multidict, inversedict, invertibledict
+from relations import bidict, multidict, inversedict, invertibledict, bagdict
+from relations import containersize
+from sortedrelations import sortedlist
 
 class Manager():
     """An object that creates and manages other objects.
@@ -10,6 +18,8 @@ class Manager():
             managed object.
         objects (dict of int:obj): A dictionary of managed objects
             indexed by id numbers.
+        exporters (list of callable): The functions called by
+            `exportstats`.
 
     """
     def __init__(self):
@@ -19,6 +29,11 @@ class Manager():
         """
         self.nextID = 1
         self.objects = {}
+        self.exporters = []
+        self._journal = []
+        self._savepoints = []
+        self._recorders = []
+        self._undoing = False
 
     def make(self, class_, *args, **kargs):
         """Creates an object of the given class and attaches to it a
@@ -32,9 +47,1034 @@ class Manager():
         obj._m_id = self.nextID
         self.nextID += 1
         self.objects[obj._m_id] = obj
+        if self._savepoints and isinstance(obj, Relation):
+            self._record(obj)
         return obj
 
-class OneToOne(BiMapping):
+    def make_many(self, class_, arg_rows):
+        """Creates one object of the given class per row of arguments,
+        and manages them like `make` would, assigning them consecutive
+        ID numbers allocated in one step.
+
+        All the objects are created before any is managed, so if the
+        class raises an error for one of the rows, none of them is
+        managed and `nextID` is left unchanged.
+
+        Args:
+            class_ (type): The class of the objects to create.
+            arg_rows (iterable of tuple): The positional arguments of
+                each object.
+
+        Returns:
+            list: The new objects, in the order of `arg_rows`.
+
+        """
+        objs = [class_(*args) for args in arg_rows]
+        start = self.nextID
+        self.nextID += len(objs)
+        for objID, obj in enumerate(objs, start):
+            obj._m_manager = self
+            obj._m_id = objID
+        self.objects.update(zip(range(start, self.nextID), objs))
+        if self._savepoints and issubclass(class_, Relation):
+            for obj in objs:
+                self._record(obj)
+        return objs
+
+    def savepoint(self):
+        """Starts recording the changes to every managed relation, if not
+        already recording, and returns a savepoint to which they can be
+        rolled back with `rollback`. Savepoints can be nested.
+
+        Every pair added to or removed from the map of a relation is
+        appended to an undo journal, so that rolling back takes time
+        proportional to the number of changes made since the savepoint,
+        and nothing is copied. Only the relations are rolled back; the
+        objects made since the savepoint remain managed.
+
+        """
+        if not self._savepoints:
+            for obj in self.objects.values():
+                if isinstance(obj, Relation):
+                    self._record(obj)
+        savepoint = Savepoint(len(self._journal))
+        self._savepoints.append(savepoint)
+        return savepoint
+
+    def rollback(self, savepoint):
+        """Undoes the changes made to the relations since the given
+        savepoint, which remains active, and releases the savepoints
+        made after it. The pairs are restored directly in the maps of
+        the relations, without validation.
+
+        Raises:
+            ValueError: If the savepoint is not active.
+
+        """
+        del self._savepoints[self._find(savepoint) + 1:]
+        self._undoing = True
+        try:
+            while len(self._journal) > savepoint.position:
+                map, key, val, change = self._journal.pop()
+                if change is True:
+                    map._discardpair(key, val)
+                elif change is False:
+                    map[key] = val
+                else:
+                    map._setcount(key, val, change)
+        finally:
+            self._undoing = False
+
+    def release(self, savepoint):
+        """Releases the given savepoint and those made after it, keeping
+        the changes made since. Once no savepoint is active, the journal
+        is cleared and the listeners recording changes are removed from
+        the relations.
+
+        Raises:
+            ValueError: If the savepoint is not active.
+
+        """
+        del self._savepoints[self._find(savepoint):]
+        if not self._savepoints:
+            self._journal.clear()
+            for recorder in self._recorders:
+                recorder.map.removelistener(recorder)
+            self._recorders.clear()
+
+    def _find(self, savepoint):
+        for pos, active in enumerate(self._savepoints):
+            if active is savepoint:
+                return pos
+        raise ValueError(savepoint)
+
+    def _record(self, rel):
+        listeners = getattr(rel.map, '_listeners', ())
+        if not any(isinstance(listener, UndoRecorder)
+                   for _, listener in listeners):
+            recorder = UndoRecorder(self, rel.map)
+            rel.map.addlistener(recorder)
+            self._recorders.append(recorder)
+
+    def stats(self):
+        """Returns the statistics of every managed relation that has been
+        instrumented with `instrumentation.instrument`.
+
+        Returns:
+            dict of int:dict: A dictionary mapping the ID of each
+                instrumented relation to a dictionary with its class name
+                under `'type'`, and the rest of its statistics as given
+                by `RelationStats.report`.
+
+        """
+        report = {}
+        for objID, obj in self.objects.items():
+            if not isinstance(obj, Relation):
+                continue
+            stats = vars(obj).get('_stats')
+            if stats is not None:
+                report[objID] = dict(type=type(obj).__name__, **stats.report())
+        return report
+
+    def memory_usage(self):
+        """Returns the number of bytes used by the Manager and its
+        relations. The storage shared by a relation and its inverse is
+        counted once, under whichever of them comes first in `objects`.
+        The other managed objects are not counted, apart from their
+        entries in `objects`.
+
+        Returns:
+            dict: The number of bytes used by the `objects` registry
+                under `'objects'`, a dictionary mapping the ID of each
+                relation to the number of bytes it uses under
+                `'relations'`, and the overall total under `'total'`.
+
+        """
+        seen = set()
+        usage = {'objects': getsizeof(self.objects), 'relations': {}}
+        for objID, obj in self.objects.items():
+            if isinstance(obj, Relation):
+                size = obj.memory_usage(seen)['total']
+                usage['relations'][objID] = size
+        usage['total'] = usage['objects'] + sum(usage['relations'].values())
+        return usage
+
+    def exportstats(self):
+        """Passes the result of `stats` to each function in `exporters`,
+        such as a function sending it to a metrics pipeline.
+
+        """
+        report = self.stats()
+        for exporter in self.exporters:
+            exporter(report)
+
+class Entity():
+    """A base class for compact managed objects.
+
+    The reference to the Manager and the ID number that `Manager.make`
+    attaches to an object are stored in slots rather than in its
+    `__dict__`. Subclasses that also declare `__slots__` for their own
+    attributes have no `__dict__` at all, which saves much of the memory
+    used by small objects when many thousands of them are managed, as
+    with `Manager.make_many`.
+
+    """
+    __slots__ = ('_m_manager', '_m_id', '__weakref__')
+
+def _getprop(name, obj):
+    return getattr(obj, name, None)
+
+def _inversevalidate(slf, key, val):
+    return slf.inverse.validate(val, key)
+
+class Savepoint():
+    """A savepoint returned by `Manager.savepoint`. Savepoints are
+    told apart by identity, so that nested savepoints made at the same
+    position in the journal remain distinct.
+
+    Attributes:
+        position (int): The length of the undo journal when the
+            savepoint was made.
+
+    """
+    __slots__ = ('position',)
+
+    def __init__(self, position):
+        self.position = position
+
+    def __repr__(self):
+        return 'Savepoint({})'.format(self.position)
+
+class UndoRecorder():
+    """A listener appending the changes to the map of a relation to the
+    undo journal of its Manager, while a savepoint is active.
+
+    The changes to a `bagdict` are recorded as the number of copies of
+    the pair before each change, from `paircounted`, rather than as
+    additions and removals, so that rolling back restores the counts.
+
+    Attributes:
+        manager (Manager): The Manager holding the journal.
+        map (BiMapping or MultiMapping): The map on which the listener
+            is registered.
+
+    """
+
+    def __init__(self, manager, map):
+        self.manager = manager
+        self.map = map
+        self._counted = isinstance(map, bagdict)
+
+    def pairadded(self, keyID, valID):
+        if (self.manager._savepoints and not self.manager._undoing
+            and not self._counted
+        ):
+            self.manager._journal.append((self.map, keyID, valID, True))
+
+    def pairremoved(self, keyID, valID):
+        if (self.manager._savepoints and not self.manager._undoing
+            and not self._counted
+        ):
+            self.manager._journal.append((self.map, keyID, valID, False))
+
+    def paircounted(self, keyID, valID, old, new):
+        if self.manager._savepoints and not self.manager._undoing:
+            self.manager._journal.append((self.map, keyID, valID, old))
+
+class Index():
+    """A secondary index on a relation between managed objects.
+
+    An index groups the values of each key by a property of the value
+    objects, such as one of their attributes. It is registered as a
+    listener on the ID-level map of the relation, so that it is updated
+    incrementally whenever a pair is added or removed, including
+    through the inverse relation.
+
+    The indexed property of an object is computed when the object first
+    enters the relation and is assumed not to change while it remains
+    there. If it does change, the index should be rebuilt with the
+    `reindex` method of the relation.
+
+    Attributes:
+        manager (Manager): The Manager object managing the related
+            objects.
+        func (callable): The function computing the indexed property of
+            a value object.
+        groups (dict of int:dict): A dictionary mapping each key ID to a
+            dictionary of sets of value IDs, indexed by property.
+
+    """
+
+    def __init__(self, manager, func):
+        """Creates an empty index on objects managed by `manager`,
+        grouping them by `func(obj)`.
+
+        """
+        self.manager = manager
+        self.func = func
+        self.groups = {}
+        self._props = {}
+
+    def pairadded(self, keyID, valID):
+        try:
+            entry = self._props[valID]
+        except KeyError:
+            val = None if valID is None else self.manager.objects[valID]
+            entry = self._props[valID] = [self.func(val), 0]
+        entry[1] += 1
+        group = self.groups.setdefault(keyID, {})
+        group.setdefault(entry[0], set()).add(valID)
+
+    def pairremoved(self, keyID, valID):
+        entry = self._props[valID]
+        group = self.groups[keyID]
+        group[entry[0]].discard(valID)
+        if not group[entry[0]]:
+            del group[entry[0]]
+            if not group:
+                del self.groups[keyID]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._props[valID]
+
+    def lookup(self, keyID, prop):
+        """Returns the set of IDs of the values of the given key ID
+        whose indexed property equals `prop`. The set should not be
+        modified.
+
+        """
+        try:
+            return self.groups[keyID][prop]
+        except KeyError:
+            return frozenset()
+
+    def rebuild(self, pairs):
+        """Clears the index and refills it from the given ID pairs."""
+        self.groups = {}
+        self._props = {}
+        for keyID, valID in pairs:
+            self.pairadded(keyID, valID)
+
+class Aggregate():
+    """An incrementally maintained aggregate of the values of each key
+    of a relation between managed objects.
+
+    An aggregate computes, for each key, the number of its values
+    (`'count'`), or the sum, minimum, or maximum of a property of its
+    value objects (`'sum'`, `'min'`, and `'max'`). Values whose property
+    is None are left out of sums, minimums, and maximums. Like an
+    `Index`, it is registered as a listener on the ID-level map of the
+    relation, so that it is updated on every change to the relation,
+    including through the inverse relation, and it computes the property
+    of an object when the object first enters the relation. Counts and
+    sums are read in constant time, and minimums and maximums from a
+    `sortedlist` of the properties of the values of each key.
+
+    Attributes:
+        manager (Manager): The Manager object managing the related
+            objects.
+        kind (str): One of `'count'`, `'sum'`, `'min'`, and `'max'`.
+        func (callable): The function computing the aggregated property
+            of a value object.
+        counts (dict of int:int): A dictionary mapping each key ID to the
+            number of values aggregated.
+        results (dict of int:obj): A dictionary mapping each key ID to
+            the sum of the properties of its values for a `'sum'`
+            aggregate, or to the `sortedlist` of those properties for a
+            `'min'` or `'max'` aggregate.
+
+    """
+    KINDS = ('count', 'sum', 'min', 'max')
+
+    def __init__(self, manager, kind, func):
+        """Creates an empty aggregate of the given kind on objects
+        managed by `manager`, aggregating `func(obj)`.
+
+        Raises:
+            ValueError: If `kind` is not one of `KINDS`.
+
+        """
+        if kind not in self.KINDS:
+            raise ValueError(kind)
+        self.manager = manager
+        self.kind = kind
+        self.func = func
+        self.counts = {}
+        self.results = {}
+        self._props = {}
+
+    def pairadded(self, keyID, valID):
+        if self.kind == 'count':
+            self.counts[keyID] = self.counts.get(keyID, 0) + 1
+            return
+        try:
+            entry = self._props[valID]
+        except KeyError:
+            val = None if valID is None else self.manager.objects[valID]
+            entry = self._props[valID] = [self.func(val), 0]
+        entry[1] += 1
+        if entry[0] is None:
+            return
+        self.counts[keyID] = self.counts.get(keyID, 0) + 1
+        if self.kind == 'sum':
+            self.results[keyID] = self.results.get(keyID, 0) + entry[0]
+        else:
+            self.results.setdefault(keyID, sortedlist()).add(entry[0])
+
+    def pairremoved(self, keyID, valID):
+        if self.kind != 'count':
+            entry = self._props[valID]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._props[valID]
+            if entry[0] is None:
+                return
+            if self.kind == 'sum':
+                self.results[keyID] -= entry[0]
+            else:
+                self.results[keyID].remove(entry[0])
+        self.counts[keyID] -= 1
+        if not self.counts[keyID]:
+            del self.counts[keyID]
+            self.results.pop(keyID, None)
+
+    def get(self, keyID):
+        """Returns the aggregate of the values of the given key ID. The
+        count or sum of a key without values is 0.
+
+        Raises:
+            KeyError: If the minimum or maximum is requested for a key
+                without values.
+
+        """
+        if self.kind == 'count':
+            return self.counts.get(keyID, 0)
+        if self.kind == 'sum':
+            return self.results.get(keyID, 0)
+        values = self.results[keyID]
+        return values[0] if self.kind == 'min' else values[-1]
+
+    def rebuild(self, pairs):
+        """Clears the aggregate and refills it from the given ID
+        pairs.
+
+        """
+        self.counts = {}
+        self.results = {}
+        self._props = {}
+        for keyID, valID in pairs:
+            self.pairadded(keyID, valID)
+
+class ResultCache():
+    """A bounded cache of the results of looking up keys in a relation.
+
+    The cache holds the results of `__getitem__`, indexed by key ID, and
+    evicts the least recently used result when it is full. It is
+    registered as a listener on the ID-level map of the relation, so
+    that the result for a key is discarded whenever a pair with that key
+    is added or removed, including through the inverse relation.
+
+    Attributes:
+        maxsize (int): The maximum number of results to hold.
+        results (OrderedDict of int:obj): The cached results, indexed by
+            key ID, from least to most recently used.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups not answered from the cache.
+
+    """
+
+    def __init__(self, maxsize):
+        """Creates an empty cache holding at most `maxsize` results."""
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, keyID):
+        """Returns the cached result for the given key ID. Raises a
+        KeyError if there is none.
+
+        """
+        try:
+            result = self.results[keyID]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.results.move_to_end(keyID)
+        self.hits += 1
+        return result
+
+    def put(self, keyID, result):
+        """Caches the result for the given key ID."""
+        self.results[keyID] = result
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    def pairadded(self, keyID, valID):
+        self.results.pop(keyID, None)
+
+    def pairremoved(self, keyID, valID):
+        self.results.pop(keyID, None)
+
+    def __reduce_ex__(self, protocol):
+        return (ResultCache, (self.maxsize,))
+
+class RelationView():
+    """A read-only view of a relation between managed objects at a past
+    version, returned by `Relation.at`.
+
+    A view of a OneToOne relation maps each key object to its value
+    object. Otherwise, iterating over the view yields key-value pairs,
+    and `view[key]` is the value object of `key` for a ManyToOne
+    relation, or else the tuple of its value objects.
+
+    Attributes:
+        relation (Relation): The relation viewed.
+        map (BiMappingView or MultiMappingView): The view of the map of
+            the relation.
+
+    """
+
+    def __init__(self, relation, map):
+        self.relation = relation
+        self.map = map
+
+    @property
+    def version(self):
+        """The version viewed."""
+        return self.map.version
+
+    @property
+    def inverse(self):
+        """The view of the inverse relation at the same version."""
+        return self.relation.inverse.at(self.version)
+
+    def _object(self, objID):
+        if objID is None:
+            return None
+        return self.relation._m_manager.objects[objID]
+
+    def __getitem__(self, key):
+        keyID = None if key is None else key._m_id
+        try:
+            vals = self.map[keyID]
+        except KeyError:
+            raise KeyError(key)
+        if isinstance(self.map, Mapping):
+            return self._object(vals)
+        if self.relation.map._single:
+            return self._object(next(iter(vals)))
+        return tuple(self._object(valID) for valID in vals)
+
+    def __contains__(self, elem):
+        if isinstance(self.map, Mapping):
+            return (None if elem is None else elem._m_id) in self.map
+        try:
+            key, val = elem
+        except (TypeError, ValueError):
+            return False
+        keyID = None if key is None else key._m_id
+        valID = None if val is None else val._m_id
+        return (keyID, valID) in self.map
+
+    def __iter__(self):
+        if isinstance(self.map, Mapping):
+            return (self._object(keyID) for keyID in self.map)
+        return (
+            (self._object(keyID), self._object(valID))
+            for keyID, valID in self.map
+        )
+
+    def __len__(self):
+        return len(self.map)
+
+    def keys(self):
+        """Returns an iterator over the key objects present at the
+        viewed version.
+
+        """
+        return (self._object(keyID) for keyID in self.map.keys())
+
+    def close(self):
+        """Releases the view. See `history.BiMappingView.close`."""
+        self.map.close()
+
+class Relation():
+    """Methods common to all relations between managed objects.
+
+    This is a mixin for the relation classes below. It expects the
+    relation to store its pairs of IDs in a `map` attribute, which must
+    be an `Observable` mapping.
+
+    A pickled relation stores its map, its indexes and aggregates, and
+    the size of its cache, but not the cached results. The `validate`
+    method of an inverse relation is restored on loading. Listeners
+    registered directly on the map, rather than through the relation,
+    are not pickled.
+
+    """
+    _cache = None
+
+    @property
+    def indexes(self):
+        """The dictionary of secondary indexes on the relation, keyed by
+        name.
+
+        """
+        try:
+            return self._indexes
+        except AttributeError:
+            self._indexes = {}
+            return self._indexes
+
+    def addindex(self, name, func=None):
+        """Registers a secondary index on the value objects, to be
+        queried with `where`. To index the key objects instead, register
+        the index on the inverse relation.
+
+        Args:
+            name (str): The name of the index.
+            func (callable, optional): A function computing the indexed
+                property of a value object. Defaults to reading the
+                attribute called `name`, or None for objects without
+                that attribute.
+
+        Raises:
+            ValueError: If an index called `name` already exists.
+
+        """
+        if name in self.indexes:
+            raise ValueError(name)
+        if func is None:
+            func = partial(_getprop, name)
+        index = Index(self._m_manager, func)
+        index.rebuild(self._idpairs())
+        self.map.addlistener(index)
+        self.indexes[name] = index
+
+    def removeindex(self, name):
+        """Unregisters the secondary index called `name`."""
+        index = self.indexes.pop(name)
+        self.map.removelistener(index)
+
+    def reindex(self, name):
+        """Rebuilds the secondary index called `name`, for use after the
+        indexed property of a related object has changed.
+
+        """
+        self.indexes[name].rebuild(self._idpairs())
+
+    @property
+    def aggregates(self):
+        """The dictionary of aggregates of the relation, keyed by
+        name.
+
+        """
+        try:
+            return self._aggregates
+        except AttributeError:
+            self._aggregates = {}
+            return self._aggregates
+
+    def addaggregate(self, name, kind, attr=None, func=None):
+        """Registers an aggregate of the values of each key, to be read
+        with `aggregate`. To aggregate the keys of each value instead,
+        register the aggregate on the inverse relation.
+
+        Args:
+            name (str): The name of the aggregate.
+            kind (str): One of `'count'`, `'sum'`, `'min'`, and `'max'`.
+            attr (str, optional): The name of the attribute of the value
+                objects to aggregate, read as None for objects without
+                that attribute. Not needed for a count.
+            func (callable, optional): A function computing the property
+                of a value object to aggregate, instead of `attr`.
+
+        Raises:
+            ValueError: If an aggregate called `name` already exists, if
+                `kind` is not a known kind, or if neither `attr` nor
+                `func` is given for a kind other than a count.
+
+        """
+        if name in self.aggregates:
+            raise ValueError(name)
+        if func is None:
+            if attr is None and kind != 'count':
+                raise ValueError(
+                    'a {0} aggregate needs attr or func'.format(kind)
+                )
+            func = partial(_getprop, attr)
+        aggregate = Aggregate(self._m_manager, kind, func)
+        aggregate.rebuild(self._idpairs())
+        self.map.addlistener(aggregate)
+        self.aggregates[name] = aggregate
+
+    def removeaggregate(self, name):
+        """Unregisters the aggregate called `name`."""
+        aggregate = self.aggregates.pop(name)
+        self.map.removelistener(aggregate)
+
+    def reaggregate(self, name):
+        """Rebuilds the aggregate called `name`, for use after the
+        aggregated property of a related object has changed.
+
+        """
+        self.aggregates[name].rebuild(self._idpairs())
+
+    def aggregate(self, name, key):
+        """Returns the value of the aggregate called `name` for the
+        given key object. See `Aggregate.get`.
+
+        """
+        keyID = None if key is None else key._m_id
+        try:
+            return self.aggregates[name].get(keyID)
+        except KeyError:
+            if name not in self.aggregates:
+                raise
+            raise KeyError(key)
+
+    @property
+    def cache(self):
+        """The ResultCache of the relation, or None if caching is not
+        enabled.
+
+        """
+        return self._cache
+
+    def enablecache(self, maxsize=1024):
+        """Caches the results of `__getitem__` for up to `maxsize` keys.
+        If the `map` of the relation is replaced, caching must be enabled
+        again.
+
+        """
+        self.disablecache()
+        self._cache = ResultCache(maxsize)
+        self.map.addlistener(self._cache)
+
+    def disablecache(self):
+        """Stops caching the results of `__getitem__`, if enabled."""
+        if self._cache is not None:
+            self.map.removelistener(self._cache)
+            self._cache = None
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the relation, broken down
+        by structure. The structures of the map are reported under
+        `'map.'` followed by their names, and the secondary indexes and
+        result cache under `'indexes'` and `'cache'`, and the aggregates
+        under `'aggregates'`. The total is
+        reported under `'total'`.
+
+        Args:
+            seen (set of int, optional): The ids of the objects already
+                counted, which are not counted again. The map of an
+                inverse relation shares its storage with the map of the
+                relation, so it is counted only once if the same set is
+                used to measure both.
+
+        """
+        if seen is None:
+            seen = set()
+        usage = {'object': 0}
+        if id(self) not in seen:
+            seen.add(id(self))
+            usage['object'] = getsizeof(self) + getsizeof(vars(self))
+        for name, size in self.map.memory_usage(seen).items():
+            if name != 'total':
+                usage['map.' + name] = size
+        usage['indexes'] = sum(
+            containersize(index.groups, seen)
+            + containersize(index._props, seen)
+            for index in self.indexes.values()
+        )
+        usage['aggregates'] = sum(
+            containersize(aggregate.counts, seen)
+            + containersize(aggregate.results, seen)
+            + containersize(aggregate._props, seen)
+            for aggregate in self.aggregates.values()
+        )
+        usage['cache'] = 0
+        if self._cache is not None:
+            usage['cache'] = containersize(self._cache.results, seen)
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def __reduce_ex__(self, protocol):
+        state = dict(vars(self))
+        if state.pop('validate', None) is not None:
+            state['_m_inverted'] = True
+        return (__newobj__, (type(self),), state)
+
+    def __setstate__(self, state):
+        if state.pop('_m_inverted', False):
+            self.validate = MethodType(_inversevalidate, self)
+        self.__dict__.update(state)
+        for index in self.indexes.values():
+            self.map.addlistener(index)
+        for aggregate in self.aggregates.values():
+            self.map.addlistener(aggregate)
+        if self._cache is not None:
+            self.map.addlistener(self._cache)
+
+    def freeze(self):
+        """Returns a new relation of the same type, managed by the same
+        Manager, whose map is an immutable, array-backed copy of this
+        relation's map. It has the same secondary indexes, is hashable,
+        and raises a TypeError on any attempt to modify it. See
+        `frozenrelations.freeze`.
+
+        """
+        cls = getattr(type(self), '_uninstrumented', type(self))
+        frozen = self._m_manager.make(cls)
+        frozen.map = self.map.freeze()
+        for name, index in self.indexes.items():
+            frozen.addindex(name, index.func)
+        for name, aggregate in self.aggregates.items():
+            frozen.addaggregate(name, aggregate.kind, func=aggregate.func)
+        return frozen
+
+    def __hash__(self):
+        return hash(self.map)
+
+    def set(self, key, val, ttl=None, now=None):
+        """Adds the given key-value pair, like `self[key] = val`, and sets
+        it to expire after `ttl` seconds. The deadline is not set if
+        `validate` rejects the pair. See `expiry.Expirable.set`.
+
+        """
+        self[key] = val
+        keyID = None if key is None else key._m_id
+        valID = None if val is None else val._m_id
+        if isinstance(self.map, BiMapping):
+            present = keyID in self.map and self.map[keyID] == valID
+        else:
+            present = (keyID, valID) in self.map
+        if present:
+            self.map._schedule(keyID, valID, ttl, now)
+
+    def expire(self, now=None):
+        """Removes the pairs whose deadline is at or before `now`, and
+        returns the list of them. See `expiry.Expirable.expire`.
+
+        """
+        return [
+            (
+                None if keyID is None else self._m_manager.objects[keyID],
+                None if valID is None else self._m_manager.objects[valID]
+            )
+            for keyID, valID in self.map.expire(now)
+        ]
+
+    def track(self):
+        """Starts recording the changes to the relation, and returns the
+        current version. See `changelog.Trackable.track`.
+
+        """
+        return self.map.track()
+
+    @property
+    def version(self):
+        """The number of changes recorded since `track` was first
+        called, or None if changes are not tracked.
+
+        """
+        return self.map.version
+
+    def diff(self, since):
+        """Returns the `Patch` holding the net changes to the relation
+        since the given version, as arrays of object IDs. See
+        `changelog.Trackable.diff`.
+
+        """
+        return self.map.diff(since)
+
+    def apply(self, patch):
+        """Applies a `Patch` of object IDs, computed by `diff` on another
+        relation, directly to the map. The objects must be managed by
+        the same Manager, or by one assigning the same IDs, and the
+        pairs are not validated.
+
+        """
+        self.map.apply(patch)
+
+    def trim(self, version):
+        """Discards the changes recorded up to the given version. See
+        `changelog.Trackable.trim`.
+
+        """
+        self.map.trim(version)
+
+    def degree_histogram(self):
+        """Returns a dictionary mapping each degree to the number of keys
+        with that many values. See
+        `degrees.DegreeIndexed.degree_histogram`.
+
+        """
+        return self.map.degree_histogram()
+
+    def top_k_keys(self, k):
+        """Returns a list of the `k` key objects with the most values, as
+        `(key, degree)` tuples in decreasing order of degree.
+
+        """
+        return [
+            (None if keyID is None else self._m_manager.objects[keyID], n)
+            for keyID, n in self.map.top_k_keys(k)
+        ]
+
+    def top_k_values(self, k):
+        """Returns a list of the `k` value objects with the most keys, as
+        `(value, degree)` tuples in decreasing order of degree.
+
+        """
+        return [
+            (None if valID is None else self._m_manager.objects[valID], n)
+            for valID, n in self.map.top_k_values(k)
+        ]
+
+    def versioned(self):
+        """Starts keeping the history of the relation, and returns the
+        current version. See `history.Versionable.versioned`.
+
+        """
+        return self.map.versioned()
+
+    def at(self, version):
+        """Returns a read-only `RelationView` of the relation as it was
+        at the given version. See `history.Versionable.at`.
+
+        """
+        return RelationView(self, self.map.at(version))
+
+    def addattribute(self, name, typecode=None, default=None):
+        """Adds an attribute called `name` to every pair of the relation
+        and its inverse, such as a quantity or a date. The attributes
+        are stored in columns parallel to the pairs of the map, and are
+        removed with their pairs. See
+        `edgeattributes.Attributable.addattribute`.
+
+        """
+        self.map.addattribute(name, typecode, default)
+
+    def removeattribute(self, name):
+        """Removes the attribute called `name` from every pair."""
+        self.map.removeattribute(name)
+
+    def attribute(self, key, val, name):
+        """Returns the attribute called `name` of the given pair. Raises a
+        KeyError if the pair or the attribute does not exist.
+
+        """
+        return self.map.attribute(
+            None if key is None else key._m_id,
+            None if val is None else val._m_id,
+            name
+        )
+
+    def setattribute(self, key, val, name, value):
+        """Sets the attribute called `name` of the given pair. Raises a
+        KeyError if the pair or the attribute does not exist.
+
+        """
+        self.map.setattribute(
+            None if key is None else key._m_id,
+            None if val is None else val._m_id,
+            name, value
+        )
+
+    def attributes(self, name):
+        """Returns the column holding the attribute called `name` of
+        every pair, to be aggregated as a whole. See
+        `edgeattributes.Attributable.attributes`.
+
+        """
+        return self.map.attributes(name)
+
+    def keyattributes(self, key, name):
+        """Returns a list of the attribute called `name` of the pairs of
+        the given key object. Raises a KeyError if the key is not
+        present.
+
+        """
+        keyID = None if key is None else key._m_id
+        try:
+            return self.map.keyattributes(keyID, name)
+        except KeyError:
+            if keyID not in self.map.keys():
+                raise KeyError(key)
+            raise
+
+    def _idpairs(self):
+        """Returns an iterator over the key-value pairs of IDs."""
+        if isinstance(self.map, BiMapping):
+            return iter(self.map.items())
+        return iter(self.map)
+
+    def updateids(self, pairs):
+        """Adds the given key-value pairs of IDs with the `update` method
+        of the map, which is its bulk insertion path, rather than one
+        pair at a time through `__setitem__`.
+
+        The pairs are resolved to objects and checked with `validate`
+        only if the relation overrides it, and those it rejects are
+        skipped. Otherwise they are added as they are, after checking
+        that their IDs are managed.
+
+        Args:
+            pairs (iterable of 2-tuple): The pairs of IDs to add.
+
+        Raises:
+            KeyError: If an ID is not that of a managed object.
+
+        """
+        objects = self._m_manager.objects
+        pairs = list(pairs)
+        validate = getattr(self.validate, '__func__', None)
+        if validate in (OneToOne.validate, ManyToMany.validate):
+            unknown = set(chain.from_iterable(pairs))
+            unknown.difference_update(objects.keys(), (None,))
+            if unknown:
+                raise KeyError(unknown.pop())
+        else:
+            pairs = [
+                (keyID, valID) for keyID, valID in pairs
+                if self.validate(
+                    None if keyID is None else objects[keyID],
+                    None if valID is None else objects[valID]
+                )
+            ]
+        self.map.update(pairs)
+
+    def where(self, key, **criteria):
+        """Returns a tuple of the values of `key` that match the given
+        criteria. For example, `rel.where(char, weight='heavy')` returns
+        the values of `char` whose property indexed under the name
+        `weight` equals `'heavy'`. Each criterion must name a registered
+        index.
+
+        Raises:
+            KeyError: If a criterion does not name an index.
+            TypeError: If no criteria are given.
+
+        """
+        if not criteria:
+            raise TypeError('where() requires at least one criterion')
+        keyID = None if key is None else key._m_id
+        groups = sorted(
+            (self.indexes[name].lookup(keyID, prop)
+            for name, prop in criteria.items()),
+            key=len
+        )
+        valIDs = groups[0]
+        for group in groups[1:]:
+            valIDs = valIDs & group
+        return tuple(
+            None if valID is None else self._m_manager.objects[valID]
+            for valID in valIDs
+        )
+
+class OneToOne(Relation, BiMapping):
     """A one-to-one relation mapping objects to objects.
 
     The OneToOne object, as well as all objects in the relation, should
@@ -62,8 +1102,15 @@ class OneToOne(BiMapping):
 
     def __getitem__(self, key):
         keyID = None if key is None else key._m_id
+        if self._cache is not None:
+            try:
+                return self._cache.get(keyID)
+            except KeyError:
+                pass
         valID = self.map[keyID]
         val = None if valID is None else self._m_manager.objects[valID]
+        if self._cache is not None:
+            self._cache.put(keyID, val)
         return val
 
     def __delitem__(self, key):
@@ -88,9 +1135,7 @@ class OneToOne(BiMapping):
     def __inverse__(self):
         inverse = self._m_manager.make(OneToOne)
         inverse.map = self.map.inverse
-        def validate(slf, key, val):
-            return slf.inverse.validate(val, key)
-        inverse.validate = MethodType(validate, inverse)
+        inverse.validate = MethodType(_inversevalidate, inverse)
         return inverse
 
     def validate(self, key, val):
@@ -116,7 +1161,7 @@ class OneToOne(BiMapping):
             disp += repr(key) + ': ' + repr(val) + ',\n '
         return disp + '})'
 
-class ManyToMany(MultiMapping):
+class ManyToMany(Relation, MultiMapping):
     """A many-to-many relation mapping objects to objects.
 
     The ManyToMany object, as well as all objects in the relation,
@@ -133,6 +1178,13 @@ class ManyToMany(MultiMapping):
     validation fails, the error should be raised from within the
     `validate` method.
 
+    Subclasses that sample the relation with `random_pair`,
+    `random_value`, or `sample` should store it in an
+    `indexedmultidict` instead, by setting `map` in their `__init__`
+    method. Likewise, subclasses holding several copies of a pair, with
+    `increment`, `decrement`, and `count`, should store it in a
+    `bagdict`.
+
     Attributes:
         map (multidict of int:int): The relation is stored under the
             hood as a multidict mapping IDs to IDs, where the IDs are
@@ -150,7 +1202,7 @@ class ManyToMany(MultiMapping):
             return False
         keyID = None if key is None else key._m_id
         valID = None if val is None else val._m_id
-        return keyID, valID in self.map
+        return (keyID, valID) in self.map
 
     def __iter__(self):
         return (
@@ -175,13 +1227,21 @@ class ManyToMany(MultiMapping):
 
     def __getitem__(self, key):
         keyID = None if key is None else key._m_id
+        if self._cache is not None:
+            try:
+                return self._cache.get(keyID)
+            except KeyError:
+                pass
         try:
-            return tuple(
+            vals = tuple(
                 None if valID is None else self._m_manager.objects[valID]
                 for valID in self.map[keyID]
             )
         except KeyError:
             raise KeyError(key)
+        if self._cache is not None:
+            self._cache.put(keyID, vals)
+        return vals
 
     def __setitem__(self, key, val):
         if self.validate(key, val):
@@ -202,16 +1262,103 @@ class ManyToMany(MultiMapping):
             for keyID in self.map.keys()
         )
 
+    def pop(self):
+        """Removes and returns a key-value pair. If the map is an
+        `indexedmultidict`, the pair is chosen at random in constant
+        time.
+
+        """
+        keyID, valID = self.map.pop()
+        return (
+            None if keyID is None else self._m_manager.objects[keyID],
+            None if valID is None else self._m_manager.objects[valID]
+        )
+
+    def random_pair(self):
+        """Returns a random key-value pair. The map must be an
+        `indexedmultidict`, which a subclass can create in its
+        `__init__` method to enable sampling.
+
+        """
+        keyID, valID = self.map.random_pair()
+        return (
+            None if keyID is None else self._m_manager.objects[keyID],
+            None if valID is None else self._m_manager.objects[valID]
+        )
+
+    def random_value(self, key):
+        """Returns a random value of the given key. The map must be an
+        `indexedmultidict`.
+
+        """
+        keyID = None if key is None else key._m_id
+        try:
+            valID = self.map.random_value(keyID)
+        except KeyError:
+            raise KeyError(key)
+        return None if valID is None else self._m_manager.objects[valID]
+
+    def sample(self, k):
+        """Returns a list of `k` distinct random key-value pairs. The map
+        must be an `indexedmultidict`.
+
+        """
+        return [
+            (
+                None if keyID is None else self._m_manager.objects[keyID],
+                None if valID is None else self._m_manager.objects[valID]
+            )
+            for keyID, valID in self.map.sample(k)
+        ]
+
+    def count(self, key, val):
+        """Returns the number of copies of the given pair. The map must
+        be a `bagdict`, which a subclass can create in its `__init__`
+        method so that setting a pair again adds a copy of it.
+
+        """
+        return self.map.count(
+            None if key is None else key._m_id,
+            None if val is None else val._m_id
+        )
+
+    def increment(self, key, val, n=1):
+        """Adds `n` copies of the given pair, if `validate` accepts it.
+        The map must be a `bagdict`.
+
+        """
+        if self.validate(key, val):
+            self.map.increment(
+                None if key is None else key._m_id,
+                None if val is None else val._m_id,
+                n
+            )
+
+    def decrement(self, key, val, n=1):
+        """Removes `n` copies of the given pair, or the pair itself once
+        it has no copies left. The map must be a `bagdict`.
+
+        Raises:
+            KeyError: If the pair is not present.
+
+        """
+        try:
+            self.map.decrement(
+                None if key is None else key._m_id,
+                None if val is None else val._m_id,
+                n
+            )
+        except KeyError:
+            raise KeyError((key, val))
+
     def __inverse__(self):
         inverse = self._m_manager.make(ManyToMany)
         return self._inverseinit(inverse)
 
     def _inverseinit(self, inverse):
         inverse.map = self.map.inverse
-        def validate(slf, key, val):
-            return slf.inverse.validate(val, key)
-        inverse.validate = MethodType(validate, inverse)
-        return inverse        
+        inverse.validate = MethodType(_inversevalidate, inverse)
+        return inverse
 
     def validate(self, key, val):
         """Checks if the given key-value pair may be added to the
@@ -268,11 +1415,19 @@ class ManyToOne(ManyToMany):
 
     def __getitem__(self, key):
         keyID = None if key is None else key._m_id
+        if self._cache is not None:
+            try:
+                return self._cache.get(keyID)
+            except KeyError:
+                pass
         try:
             valID = self.map[keyID]
         except KeyError:
             raise KeyError(key)
-        return None if valID is None else self._m_manager.objects[valID]
+        val = None if valID is None else self._m_manager.objects[valID]
+        if self._cache is not None:
+            self._cache.put(keyID, val)
+        return val
 
     def __repr__(self):
         disp = 'ManyToOne({'
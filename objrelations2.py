@@ -43,7 +43,6 @@ class OneToOne(BiMapping, Managed):
         return Managed.objects[valID]
 
     def __delitem__(self, key):
-        keyID = None if key is None else key._m_id
         try:
             del self.map[id(key)]
         except KeyError:
@@ -1,19 +1,291 @@
-from collections import defaultdict
-from customabcs import BiMapping, MultiMapping
+import random
+from array import array
+from collections import defaultdict, deque
+from collections.abc import MutableSet
+from itertools import chain, count, islice
+from pickle import PickleBuffer
+from sys import getsizeof
+from changelog import Trackable, columns
+from customabcs import BiMapping, MultiMapping, Observable
+from degrees import DegreeIndexed
+from edgeattributes import Attributable
+from expiry import Expirable
+from history import Versionable
+
+CONTAINERS = (dict, set, frozenset, list, tuple)
+BUFFERS = (array, bytearray)
+SAMPLESIZE = 1024
+
+def objectsize(obj):
+    """Returns the number of bytes used by an object and by its
+    `__dict__`, if it has one, but not by the objects it refers to.
 
-class bidict(BiMapping):
+    """
+    size = getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += getsizeof(obj.__dict__)
+    return size
+
+def containersize(obj, seen):
+    """Returns the number of bytes used by a container and by the
+    containers nested in it, but not by the other objects it holds.
+
+    Objects with a `_structures` attribute, listing the names of the
+    attributes that hold their data, are measured as containers of those
+    attributes. Arrays and bytearrays are measured with their buffers,
+    but their elements are not visited.
+
+    To keep the measurement fast, the items of a container are assumed
+    to be alike: a container whose first item is not a container is
+    taken to hold no containers, a set whose first item is a tuple is
+    taken to hold only tuples of that length, as the sets of key-value
+    pairs in a `multidict` do, and the size of the nested containers is
+    estimated from the first `SAMPLESIZE` of them. The time taken thus
+    depends on the number of containers measured, not on the number of
+    objects they hold.
+
+    Args:
+        obj (obj): The container to measure.
+        seen (set of int): The ids of the objects already counted, which
+            are not counted again. The ids of the objects counted here
+            are added to it.
+
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, '_structures'):
+        return objectsize(obj) + sum(
+            containersize(getattr(obj, name), seen)
+            for name in obj._structures
+        )
+    size = getsizeof(obj)
+    if isinstance(obj, dict):
+        items = obj.values()
+    elif isinstance(obj, CONTAINERS):
+        items = obj
+    else:
+        return size
+    for first in items:
+        break
+    else:
+        return size
+    if isinstance(obj, (set, frozenset)) and isinstance(first, tuple):
+        return size + len(obj) * getsizeof(first)
+    if not _iscontainer(first):
+        return size
+    nested = sum(
+        containersize(item, seen)
+        for item in islice(items, SAMPLESIZE) if _iscontainer(item)
+    )
+    return size + nested * len(items) // min(len(items), SAMPLESIZE)
+
+def _iscontainer(obj):
+    return (isinstance(obj, CONTAINERS + BUFFERS)
+            or hasattr(obj, '_structures'))
+
+def elementsize(elems, seen):
+    """Returns the number of bytes used by the given objects, skipping
+    those whose ids are in `seen` and adding the others to it.
+
+    Only the first `SAMPLESIZE` objects are measured, and the size of
+    the others is estimated from theirs, so that large relations are
+    measured quickly.
+
+    """
+    elems = iter(elems)
+    size = 0
+    sampled = 0
+    for elem in islice(elems, SAMPLESIZE):
+        sampled += 1
+        if id(elem) not in seen:
+            seen.add(id(elem))
+            size += getsizeof(elem)
+    if sampled < SAMPLESIZE:
+        return size
+    counter = count()
+    deque(zip(elems, counter), maxlen=0)
+    return size + size * next(counter) // sampled
+
+def memoryusage(obj, seen=None):
+    """Measures the memory used by a relation.
+
+    The relation must list the names of the attributes holding its data
+    in `_structures`, and return an iterable over its keys and values
+    from `_elements`. Large structures and the keys and values are
+    measured from samples, as described in `containersize` and
+    `elementsize`. The keys and values are not counted again when all
+    the structures holding them already were, as for the inverse of a
+    relation measured with the same `seen` set.
+
+    Args:
+        obj (obj): The relation to measure.
+        seen (set of int, optional): The ids of the objects already
+            counted, which are not counted again. The ids of the objects
+            counted here are added to it.
+
+    Returns:
+        dict of str:int: The number of bytes used by the object itself
+            under `'object'`, by each structure under its name, by the
+            keys and values under `'elements'`, and in total under
+            `'total'`.
+
+    """
+    if seen is None:
+        seen = set()
+    usage = {'object': 0}
+    if id(obj) not in seen:
+        seen.add(id(obj))
+        usage['object'] = objectsize(obj)
+    shared = all(
+        id(getattr(obj, name)) in seen for name in obj._structures
+    )
+    for name in obj._structures:
+        usage[name] = containersize(getattr(obj, name), seen)
+    usage['elements'] = 0
+    if not shared:
+        usage['elements'] = elementsize(obj._elements(), seen)
+    usage['total'] = sum(usage.values())
+    return usage
+
+def _pack(pairs, protocol):
+    """Encodes a list of key-value pairs for pickling.
+
+    The keys and values are returned as two separate sequences. If they
+    are all integers that fit in 64 bits, the sequences are packed
+    arrays, which are pickled as raw bytes, or as out-of-band buffers
+    under pickle protocol 5 and above. Otherwise, they are lists.
+
+    """
+    keys, vals = columns(pairs)
+    if isinstance(keys, list):
+        return keys, vals
+    if protocol >= 5:
+        return PickleBuffer(keys), PickleBuffer(vals)
+    return keys.tobytes(), vals.tobytes()
+
+def _unpack(keys, vals):
+    """Decodes the sequences of keys and values produced by `_pack`."""
+    if not isinstance(keys, list):
+        packed = array('q'), array('q')
+        packed[0].frombytes(memoryview(keys).cast('B'))
+        packed[1].frombytes(memoryview(vals).cast('B'))
+        keys, vals = packed
+    return keys, vals
+
+def _unpickle(cls, keys, vals):
+    """Rebuilds an object of type `cls` from the sequences of keys and
+    values produced by `_pack`.
+
+    """
+    keys, vals = _unpack(keys, vals)
+    new = cls()
+    new.update(zip(keys, vals))
+    return new
+
+class indexedset(MutableSet):
+    """A set supporting uniform random choice, sampling, and removal.
+
+    The elements are stored in a list, together with a dictionary
+    mapping each element to its position in the list. An element is
+    removed by moving the last element of the list into its place, so
+    that adding, removing, testing membership, choosing a random
+    element, and popping a random element all take constant time, and
+    sampling `k` elements takes time proportional to `k`.
+
+    The random choices are made with the `random` module.
+
+    """
+    _structures = ('_items', '_pos')
+
+    def __init__(self, iterable=()):
+        """Creates an indexedset containing the elements of
+        `iterable`.
+
+        """
+        self._items = []
+        self._pos = {}
+        for elem in iterable:
+            self.add(elem)
+
+    def __contains__(self, elem):
+        return elem in self._pos
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, elem):
+        """Adds the given element to the set."""
+        if elem not in self._pos:
+            self._pos[elem] = len(self._items)
+            self._items.append(elem)
+
+    def discard(self, elem):
+        """Removes the given element from the set, if present."""
+        pos = self._pos.pop(elem, None)
+        if pos is None:
+            return
+        last = self._items.pop()
+        if pos < len(self._items):
+            self._items[pos] = last
+            self._pos[last] = pos
+
+    def choice(self):
+        """Returns a random element. Raises a KeyError if the set is
+        empty.
+
+        """
+        if not self._items:
+            raise KeyError('choice from an empty set')
+        return self._items[random.randrange(len(self._items))]
+
+    def sample(self, k):
+        """Returns a list of `k` distinct random elements. Raises a
+        ValueError if the set has fewer than `k` elements.
+
+        """
+        return random.sample(self._items, k)
+
+    def pop(self):
+        """Removes and returns a random element. Raises a KeyError if the
+        set is empty.
+
+        """
+        elem = self.choice()
+        self.discard(elem)
+        return elem
+
+    def clear(self):
+        """Removes all elements from the set."""
+        self._items.clear()
+        self._pos.clear()
+
+    def __repr__(self):
+        return 'indexedset(' + repr(self._items) + ')'
+
+class bidict(BiMapping, Observable, Expirable, Trackable, DegreeIndexed,
+             Versionable, Attributable):
     """An invertible, one-to-one dictionary.
 
     The `bidict` object is implemented by linking a forward dictionary
     and a backward dictionary. Because of this, all keys and values must
     be immutable.
 
+    A pickled `bidict` stores only its pairs. Its inverse, if pickled,
+    stores only a reference to it, and is rebuilt from it on loading.
+
     """
+    _isinverse = False
+    _structures = ('_forward', '_backward')
 
     def __init__(self):
         """Creates an empty bidict object."""
         self._forward = {}
         self._backward = {}
+        self._listeners = []
 
     def __getitem__(self, key):
         return self._forward[key]
@@ -22,6 +294,8 @@ class bidict(BiMapping):
         val = self._forward[key]
         del self._forward[key]
         del self._backward[val]
+        if self._listeners:
+            self._pairremoved(key, val)
 
     def __iter__(self):
         return self._forward.__iter__()
@@ -30,15 +304,55 @@ class bidict(BiMapping):
         return len(self._forward)
 
     def __setfreeval__(self, key, val):
+        if key in self._forward:
+            if self._forward[key] == val:
+                return
+            del self[key]
         self._forward[key] = val
         self._backward[val] = key
+        if self._listeners:
+            self._pairadded(key, val)
 
     def __inverse__(self):
         inverse = bidict()
+        return self._inverseinit(inverse)
+
+    def _inverseinit(self, inverse):
         inverse._forward = self._backward
         inverse._backward = self._forward
+        inverse._listeners = self._listeners
+        inverse._isinverse = True
         return inverse
 
+    def __reduce_ex__(self, protocol):
+        if self._isinverse:
+            return (getattr, (self._inverse, 'inverse'))
+        return (
+            _unpickle,
+            (type(self),) + _pack(list(self._forward.items()), protocol)
+        )
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the bidict, broken down by
+        structure. See `memoryusage`. The structures of the inverse are
+        shared with the bidict, so they are counted only once if the
+        same `seen` set is used to measure both.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        return chain(self._forward.keys(), self._backward.keys())
+
+    def freeze(self):
+        """Returns an immutable, array-backed copy of the bidict, which
+        is hashable and takes a fraction of the memory. See
+        `frozenrelations.freeze`.
+
+        """
+        from frozenrelations import freeze
+        return freeze(self)
+
     def __repr__(self):
         return 'bidict(' + repr(self._forward) + ')'
 
@@ -63,6 +377,27 @@ class dictplus(dict):
         if key in self and self[key] == val:
             del self[key]
 
+    def __reduce_ex__(self, protocol):
+        return (
+            _unpickle, (type(self),) + _pack(list(self.items()), protocol)
+        )
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the dictionary, broken down
+        into the dictionary itself and its keys and values. See
+        `memoryusage`.
+
+        """
+        if seen is None:
+            seen = set()
+        usage = {'object': containersize(self, seen), 'elements': 0}
+        if usage['object']:
+            usage['elements'] = elementsize(
+                chain(self.keys(), self.values()), seen
+            )
+        usage['total'] = sum(usage.values())
+        return usage
+
 class dictofsets(MultiMapping):
     """A rudimentary multi-valued dictionary.
 
@@ -86,8 +421,17 @@ class dictofsets(MultiMapping):
     The `dictofsets` class does not implement the `inverse` property.
 
     """
-    def __init__(self):
-        self._dict = defaultdict(set)
+    _structures = ('_dict',)
+
+    def __init__(self, container=set):
+        """Creates an empty dictofsets.
+
+        Args:
+            container (type): The type of the sets of values, which must
+                support `add`, `discard`, `len`, and iteration.
+
+        """
+        self._dict = defaultdict(container)
 
     def __contains__(self, elem):
         try:
@@ -136,10 +480,26 @@ class dictofsets(MultiMapping):
         """Returns an iterator over the keys of `dictofsets`."""
         return self._dict.keys()
 
+    def __reduce_ex__(self, protocol):
+        return (_unpickle, (type(self),) + _pack(list(self), protocol))
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the dictofsets, broken down
+        by structure. See `memoryusage`.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        return chain(
+            self._dict.keys(), chain.from_iterable(self._dict.values())
+        )
+
     def __repr__(self):
         return 'dictofsets(' + repr(dict(self._dict)) + ')'
 
-class multidict(MultiMapping):
+class multidict(MultiMapping, Observable, Expirable, Trackable,
+                DegreeIndexed, Versionable, Attributable):
     """A more robust multi-valued dictionary that is easily inverted.
 
     It is a multi-mapping of immutables to immutables, implemented by
@@ -147,13 +507,25 @@ class multidict(MultiMapping):
     reversed dictionary and a reversed set are also embedded to
     implement the inverse mapping.
 
+    A pickled `multidict` stores only its pairs, rather than all four
+    structures. Its inverse, if pickled, stores only a reference to it,
+    and is rebuilt from it on loading.
+
+    The sets of values and the sets of pairs are of type `_container`,
+    which subclasses may override.
+
     """
+    _isinverse = False
+    _structures = ('_forward', '_backward', '_set', '_rset')
+    _container = set
+
     def __init__(self):
         """Constructs an empty multidict."""
-        self._forward = dictofsets()
-        self._backward = dictofsets()
-        self._set = set()
-        self._rset = set()
+        self._forward = dictofsets(self._container)
+        self._backward = dictofsets(self._container)
+        self._set = self._container()
+        self._rset = self._container()
+        self._listeners = []
 
     def __contains__(self, elem):
         return (elem in self._set)
@@ -177,15 +549,21 @@ class multidict(MultiMapping):
             self._backward.discard((val, key))
             self._set.discard((key, val))
             self._rset.discard((val, key))
+            if self._listeners:
+                self._pairremoved(key, val)
 
     def __getitem__(self, key):
         return self._forward[key]
 
     def __setitem__(self, key, val):
+        if (key, val) in self._set:
+            return
         self._forward[key] = val
         self._backward[val] = key
         self._set.add((key, val))
         self._rset.add((val, key))
+        if self._listeners:
+            self._pairadded(key, val)
 
     def __delitem__(self, key):
         if key not in self._forward.keys():
@@ -198,6 +576,30 @@ class multidict(MultiMapping):
         """Returns an iterator over the keys in the multidict."""
         return self._forward.keys()
 
+    def update(self, *others):
+        """Adds all pairs from the given relations, or iterables of
+        pairs. Unless the multidict has listeners, or is of a subclass
+        constraining its pairs, the pairs are added directly to its
+        structures, which is faster than adding them one at a time.
+
+        """
+        if (self._listeners
+            or type(self).__setitem__ is not multidict.__setitem__
+        ):
+            return MultiMapping.update(self, *others)
+        forward = self._forward._dict
+        backward = self._backward._dict
+        pairs = self._set
+        rpairs = self._rset
+        for other in others:
+            for key, val in other:
+                if (key, val) in pairs:
+                    continue
+                forward[key].add(val)
+                backward[val].add(key)
+                pairs.add((key, val))
+                rpairs.add((val, key))
+
     def __inverse__(self):
         inverse = multidict()
         return self._inverseinit(inverse)
@@ -207,8 +609,36 @@ class multidict(MultiMapping):
         inverse._backward = self._forward
         inverse._set = self._rset
         inverse._rset = self._set
+        inverse._listeners = self._listeners
+        inverse._isinverse = True
         return inverse
 
+    def __reduce_ex__(self, protocol):
+        if self._isinverse:
+            return (getattr, (self._inverse, 'inverse'))
+        return (_unpickle, (type(self),) + _pack(list(self), protocol))
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the multidict, broken down
+        by structure. See `memoryusage`. The structures of the inverse
+        are shared with the multidict, so they are counted only once if
+        the same `seen` set is used to measure both.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        return chain(self._forward.keys(), self._backward.keys())
+
+    def freeze(self):
+        """Returns an immutable, array-backed copy of the multidict, which
+        is hashable and takes a fraction of the memory. See
+        `frozenrelations.freeze`.
+
+        """
+        from frozenrelations import freeze
+        return freeze(self)
+
     def copy(self):
         """Creates and returns a copy of the multidict object."""
         new = multidict()
@@ -222,6 +652,211 @@ class multidict(MultiMapping):
     def __repr__(self):
         return 'multidict(' + repr(dict(self._forward._dict)) + ')'
 
+class indexedmultidict(multidict):
+    """A `multidict` supporting uniform random sampling.
+
+    Its sets of values and sets of pairs are `indexedset` objects, so
+    that a random pair, a random value of a key, or a sample of pairs
+    can be chosen without copying, and `pop` removes a random pair in
+    constant time. It uses more memory than a `multidict`.
+
+    """
+    _container = indexedset
+
+    def random_pair(self):
+        """Returns a random key-value pair. Raises a KeyError if the
+        indexedmultidict is empty.
+
+        """
+        return self._set.choice()
+
+    def random_value(self, key):
+        """Returns a random value of the given key. Raises a KeyError if
+        the key is not present.
+
+        """
+        vals = self._forward._dict.get(key)
+        if not vals:
+            raise KeyError(key)
+        return vals.choice()
+
+    def sample(self, k):
+        """Returns a list of `k` distinct random key-value pairs. Raises
+        a ValueError if there are fewer than `k` pairs.
+
+        """
+        return self._set.sample(k)
+
+    def pop(self):
+        """Removes and returns a random key-value pair. Raises a KeyError
+        if the indexedmultidict is empty.
+
+        """
+        pair = self._set.choice()
+        self.discard(pair)
+        return pair
+
+    def __inverse__(self):
+        inverse = indexedmultidict()
+        return self._inverseinit(inverse)
+
+    def copy(self):
+        """Creates and returns a copy of the indexedmultidict object."""
+        new = indexedmultidict()
+        return self._fillcopy(new)
+
+    def __repr__(self):
+        return 'indexedmultidict(' + repr(
+            {key: set(vals) for key, vals in self._forward._dict.items()}
+        ) + ')'
+
+class bagdict(multidict):
+    """A `multidict` counting the copies of each key-value pair.
+
+    Setting a pair that is present adds a copy of it, rather than doing
+    nothing, and each pair holds its number of copies in a single
+    counter, shared with the inverse. The pair remains present, once,
+    in the other structures of the multidict, so `len`, iteration, and
+    `__getitem__` see each distinct pair once. Listeners are notified
+    with `pairadded` when a pair gains its first copy and `pairremoved`
+    when it loses its last one, and those with a `paircounted` method
+    of every change in the number of copies, so that the undo journal
+    of a `Manager` and a `changelog.Changelog` can restore the counts.
+
+    A pickled `bagdict` stores each pair as many times as it has
+    copies.
+
+    """
+    _structures = multidict._structures + ('_counts',)
+
+    def __init__(self):
+        """Constructs an empty bagdict."""
+        multidict.__init__(self)
+        self._counts = {}
+
+    def _pair(self, key, val):
+        return (val, key) if self._isinverse else (key, val)
+
+    def count(self, key, val):
+        """Returns the number of copies of the given pair, which is 0 if
+        the pair is not present.
+
+        """
+        return self._counts.get(self._pair(key, val), 0)
+
+    def increment(self, key, val, n=1):
+        """Adds `n` copies of the given pair. Raises a ValueError if `n`
+        is not positive.
+
+        """
+        if n < 1:
+            raise ValueError(n)
+        pair = self._pair(key, val)
+        count = self._counts.get(pair, 0)
+        self._counts[pair] = count + n
+        if not count:
+            multidict.__setitem__(self, key, val)
+        if self._listeners:
+            self._paircounted(key, val, count, count + n)
+
+    def decrement(self, key, val, n=1):
+        """Removes `n` copies of the given pair, or all of them if it has
+        at most `n`, in which case the pair is removed.
+
+        Raises:
+            KeyError: If the pair is not present.
+            ValueError: If `n` is not positive.
+
+        """
+        if n < 1:
+            raise ValueError(n)
+        pair = self._pair(key, val)
+        count = self._counts.get(pair, 0)
+        if not count:
+            raise KeyError((key, val))
+        if count > n:
+            self._counts[pair] = count - n
+            if self._listeners:
+                self._paircounted(key, val, count, count - n)
+        else:
+            self.discard((key, val))
+
+    def _setcount(self, key, val, count):
+        """Adds or removes copies of the given pair until it has `count`
+        copies, removing it if `count` is 0.
+
+        """
+        current = self.count(key, val)
+        if count > current:
+            self.increment(key, val, count - current)
+        elif count < current:
+            self.decrement(key, val, current - count)
+
+    def __setitem__(self, key, val):
+        self.increment(key, val)
+
+    def discard(self, elem):
+        """Removes the given key-value pair, with all of its copies, if
+        present.
+
+        Args:
+            elem (2-tuple): The key-value pair to discard.
+
+        """
+        if elem in self:
+            key, val = elem
+            count = self._counts.pop(self._pair(key, val))
+            multidict.discard(self, elem)
+            if self._listeners:
+                self._paircounted(key, val, count, 0)
+
+    def total(self):
+        """Returns the number of copies of all the pairs."""
+        return sum(self._counts.values())
+
+    def _countitems(self):
+        if self._isinverse:
+            return (
+                ((val, key), count)
+                for (key, val), count in self._counts.items()
+            )
+        return iter(self._counts.items())
+
+    def elements(self):
+        """Returns an iterator over the key-value pairs, repeating each
+        pair as many times as it has copies.
+
+        """
+        for pair, count in self._countitems():
+            for _ in range(count):
+                yield pair
+
+    def __inverse__(self):
+        inverse = bagdict()
+        inverse = self._inverseinit(inverse)
+        inverse._counts = self._counts
+        return inverse
+
+    def __reduce_ex__(self, protocol):
+        if self._isinverse:
+            return (getattr, (self._inverse, 'inverse'))
+        return (
+            _unpickle, (type(self),) + _pack(list(self.elements()), protocol)
+        )
+
+    def copy(self):
+        """Creates and returns a copy of the bagdict object."""
+        new = bagdict()
+        for (key, val), count in self._countitems():
+            new.increment(key, val, count)
+        return new
+
+    def __repr__(self):
+        counts = {}
+        for (key, val), count in self._countitems():
+            counts.setdefault(key, {})[val] = count
+        return 'bagdict(' + repr(counts) + ')'
+
 class inversedict(multidict):
     """A `multidict` whose values are disjoint sets.
 
@@ -236,6 +871,8 @@ class inversedict(multidict):
 
     def __setitem__(self, key, val):
         if val in self._backward.keys():
+            if self._backward[val] == key:
+                return
             raise ValueError(val)
         multidict.__setitem__(self, key, val)
 
@@ -257,11 +894,20 @@ class invertibledict(multidict):
     Its inverse is implemented as an `inversedict` object.
 
     """
+    _single = True
+
     def __init__(self):
         """Constructs an empty invertibledict."""
         multidict.__init__(self)
         self._forward = dictplus()
 
+    def __setitem__(self, key, val):
+        if key in self._forward.keys():
+            if self._forward[key] == val:
+                return
+            self.discard((key, self._forward[key]))
+        multidict.__setitem__(self, key, val)
+
     def __delitem__(self, key):
         if key not in self._forward.keys():
             raise KeyError(key)
@@ -0,0 +1,389 @@
+"""Serves the relations of a `Manager` to other processes over a socket.
+
+The server hosts one authoritative `Manager` and runs every request
+against it, so that the relations validate their pairs as usual. Since
+the managed objects live in the server process, clients refer to them
+by their IDs.
+
+Requests and responses are JSON documents, each preceded by its length
+as a 4-byte big-endian integer. A client sends batches of requests as
+`[batchID, [[op, relationID, arg...], ...]]` and receives
+`[batchID, [[ok, result], ...]]`, where `result` is an `[errortype,
+args]` pair when `ok` is false. Batches are answered in order on each
+connection, so a client can keep several in flight.
+
+"""
+import asyncio
+import json
+import struct
+from itertools import count
+from customabcs import BiMapping
+
+HEADER = struct.Struct('>I')
+ERRORS = {'KeyError': KeyError, 'ValueError': ValueError,
+          'TypeError': TypeError}
+WRITES = ('set', 'delete', 'discard')
+
+def _frame(obj):
+    data = json.dumps(obj, separators=(',', ':')).encode()
+    return HEADER.pack(len(data)) + data
+
+def _encodes(obj):
+    try:
+        json.dumps(obj)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+async def _readframe(reader):
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return json.loads(await reader.readexactly(size))
+
+async def serve(manager, host='127.0.0.1', port=0, path=None):
+    """Starts serving the relations of the given Manager, and returns
+    the running `RelationServer`.
+
+    Args:
+        manager (Manager): The Manager holding the relations.
+        host (str): The address to listen on. Defaults to localhost.
+        port (int): The TCP port to listen on. Defaults to a free port,
+            which can be read from the `address` of the server.
+        path (str, optional): The path of a Unix socket to listen on
+            instead of a TCP port.
+
+    """
+    server = RelationServer(manager)
+    await server.start(host, port, path)
+    return server
+
+async def connect(host='127.0.0.1', port=None, path=None, poolsize=4):
+    """Connects to a `RelationServer` at the given TCP address or Unix
+    socket path, and returns a `RelationClient` with a pool of
+    `poolsize` connections.
+
+    """
+    connections = []
+    for _ in range(poolsize):
+        if path is None:
+            streams = await asyncio.open_connection(host, port)
+        else:
+            streams = await asyncio.open_unix_connection(path)
+        connections.append(_connection(*streams))
+    return RelationClient(connections)
+
+class RelationServer():
+    """An asyncio server answering requests on the relations of a
+    Manager.
+
+    Each batch is run to completion before the next one is read, so a
+    batch is atomic with respect to the requests of other clients.
+
+    Attributes:
+        manager (Manager): The Manager holding the relations.
+        OPS (dict of str:function): The operations a request can name,
+            and the methods running them.
+
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """Starts listening. See `serve`."""
+        if path is None:
+            self._server = await asyncio.start_server(
+                self._serve, host, port
+            )
+        else:
+            self._server = await asyncio.start_unix_server(
+                self._serve, path
+            )
+
+    @property
+    def address(self):
+        """The address the server listens on: a `(host, port)` tuple, or
+        the path of its Unix socket.
+
+        """
+        return self._server.sockets[0].getsockname()
+
+    async def close(self):
+        """Stops listening and waits until the server is closed."""
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                batchID, requests = await _readframe(reader)
+                writer.write(self._respond(
+                    batchID, [self.execute(request) for request in requests]
+                ))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, batchID, responses):
+        try:
+            return _frame([batchID, responses])
+        except (TypeError, ValueError):
+            error = [False, ['TypeError', ['result is not serializable']]]
+            return _frame([batchID, [
+                response if _encodes(response) else error
+                for response in responses
+            ]])
+
+    def execute(self, request):
+        """Runs one request and returns its `[ok, result]` response. The
+        operation must be one of those listed in `OPS`.
+
+        """
+        try:
+            op, relID, *args = request
+            if op not in self.OPS:
+                raise ValueError('unknown operation: {}'.format(op))
+            return [True, self.OPS[op](self, self._object(relID), *args)]
+        except Exception as error:
+            return [False, [type(error).__name__, list(map(str, error.args))]]
+
+    def _object(self, objID):
+        return None if objID is None else self.manager.objects[objID]
+
+    def _id(self, obj):
+        return None if obj is None else obj._m_id
+
+    def _get(self, rel, keyID):
+        result = rel[self._object(keyID)]
+        if isinstance(result, tuple):
+            return [self._id(val) for val in result]
+        return self._id(result)
+
+    def _set(self, rel, keyID, valID):
+        rel[self._object(keyID)] = self._object(valID)
+
+    def _delete(self, rel, keyID):
+        del rel[self._object(keyID)]
+
+    def _discard(self, rel, keyID, valID):
+        rel.discard((self._object(keyID), self._object(valID)))
+
+    def _contains(self, rel, *elem):
+        if isinstance(rel, BiMapping):
+            return elem[0] in rel.map
+        return tuple(elem) in rel.map
+
+    def _keys(self, rel):
+        return list(rel.map.keys())
+
+    def _len(self, rel):
+        return len(rel.map)
+
+    def _inverse(self, rel):
+        return rel.inverse._m_id
+
+    OPS = {
+        'get': _get, 'set': _set, 'delete': _delete, 'discard': _discard,
+        'contains': _contains, 'keys': _keys, 'len': _len,
+        'inverse': _inverse,
+    }
+
+class _connection():
+    """One connection of a `RelationClient`, matching the responses it
+    receives to the futures of the batches sent on it.
+
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._waiting = {}
+        self._batchIDs = count()
+        self._task = asyncio.get_running_loop().create_task(self._receive())
+
+    def send(self, batch):
+        """Sends a list of `(request, future)` tuples as one batch. The
+        futures of the requests that cannot be serialized fail with a
+        TypeError, and the others are sent.
+
+        """
+        batchID = next(self._batchIDs)
+        try:
+            data = _frame([batchID, [req for req, _ in batch]])
+        except (TypeError, ValueError):
+            for request, future in batch:
+                if not _encodes(request):
+                    future.set_exception(TypeError(
+                        'request is not serializable: {!r}'.format(request)
+                    ))
+            batch = [(req, future) for req, future in batch
+                     if not future.done()]
+            if not batch:
+                return
+            data = _frame([batchID, [req for req, _ in batch]])
+        self._waiting[batchID] = [future for _, future in batch]
+        self._writer.write(data)
+
+    async def _receive(self):
+        try:
+            while True:
+                batchID, responses = await _readframe(self._reader)
+                futures = self._waiting.pop(batchID)
+                for future, (ok, result) in zip(futures, responses):
+                    if future.done():
+                        continue
+                    if ok:
+                        future.set_result(result)
+                    else:
+                        name, args = result
+                        future.set_exception(
+                            ERRORS.get(name, RuntimeError)(*args)
+                        )
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            for futures in self._waiting.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ConnectionError(error))
+            self._waiting.clear()
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        await self._task
+
+class RelationClient():
+    """A client of a `RelationServer`.
+
+    The requests made during one iteration of the event loop are
+    coalesced into a single batch, in which repeated reads of the same
+    key share a single request. Batches are pipelined: a batch is sent
+    without waiting for the responses to earlier ones. Read-only
+    batches are spread over the pool of connections. Batches containing
+    writes, and all batches sent while writes are outstanding, use the
+    first connection, so that reads always see the client's own
+    writes.
+
+    """
+
+    def __init__(self, connections):
+        self._connections = connections
+        self._next = 0
+        self._pending = []
+        self._reads = {}
+        self._writes = set()
+
+    def relation(self, relID):
+        """Returns a `RemoteRelation` proxy of the relation with the
+        given ID.
+
+        """
+        return RemoteRelation(self, relID)
+
+    def request(self, *request):
+        """Queues a request for the next batch, and returns the future
+        of its result. A write ends the coalescing of the reads queued
+        before it, so that the reads queued after it see its effect.
+
+        """
+        if request[0] not in WRITES and request in self._reads:
+            return self._reads[request]
+        future = asyncio.get_running_loop().create_future()
+        if not self._pending:
+            asyncio.get_running_loop().call_soon(self._send)
+        self._pending.append((list(request), future))
+        if request[0] in WRITES:
+            self._reads.clear()
+            self._writes.add(future)
+            future.add_done_callback(self._writes.discard)
+        else:
+            self._reads[request] = future
+        return future
+
+    def _send(self):
+        batch, self._pending = self._pending, []
+        self._reads = {}
+        if self._writes:
+            connection = self._connections[0]
+        else:
+            self._next = (self._next + 1) % len(self._connections)
+            connection = self._connections[self._next]
+        connection.send(batch)
+
+    async def flush(self):
+        """Waits until all outstanding writes have been applied, and
+        raises the error of the first that failed, if any.
+
+        """
+        writes = list(self._writes)
+        for error in await asyncio.gather(*writes, return_exceptions=True):
+            if isinstance(error, Exception):
+                raise error
+
+    async def close(self):
+        """Waits for the outstanding writes and closes the connections."""
+        try:
+            await self.flush()
+        finally:
+            for connection in self._connections:
+                await connection.close()
+
+class RemoteRelation():
+    """A proxy of a relation hosted by a `RelationServer`.
+
+    It has the same `__getitem__`, `__setitem__`, `__delitem__`,
+    `discard`, and `keys` methods as the `objrelations` classes, except
+    that the related objects are given and returned as IDs, and that
+    the reads return futures to be awaited, as in `await rel[keyID]`.
+    Writes return immediately; their errors are raised by
+    `RelationClient.flush`. Since `in` and `len` cannot be awaited,
+    `contains` and `size` take their place.
+
+    Attributes:
+        client (RelationClient): The client sending the requests.
+        relID (int): The ID of the relation.
+
+    """
+
+    def __init__(self, client, relID):
+        self.client = client
+        self.relID = relID
+
+    def __getitem__(self, keyID):
+        return self.client.request('get', self.relID, keyID)
+
+    def __setitem__(self, keyID, valID):
+        self.client.request('set', self.relID, keyID, valID)
+
+    def __delitem__(self, keyID):
+        self.client.request('delete', self.relID, keyID)
+
+    def discard(self, elem):
+        """Queues the removal of the given pair of IDs, and returns the
+        future of its completion.
+
+        """
+        keyID, valID = elem
+        return self.client.request('discard', self.relID, keyID, valID)
+
+    def contains(self, *elem):
+        """Returns a future of whether the given key ID (for a OneToOne
+        relation) or pair of IDs is present.
+
+        """
+        return self.client.request('contains', self.relID, *elem)
+
+    def keys(self):
+        """Returns a future of the list of key IDs."""
+        return self.client.request('keys', self.relID)
+
+    def size(self):
+        """Returns a future of the number of pairs."""
+        return self.client.request('len', self.relID)
+
+    async def inverse(self):
+        """Returns the proxy of the inverse relation."""
+        return RemoteRelation(
+            self.client, await self.client.request('inverse', self.relID)
+        )
@@ -0,0 +1,468 @@
+from collections.abc import Set
+from itertools import chain
+from changelog import Trackable
+from customabcs import BiMapping, MultiMapping, Observable
+from degrees import DegreeIndexed
+from edgeattributes import Attributable
+from expiry import Expirable
+from history import Versionable
+from relations import bidict, multidict, memoryusage
+
+_EMPTY = frozenset()
+
+def _merge(shard, group):
+    for key, vals in group.items():
+        old = shard.get(key)
+        if old is None:
+            shard[key] = vals
+        else:
+            old |= vals
+
+def _copy(shard):
+    return {key: set(vals) for key, vals in shard.items()}
+
+def _union(shard, other):
+    new = _copy(shard)
+    _merge(new, _copy(other))
+    return new
+
+def _intersection(shard, other):
+    new = {}
+    for key, vals in shard.items():
+        common = vals & other.get(key, _EMPTY)
+        if common:
+            new[key] = common
+    return new
+
+def _difference(shard, other):
+    new = {}
+    for key, vals in shard.items():
+        rest = vals - other.get(key, _EMPTY)
+        if rest:
+            new[key] = rest
+    return new
+
+def _biunion(shard, other):
+    new = dict(shard)
+    new.update(other)
+    return new
+
+def _biintersection(shard, other):
+    return {key: val for key, val in shard.items()
+            if key in other and other[key] == val}
+
+def _bidifference(shard, other):
+    return {key: val for key, val in shard.items()
+            if not (key in other and other[key] == val)}
+
+class shardedkeys(Set):
+    """A view of the keys of a sharded relation."""
+
+    def __init__(self, rel):
+        self._rel = rel
+
+    def __contains__(self, key):
+        return key in self._rel._shard(key)
+
+    def __iter__(self):
+        return chain.from_iterable(self._rel._shards)
+
+    def __len__(self):
+        return sum(map(len, self._rel._shards))
+
+class _shardedmixin():
+    """Methods common to the sharded relations.
+
+    A sharded relation stores each pair twice: once in the forward shard
+    chosen by the hash of its key, and once, reversed, in the backward
+    shard chosen by the hash of its value. Every lookup, in either
+    direction, therefore touches a single shard, and the set operations
+    can be split into independent tasks, one per shard, which are run
+    with the `executor`. The shards are plain dictionaries, since the
+    forward and backward shards together already index the pairs both
+    ways.
+
+    When the executor is a process pool, every task is sent to a worker
+    process by pickling. The set operations send the shards of both
+    operands and receive new shards back, so they pay off only when the
+    work per shard outweighs that cost. The other bulk operations,
+    `update` and `getmany`, run serially in the calling process: the
+    shards they change or read live there, and the hashes choosing the
+    shards of strings differ between processes, so a worker could only
+    partition or group pairs that the caller would then have to merge
+    again, which costs more than adding them directly.
+
+    Attributes:
+        factory (type): The type of the relation returned by `merge`.
+        executor (concurrent.futures.Executor): The executor running the
+            bulk operations, or None to run them serially.
+
+    """
+    _structures = ('_shards', '_rshards')
+
+    def _init(self, nshards, factory, executor):
+        if nshards < 1:
+            raise ValueError(nshards)
+        self.factory = factory
+        self.executor = executor
+        self._shards = [{} for _ in range(nshards)]
+        self._rshards = [{} for _ in range(nshards)]
+        self._listeners = []
+
+    @property
+    def nshards(self):
+        """The number of shards."""
+        return len(self._shards)
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _rshard(self, val):
+        return self._rshards[hash(val) % len(self._rshards)]
+
+    def _run(self, func, *iterables):
+        if self.executor is None:
+            return list(map(func, *iterables))
+        return list(self.executor.map(func, *iterables))
+
+    def _share(self, inverse):
+        inverse.factory = self.factory
+        inverse.executor = self.executor
+        inverse._shards = self._rshards
+        inverse._rshards = self._shards
+        inverse._listeners = self._listeners
+        return inverse
+
+    def _new(self, shards, rshards):
+        new = type(self).__new__(type(self))
+        new.factory = self.factory
+        new.executor = self.executor
+        new._shards = shards
+        new._rshards = rshards
+        new._listeners = []
+        return new
+
+    def _check(self, other):
+        if (not isinstance(other, type(self))
+            or other.nshards != self.nshards
+            or other.factory is not self.factory
+        ):
+            raise ValueError(other)
+
+    def getmany(self, keys):
+        """Looks up many keys at once.
+
+        Args:
+            keys (iterable): The keys to look up.
+
+        Returns:
+            dict: A dictionary mapping each key present in the relation
+                to the value (or set of values) that `__getitem__` would
+                return.
+
+        """
+        result = {}
+        for key in keys:
+            try:
+                result[key] = self[key]
+            except KeyError:
+                pass
+        return result
+
+    def union(self, other):
+        """Returns a new sharded relation holding the pairs of both
+        relations, which must have the same number of shards and the same
+        factory.
+
+        """
+        return self._combine(self._ops[0], other)
+
+    def intersection(self, other):
+        """Returns a new sharded relation holding the pairs common to
+        both relations, which must have the same number of shards and
+        the same factory.
+
+        """
+        return self._combine(self._ops[1], other)
+
+    def difference(self, other):
+        """Returns a new sharded relation holding the pairs of this
+        relation that are not in `other`, which must have the same
+        number of shards and the same factory.
+
+        """
+        return self._combine(self._ops[2], other)
+
+    def _combine(self, func, other):
+        self._check(other)
+        results = self._run(
+            func,
+            self._shards + self._rshards,
+            other._shards + other._rshards
+        )
+        n = self.nshards
+        return self._new(results[:n], results[n:])
+
+    def snapshot(self):
+        """Returns an independent copy of the sharded relation."""
+        return self._new(
+            list(map(self._copyshard, self._shards)),
+            list(map(self._copyshard, self._rshards))
+        )
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the relation, with the
+        forward shards under `'_shards'` and the backward shards under
+        `'_rshards'`. The shards are shared with the inverse, so they are
+        counted only once if the same `seen` set is used to measure
+        both. See `relations.memoryusage`.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        return chain(
+            chain.from_iterable(self._shards),
+            chain.from_iterable(self._rshards)
+        )
+
+    def merge(self):
+        """Returns an ordinary, unsharded relation of type `factory`
+        holding the same pairs.
+
+        """
+        rel = self.factory()
+        rel.update(self._allpairs())
+        return rel
+
+class shardedmultidict(_shardedmixin, MultiMapping, Observable,
+                       Expirable, Trackable, DegreeIndexed, Versionable,
+                       Attributable):
+    """A multi-valued dictionary split into shards by key hash.
+
+    A `shardedmultidict` object functions just like a `multidict`
+    object, but its pairs are spread across several shards, which map
+    each key to its set of values, and its set operations (`union`,
+    `intersection`, and `difference`) run one task per shard on the
+    given executor. Its `update` method adds the pairs directly to the
+    shards, serially. Its `merge` method returns an ordinary
+    `multidict`.
+
+    """
+    _ops = (_union, _intersection, _difference)
+    _copyshard = staticmethod(_copy)
+
+    def __init__(self, nshards=8, factory=multidict, executor=None):
+        """Constructs an empty shardedmultidict.
+
+        Args:
+            nshards (int): The number of shards.
+            factory (type): The type of the relation returned by
+                `merge`, such as `multidict` or `sortedmultidict`.
+            executor (concurrent.futures.Executor, optional): The
+                executor running the bulk operations. Defaults to running
+                them serially.
+
+        """
+        self._init(nshards, factory, executor)
+        self._size = [0]
+
+    def _share(self, inverse):
+        inverse._size = self._size
+        return _shardedmixin._share(self, inverse)
+
+    def _new(self, shards, rshards):
+        new = _shardedmixin._new(self, shards, rshards)
+        new._size = [sum(sum(map(len, shard.values())) for shard in shards)]
+        return new
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+        except (TypeError, ValueError):
+            return False
+        return val in self._shard(key).get(key, _EMPTY)
+
+    def __iter__(self):
+        for shard in self._shards:
+            for key, vals in shard.items():
+                for val in vals:
+                    yield key, val
+
+    def __len__(self):
+        return self._size[0]
+
+    def discard(self, elem):
+        """Removes the given key-value pair, if present.
+
+        Args:
+            elem (2-tuple): The key-value pair to discard.
+
+        """
+        if elem in self:
+            key, val = elem
+            self._remove(self._shard(key), key, val)
+            self._remove(self._rshard(val), val, key)
+            self._size[0] -= 1
+            if self._listeners:
+                self._pairremoved(key, val)
+
+    def _remove(self, shard, key, val):
+        vals = shard[key]
+        vals.discard(val)
+        if not vals:
+            del shard[key]
+
+    def __getitem__(self, key):
+        return frozenset(self._shard(key)[key])
+
+    def __setitem__(self, key, val):
+        shard = self._shard(key)
+        vals = shard.get(key)
+        if vals is None:
+            shard[key] = {val}
+        elif val in vals:
+            return
+        else:
+            vals.add(val)
+        self._rshard(val).setdefault(val, set()).add(key)
+        self._size[0] += 1
+        if self._listeners:
+            self._pairadded(key, val)
+
+    def __delitem__(self, key):
+        for val in self[key]:
+            self.discard((key, val))
+
+    def keys(self):
+        """Returns a set-like view of the keys in the shardedmultidict."""
+        return shardedkeys(self)
+
+    def update(self, *others):
+        """Adds all pairs from the given relations, or iterables of
+        pairs, directly to the shards, in the calling process. If the
+        relation has listeners, the pairs are added one at a time
+        instead, so that the listeners are notified.
+
+        """
+        if self._listeners:
+            return MultiMapping.update(self, *others)
+        shards = self._shards
+        rshards = self._rshards
+        n = len(shards)
+        added = 0
+        for other in others:
+            for key, val in other:
+                shard = shards[hash(key) % n]
+                vals = shard.get(key)
+                if vals is None:
+                    shard[key] = {val}
+                elif val in vals:
+                    continue
+                else:
+                    vals.add(val)
+                rshard = rshards[hash(val) % n]
+                keys = rshard.get(val)
+                if keys is None:
+                    rshard[val] = {key}
+                else:
+                    keys.add(key)
+                added += 1
+        self._size[0] += added
+
+    def __inverse__(self):
+        inverse = shardedmultidict.__new__(shardedmultidict)
+        return self._share(inverse)
+
+    def copy(self):
+        """Creates and returns a copy of the shardedmultidict object."""
+        return self.snapshot()
+
+    def __repr__(self):
+        return 'shardedmultidict(' + repr(
+            {key: set(self[key]) for key in self.keys()}
+        ) + ')'
+
+class shardedbidict(_shardedmixin, BiMapping, Observable, Expirable,
+                    Trackable, DegreeIndexed, Versionable,
+                    Attributable):
+    """An invertible, one-to-one dictionary split into shards by key
+    hash.
+
+    A `shardedbidict` object functions just like a `bidict` object, but
+    its pairs are spread across several shards, which map each key to
+    its value, and its set operations (`union`, `intersection`, and
+    `difference`) run one task per shard on the given executor. Before
+    a union is computed, the pairs of both relations are checked for a
+    key or a value they would share with different partners, so that
+    the result is one-to-one across all its shards. Its `update` method
+    adds one pair at a time, because the uniqueness of the values must
+    be checked across shards. Its `merge` method returns an ordinary
+    `bidict`.
+
+    """
+    _ops = (_biunion, _biintersection, _bidifference)
+    _copyshard = staticmethod(dict)
+
+    def __init__(self, nshards=8, factory=bidict, executor=None):
+        """Constructs an empty shardedbidict. The arguments are the same
+        as for `shardedmultidict`, except that the factory must be
+        `bidict` or one of its subclasses.
+
+        """
+        self._init(nshards, factory, executor)
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __getitem__(self, key):
+        return self._shard(key)[key]
+
+    def __delitem__(self, key):
+        val = self._shard(key).pop(key)
+        del self._rshard(val)[val]
+        if self._listeners:
+            self._pairremoved(key, val)
+
+    def __iter__(self):
+        return chain.from_iterable(self._shards)
+
+    def __len__(self):
+        return sum(map(len, self._shards))
+
+    def __setfreeval__(self, key, val):
+        if key in self:
+            if self[key] == val:
+                return
+            del self[key]
+        self._shard(key)[key] = val
+        self._rshard(val)[val] = key
+        if self._listeners:
+            self._pairadded(key, val)
+
+    def union(self, other):
+        """Returns a new sharded bidict holding the pairs of both
+        relations, which must have the same number of shards and the same
+        factory. Raises a ValueError, without computing anything, if a
+        key or a value of `other` is paired differently in this one.
+
+        """
+        self._check(other)
+        inverse = self.inverse
+        for key, val in other.items():
+            if (key in self and self[key] != val
+                or val in inverse and inverse[val] != key
+            ):
+                raise ValueError((key, val))
+        return self._combine(_biunion, other)
+
+    def __inverse__(self):
+        inverse = shardedbidict.__new__(shardedbidict)
+        return self._share(inverse)
+
+    def copy(self):
+        """Creates and returns a copy of the shardedbidict object."""
+        return self.snapshot()
+
+    def __repr__(self):
+        return 'shardedbidict(' + repr(dict(self.items())) + ')'
@@ -0,0 +1,347 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Set
+from multiprocessing import shared_memory
+from sys import getsizeof
+from customabcs import BiMapping, MultiMapping
+
+MAGIC = 0x52454c53
+NONE = -2 ** 63
+HEADER = 8
+ITEMSIZE = 8
+KINDS = ('bidict', 'multidict', 'invertibledict', 'inversedict')
+
+def publish(rel, name=None):
+    """Copies an integer-ID relation into shared memory.
+
+    The pairs are stored as packed arrays of 64-bit integers in
+    compressed sparse row form, once sorted by key and once sorted by
+    value, so that both the relation and its inverse can be read without
+    building any Python containers. None is also allowed as a key or
+    value, and is stored as the smallest 64-bit integer. The kind of
+    relation published, one of `KINDS`, is stored with the pairs, and
+    determines the types of the views of the relation and its inverse.
+
+    Args:
+        rel (BiMapping or MultiMapping): The relation to publish. Its
+            keys and values must be integers or None.
+        name (str, optional): The name of the shared memory block.
+            Defaults to a name chosen by the system.
+
+    Returns:
+        sharedbidict or sharedmultidict: A read-only view of the
+            published relation. Its `name` attribute should be passed to
+            `attach` in other processes, and its `unlink` method should
+            be called once no process needs the relation any longer.
+
+    """
+    if isinstance(rel, BiMapping):
+        pairs = [(_encode(key), _encode(val)) for key, val in rel.items()]
+    else:
+        pairs = [(_encode(key), _encode(val)) for key, val in rel]
+    fkeys, foffsets, fvals = _csr(pairs)
+    bvals, boffsets, bkeys = _csr([(val, key) for key, val in pairs])
+    header = array('q', [
+        MAGIC, _kind(rel), len(pairs), len(fkeys), len(bvals), 0, 0, 0
+    ])
+    sections = (header, fkeys, foffsets, fvals, bvals, boffsets, bkeys)
+    size = sum(len(section) for section in sections) * ITEMSIZE
+    shm = shared_memory.SharedMemory(name, create=True, size=max(size, 1))
+    pos = 0
+    for section in sections:
+        data = section.tobytes()
+        shm.buf[pos:pos + len(data)] = data
+        pos += len(data)
+    return _open(shm)
+
+def attach(name):
+    """Attaches to a relation published in shared memory under the given
+    name, and returns a read-only view of it. No data is copied.
+
+    """
+    return _open(shared_memory.SharedMemory(name))
+
+def _encode(elem):
+    if elem is None:
+        return NONE
+    if not isinstance(elem, int):
+        raise TypeError(elem)
+    return elem
+
+def _kind(rel):
+    """Returns the position in `KINDS` of the kind of the relation."""
+    if isinstance(rel, BiMapping):
+        return 0
+    if rel._single:
+        return 2
+    if rel.inverse._single:
+        return 3
+    return 1
+
+def _decode(elem):
+    return None if elem == NONE else elem
+
+def _csr(pairs):
+    """Returns the distinct keys, offsets, and values of the given pairs
+    in compressed sparse row form.
+
+    """
+    pairs.sort()
+    keys, offsets, vals = array('q'), array('q'), array('q')
+    for pos, (key, val) in enumerate(pairs):
+        if not keys or keys[-1] != key:
+            keys.append(key)
+            offsets.append(pos)
+        vals.append(val)
+    offsets.append(len(pairs))
+    return keys, offsets, vals
+
+def _open(shm):
+    view = shm.buf.cast('q')
+    if (len(view) < HEADER or view[0] != MAGIC
+        or not 0 <= view[1] < len(KINDS)
+    ):
+        view.release()
+        shm.close()
+        raise ValueError(shm.name)
+    npairs, nkeys, nvals = view[2:5]
+    pos = HEADER
+    sections = []
+    for length in (nkeys, nkeys + 1, npairs, nvals, nvals + 1, npairs):
+        sections.append(view[pos:pos + length])
+        pos += length
+    store = sharedstore(shm, view, sections)
+    cls = store.viewclass(0)
+    return cls.__new__(cls)._share(store, 0)
+
+class sharedstore():
+    """The shared memory block holding a published relation, together
+    with the views of its arrays.
+
+    Attributes:
+        shm (shared_memory.SharedMemory): The shared memory block.
+        kind (str): The kind of relation published, one of `KINDS`.
+        sections (2-tuple of 3-tuple): For each side, the sorted distinct
+            keys, the offsets of their values, and the values, as
+            memoryviews of 64-bit integers. The second side describes the
+            inverse relation.
+
+    """
+
+    def __init__(self, shm, view, sections):
+        self.shm = shm
+        self._view = view
+        self.kind = KINDS[view[1]]
+        self.sections = (tuple(sections[:3]), tuple(sections[3:]))
+
+    def viewclass(self, side):
+        """Returns the type of the view of the given side. The inverse of
+        an `invertibledict` is read as a `sharedmultidict`, and so is an
+        `inversedict`, whose inverse is a `sharedinvertibledict`.
+
+        """
+        if self.kind == 'bidict':
+            return sharedbidict
+        if self.kind == ('invertibledict', 'inversedict')[side]:
+            return sharedinvertibledict
+        return sharedmultidict
+
+    def find(self, side, key):
+        """Returns the slice of values of `key` on the given side, or
+        None if `key` is not present.
+
+        """
+        keys, offsets, vals = self.sections[side]
+        try:
+            code = _encode(key)
+        except TypeError:
+            return None
+        pos = bisect_left(keys, code)
+        if pos == len(keys) or keys[pos] != code:
+            return None
+        return vals[offsets[pos]:offsets[pos + 1]]
+
+    def close(self):
+        """Releases the views and detaches from the shared memory."""
+        if self._view is None:
+            return
+        for side in self.sections:
+            for section in side:
+                section.release()
+        self._view.release()
+        self._view = None
+        self.shm.close()
+
+class sharedkeys(Set):
+    """A view of the keys of a shared relation."""
+
+    def __init__(self, rel):
+        self._rel = rel
+
+    def __contains__(self, key):
+        return self._rel._store.find(self._rel._side, key) is not None
+
+    def __iter__(self):
+        return (_decode(key) for key in self._rel._sections[0])
+
+    def __len__(self):
+        return len(self._rel._sections[0])
+
+class _sharedmixin():
+    """Methods common to the shared relations, which read their pairs
+    from the `sharedstore` object `_store`, viewed from the side
+    `_side`.
+
+    """
+
+    def _share(self, store, side):
+        self._store = store
+        self._side = side
+        self._sections = store.sections[side]
+        return self
+
+    def _readonly(self, *args):
+        raise TypeError('shared relations are read-only')
+
+    __setitem__ = __delitem__ = __setfreeval__ = discard = _readonly
+
+    def __inverse__(self):
+        cls = self._store.viewclass(1 - self._side)
+        inverse = cls.__new__(cls)
+        return inverse._share(self._store, 1 - self._side)
+
+    @property
+    def name(self):
+        """The name of the shared memory block, to be passed to
+        `attach`.
+
+        """
+        return self._store.shm.name
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the relation. The shared
+        memory block is reported under `'shared'`, and is counted only
+        once for a relation and its inverse if the same `seen` set is
+        used to measure both. See `relations.memoryusage`.
+
+        """
+        if seen is None:
+            seen = set()
+        usage = {'object': 0, 'shared': 0}
+        if id(self) not in seen:
+            seen.add(id(self))
+            usage['object'] = getsizeof(self) + getsizeof(vars(self))
+        if id(self._store) not in seen:
+            seen.add(id(self._store))
+            usage['shared'] = self._store.shm.size
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def close(self):
+        """Detaches from the shared memory. The relation and its inverse
+        cannot be used afterwards.
+
+        """
+        self._store.close()
+
+    def unlink(self):
+        """Detaches from the shared memory and requests that it be
+        destroyed. This should be called once, by the publishing
+        process, when no process needs the relation any longer.
+
+        """
+        self._store.close()
+        self._store.shm.unlink()
+
+class sharedbidict(_sharedmixin, BiMapping):
+    """A read-only `bidict` of integers stored in shared memory.
+
+    It is created with `publish` or `attach`, and supports all the
+    non-mutating methods of a `bidict`. Attempts to modify it raise a
+    TypeError.
+
+    """
+
+    def __contains__(self, key):
+        return self._store.find(self._side, key) is not None
+
+    def __getitem__(self, key):
+        vals = self._store.find(self._side, key)
+        if vals is None:
+            raise KeyError(key)
+        return _decode(vals[0])
+
+    def __iter__(self):
+        return (_decode(key) for key in self._sections[0])
+
+    def __len__(self):
+        return len(self._sections[0])
+
+    def __repr__(self):
+        return 'sharedbidict(' + repr(dict(self.items())) + ')'
+
+class sharedmultidict(_sharedmixin, MultiMapping):
+    """A read-only `multidict` of integers stored in shared memory.
+
+    It is created with `publish` or `attach`, and supports all the
+    non-mutating methods of a `multidict`. Attempts to modify it raise a
+    TypeError.
+
+    """
+
+    def __contains__(self, elem):
+        try:
+            key, val = elem
+            code = _encode(val)
+        except (TypeError, ValueError):
+            return False
+        vals = self._store.find(self._side, key)
+        if vals is None:
+            return False
+        pos = bisect_left(vals, code)
+        return pos < len(vals) and vals[pos] == code
+
+    def __iter__(self):
+        keys, offsets, vals = self._sections
+        for pos, key in enumerate(keys):
+            key = _decode(key)
+            for val in vals[offsets[pos]:offsets[pos + 1]]:
+                yield key, _decode(val)
+
+    def __len__(self):
+        return len(self._sections[2])
+
+    def __getitem__(self, key):
+        vals = self._store.find(self._side, key)
+        if vals is None:
+            raise KeyError(key)
+        return frozenset(_decode(val) for val in vals)
+
+    def keys(self):
+        """Returns a set-like view of the keys in the sharedmultidict."""
+        return sharedkeys(self)
+
+    def __repr__(self):
+        return 'sharedmultidict(' + repr(
+            {key: set(self[key]) for key in self.keys()}
+        ) + ')'
+
+class sharedinvertibledict(sharedmultidict):
+    """A read-only `invertibledict` of integers stored in shared memory.
+
+    It differs from a `sharedmultidict` only in that `__getitem__`
+    returns the single value of a key.
+
+    """
+    _single = True
+
+    def __getitem__(self, key):
+        vals = self._store.find(self._side, key)
+        if vals is None:
+            raise KeyError(key)
+        return _decode(vals[0])
+
+    def __repr__(self):
+        return 'sharedinvertibledict(' + repr(
+            {key: self[key] for key in self.keys()}
+        ) + ')'
@@ -0,0 +1,396 @@
+from bisect import bisect_left, bisect_right, insort
+from relations import bidict, multidict
+
+class sortedlist():
+    """A sorted sequence of immutables with O(log n) order statistics.
+
+    The elements are stored as a list of sorted chunks, together with a
+    list of the maximum element of each chunk and a Fenwick tree of the
+    chunk lengths. Locating an element is a bisection over the chunk
+    maxima followed by a bisection within a single chunk, and locating
+    a position is a descent of the Fenwick tree. Chunks are split when
+    they grow past twice the load factor and merged into a neighbor when
+    they shrink below a quarter of it, so that the number of chunks, and
+    hence the cost of rebuilding the Fenwick tree, stays small.
+
+    All elements must be mutually comparable.
+
+    """
+    _load = 512
+    _structures = ('_lists', '_maxes', '_tree')
+
+    def __init__(self, iterable=()):
+        """Creates a sortedlist containing the elements of `iterable`."""
+        values = sorted(iterable)
+        load = self._load
+        self._lists = [
+            values[pos:pos + load] for pos in range(0, len(values), load)
+        ]
+        self._maxes = [chunk[-1] for chunk in self._lists]
+        self._len = len(values)
+        self._buildtree()
+
+    def _buildtree(self):
+        tree = [0] + [len(chunk) for chunk in self._lists]
+        size = len(tree)
+        for pos in range(1, size):
+            parent = pos + (pos & -pos)
+            if parent < size:
+                tree[parent] += tree[pos]
+        self._tree = tree
+
+    def _updatetree(self, index, delta):
+        tree = self._tree
+        pos = index + 1
+        while pos < len(tree):
+            tree[pos] += delta
+            pos += pos & -pos
+
+    def _prefix(self, index):
+        """Returns the total length of the first `index` chunks."""
+        tree = self._tree
+        total = 0
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def _locate(self, pos):
+        """Returns the chunk index and offset of the element at the
+        given non-negative position.
+
+        """
+        tree = self._tree
+        index = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            nxt = index + step
+            if nxt < len(tree) and tree[nxt] <= pos:
+                index = nxt
+                pos -= tree[nxt]
+            step >>= 1
+        return index, pos
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for chunk in self._lists:
+            yield from chunk
+
+    def __reversed__(self):
+        for chunk in reversed(self._lists):
+            yield from reversed(chunk)
+
+    def __contains__(self, elem):
+        index = bisect_left(self._maxes, elem)
+        if index == len(self._maxes):
+            return False
+        chunk = self._lists[index]
+        return chunk[bisect_left(chunk, elem)] == elem
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self._len
+        if not 0 <= pos < self._len:
+            raise IndexError(pos)
+        index, offset = self._locate(pos)
+        return self._lists[index][offset]
+
+    def add(self, elem):
+        """Inserts the given element, keeping the list sorted."""
+        lists, maxes = self._lists, self._maxes
+        if not lists:
+            lists.append([elem])
+            maxes.append(elem)
+            self._len = 1
+            self._buildtree()
+            return
+        index = bisect_left(maxes, elem)
+        if index == len(maxes):
+            index -= 1
+            lists[index].append(elem)
+            maxes[index] = elem
+        else:
+            insort(lists[index], elem)
+        self._len += 1
+        if len(lists[index]) > 2 * self._load:
+            chunk = lists[index]
+            half = len(chunk) // 2
+            lists[index:index + 1] = [chunk[:half], chunk[half:]]
+            maxes[index:index + 1] = [chunk[half - 1], chunk[-1]]
+            self._buildtree()
+        else:
+            self._updatetree(index, 1)
+
+    def remove(self, elem):
+        """Removes the given element. Raises a ValueError if the element
+        is not present.
+
+        """
+        lists, maxes = self._lists, self._maxes
+        index = bisect_left(maxes, elem)
+        if index == len(maxes):
+            raise ValueError(elem)
+        chunk = lists[index]
+        offset = bisect_left(chunk, elem)
+        if chunk[offset] != elem:
+            raise ValueError(elem)
+        del chunk[offset]
+        self._len -= 1
+        if not chunk:
+            del lists[index]
+            del maxes[index]
+            self._buildtree()
+        elif len(chunk) < self._load // 4 and len(lists) > 1:
+            if index == len(lists) - 1:
+                index -= 1
+            lists[index:index + 2] = [lists[index] + lists[index + 1]]
+            maxes[index:index + 2] = [lists[index][-1]]
+            self._buildtree()
+        else:
+            maxes[index] = chunk[-1]
+            self._updatetree(index, -1)
+
+    def discard(self, elem):
+        """Removes the given element, if present."""
+        if elem in self:
+            self.remove(elem)
+
+    def bisect_left(self, elem):
+        """Returns the position at which `elem` would be inserted before
+        any equal elements. This is the number of elements less than
+        `elem`.
+
+        """
+        index = bisect_left(self._maxes, elem)
+        if index == len(self._maxes):
+            return self._len
+        return self._prefix(index) + bisect_left(self._lists[index], elem)
+
+    def bisect_right(self, elem):
+        """Returns the position at which `elem` would be inserted after
+        any equal elements. This is the number of elements less than or
+        equal to `elem`.
+
+        """
+        index = bisect_right(self._maxes, elem)
+        if index == len(self._maxes):
+            return self._len
+        return self._prefix(index) + bisect_right(self._lists[index], elem)
+
+    def islice(self, start, stop, reverse=False):
+        """Returns an iterator over the elements in positions `start`
+        (inclusive) to `stop` (exclusive).
+
+        """
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return iter(())
+        if reverse:
+            return self._islicereversed(start, stop)
+        return self._islice(start, stop)
+
+    def _islice(self, start, stop):
+        index, offset = self._locate(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = self._lists[index]
+            piece = chunk[offset:offset + remaining]
+            yield from piece
+            remaining -= len(piece)
+            index += 1
+            offset = 0
+
+    def _islicereversed(self, start, stop):
+        index, offset = self._locate(stop - 1)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = self._lists[index]
+            low = max(offset + 1 - remaining, 0)
+            piece = chunk[low:offset + 1]
+            yield from reversed(piece)
+            remaining -= len(piece)
+            index -= 1
+            if index >= 0:
+                offset = len(self._lists[index]) - 1
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, False),
+        reverse=False
+    ):
+        """Returns an iterator over the elements between `minimum` and
+        `maximum`.
+
+        Args:
+            minimum (obj, optional): The lower bound. If None, the range
+                is unbounded below.
+            maximum (obj, optional): The upper bound. If None, the range
+                is unbounded above.
+            inclusive (2-tuple of bool): Whether the lower and upper
+                bounds are included. Defaults to `(True, False)`, the
+                half-open range `[minimum, maximum)`.
+            reverse (bool): If True, iterate in descending order.
+
+        """
+        if minimum is None:
+            start = 0
+        elif inclusive[0]:
+            start = self.bisect_left(minimum)
+        else:
+            start = self.bisect_right(minimum)
+        if maximum is None:
+            stop = self._len
+        elif inclusive[1]:
+            stop = self.bisect_right(maximum)
+        else:
+            stop = self.bisect_left(maximum)
+        return self.islice(start, stop, reverse)
+
+    def __repr__(self):
+        return 'sortedlist(' + repr(list(self)) + ')'
+
+class _sortedmixin():
+    """Order-statistics queries over the `_keys` sortedlist of a sorted
+    relation.
+
+    """
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, False),
+        reverse=False
+    ):
+        """Returns an iterator over the keys between `minimum` and
+        `maximum`. By default, this is the half-open range
+        `[minimum, maximum)`. See `sortedlist.irange`.
+
+        """
+        return self._keys.irange(minimum, maximum, inclusive, reverse)
+
+    def bisect(self, key):
+        """Returns the number of keys less than or equal to `key`."""
+        return self._keys.bisect_right(key)
+
+    def rank(self, key):
+        """Returns the number of keys less than `key`. If `key` is in the
+        relation, this is its position in the sorted order.
+
+        """
+        return self._keys.bisect_left(key)
+
+    def nth(self, pos):
+        """Returns the key in the given position of the sorted order.
+        Negative positions count from the end. Raises an IndexError if
+        the position is out of range.
+
+        """
+        return self._keys[pos]
+
+class sortedbidict(_sortedmixin, bidict):
+    """A `bidict` whose keys and values are kept in sorted order.
+
+    Iteration is in ascending key order, and `irange`, `bisect`, `rank`,
+    and `nth` answer order queries over the keys in O(log n). The same
+    queries over the values are available on the inverse, which shares
+    its sorted lists with this object.
+
+    All keys must be mutually comparable, as must all values.
+
+    """
+    _structures = bidict._structures + ('_keys', '_vals')
+
+    def __init__(self):
+        """Creates an empty sortedbidict object."""
+        bidict.__init__(self)
+        self._keys = sortedlist()
+        self._vals = sortedlist()
+
+    def __delitem__(self, key):
+        val = self._forward[key]
+        bidict.__delitem__(self, key)
+        self._keys.remove(key)
+        self._vals.remove(val)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __setfreeval__(self, key, val):
+        if key in self._forward and self._forward[key] == val:
+            return
+        bidict.__setfreeval__(self, key, val)
+        self._keys.add(key)
+        self._vals.add(val)
+
+    def __inverse__(self):
+        inverse = sortedbidict()
+        inverse = self._inverseinit(inverse)
+        inverse._keys = self._vals
+        inverse._vals = self._keys
+        return inverse
+
+    def __repr__(self):
+        return 'sortedbidict(' + repr(dict(self.items())) + ')'
+
+class sortedmultidict(_sortedmixin, multidict):
+    """A `multidict` whose distinct keys and values are kept in sorted
+    order.
+
+    The `keys` method returns the keys in ascending order, and `irange`,
+    `bisect`, `rank`, and `nth` answer order queries over the distinct
+    keys in O(log n). The same queries over the values are available on
+    the inverse, which shares its sorted lists with this object.
+
+    All keys must be mutually comparable, as must all values.
+
+    """
+    _structures = multidict._structures + ('_keys', '_vals')
+
+    def __init__(self):
+        """Constructs an empty sortedmultidict."""
+        multidict.__init__(self)
+        self._keys = sortedlist()
+        self._vals = sortedlist()
+
+    def discard(self, elem):
+        """Removes the given key-value pair, if present.
+
+        Args:
+            elem (2-tuple): The key-value pair to discard.
+
+        """
+        if elem in self:
+            key, val = elem
+            multidict.discard(self, elem)
+            if key not in self._forward.keys():
+                self._keys.remove(key)
+            if val not in self._backward.keys():
+                self._vals.remove(val)
+
+    def __setitem__(self, key, val):
+        if key not in self._forward.keys():
+            self._keys.add(key)
+        if val not in self._backward.keys():
+            self._vals.add(val)
+        multidict.__setitem__(self, key, val)
+
+    def keys(self):
+        """Returns the keys in the sortedmultidict as a sortedlist, which
+        should not be modified.
+
+        """
+        return self._keys
+
+    def __inverse__(self):
+        inverse = sortedmultidict()
+        inverse = self._inverseinit(inverse)
+        inverse._keys = self._vals
+        inverse._vals = self._keys
+        return inverse
+
+    def copy(self):
+        """Creates and returns a copy of the sortedmultidict object."""
+        new = sortedmultidict()
+        return self._fillcopy(new)
+
+    def __repr__(self):
+        return 'sortedmultidict(' + repr(
+            {key: set(self._forward[key]) for key in self._keys}
+        ) + ')'
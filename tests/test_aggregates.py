@@ -0,0 +1,62 @@
+import pytest
+from objrelations import Manager, ManyToMany
+
+class Item():
+    def __init__(self, weight):
+        self.weight = weight
+
+@pytest.fixture
+def bags():
+    mgr = Manager()
+    rel = mgr.make(ManyToMany)
+    bag, other = mgr.make_many(Item, [(None,), (None,)])
+    items = mgr.make_many(Item, [(3,), (1,), (7,), (None,)])
+    for item in items:
+        rel[bag] = item
+    rel[other] = items[0]
+    return rel, bag, other, items
+
+@pytest.mark.parametrize('kind, expected', [
+    ('count', 4), ('sum', 11), ('min', 1), ('max', 7)
+])
+def test_each_kind(bags, kind, expected):
+    rel, bag, other, items = bags
+    rel.addaggregate(kind, kind, 'weight')
+    assert rel.aggregate(kind, bag) == expected
+
+def test_min_and_max_after_removals(bags):
+    rel, bag, other, items = bags
+    rel.addaggregate('lightest', 'min', 'weight')
+    rel.addaggregate('heaviest', 'max', func=lambda item: item.weight)
+    rel.discard((bag, items[1]))
+    assert rel.aggregate('lightest', bag) == 3
+    rel.inverse.discard((items[2], bag))
+    assert rel.aggregate('heaviest', bag) == 3
+    rel.discard((bag, items[0]))
+    with pytest.raises(KeyError):
+        rel.aggregate('lightest', bag)
+    assert rel.aggregate('heaviest', other) == 3
+
+def test_counts_and_sums_of_keys_without_values(bags):
+    rel, bag, other, items = bags
+    rel.addaggregate('count', 'count')
+    rel.addaggregate('sum', 'sum', 'weight')
+    del rel[bag]
+    assert rel.aggregate('count', bag) == 0
+    assert rel.aggregate('sum', bag) == 0
+    assert rel.aggregate('sum', other) == 3
+
+@pytest.mark.parametrize('kind', ['sum', 'min', 'max'])
+def test_property_is_required_except_for_counts(bags, kind):
+    rel = bags[0]
+    with pytest.raises(ValueError):
+        rel.addaggregate('bad', kind)
+    assert 'bad' not in rel.aggregates
+
+def test_unknown_kind_and_duplicate_name(bags):
+    rel = bags[0]
+    with pytest.raises(ValueError):
+        rel.addaggregate('bad', 'mean', 'weight')
+    rel.addaggregate('count', 'count')
+    with pytest.raises(ValueError):
+        rel.addaggregate('count', 'count')
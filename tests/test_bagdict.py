@@ -0,0 +1,88 @@
+import pytest
+from objrelations import Manager, ManyToMany
+from relations import bagdict
+
+class Stock(ManyToMany):
+    def __init__(self):
+        self.map = bagdict()
+
+class Item():
+    pass
+
+def setup():
+    mgr = Manager()
+    stock = mgr.make(Stock)
+    shop, item = mgr.make_many(Item, [(), ()])
+    return mgr, stock, shop, item
+
+def test_copies_and_inverse_counts():
+    bag = bagdict()
+    bag[1] = 'a'
+    bag.increment(1, 'a', 2)
+    bag[2] = 'a'
+    assert bag.count(1, 'a') == 3 and len(bag) == 2
+    assert bag.inverse.count('a', 1) == 3
+    bag.inverse.decrement('a', 1, 2)
+    assert bag.count(1, 'a') == 1 and bag.total() == 2
+    bag.decrement(1, 'a')
+    assert (1, 'a') not in bag and 1 not in bag.keys()
+    with pytest.raises(KeyError):
+        bag.decrement(1, 'a')
+    with pytest.raises(ValueError):
+        bag.increment(2, 'a', 0)
+
+def test_rollback_restores_intermediate_counts():
+    mgr, stock, shop, item = setup()
+    stock.increment(shop, item, 3)
+    savepoint = mgr.savepoint()
+    stock.increment(shop, item, 2)
+    stock.decrement(shop, item, 4)
+    assert stock.count(shop, item) == 1
+    mgr.rollback(savepoint)
+    assert stock.count(shop, item) == 3
+
+def test_rollback_restores_a_removed_pair_with_its_copies():
+    mgr, stock, shop, item = setup()
+    stock.increment(shop, item, 3)
+    savepoint = mgr.savepoint()
+    stock.inverse.discard((item, shop))
+    assert (shop, item) not in stock
+    mgr.rollback(savepoint)
+    assert stock.count(shop, item) == 3
+    stock.increment(shop, item)
+    mgr.rollback(savepoint)
+    assert stock.count(shop, item) == 3
+    mgr.release(savepoint)
+    assert stock.count(shop, item) == 3
+
+def test_rollback_removes_a_pair_added_with_copies():
+    mgr, stock, shop, item = setup()
+    savepoint = mgr.savepoint()
+    stock.increment(shop, item, 5)
+    mgr.rollback(savepoint)
+    assert (shop, item) not in stock and stock.count(shop, item) == 0
+
+def test_diff_and_apply_carry_counts():
+    source, replica = bagdict(), bagdict()
+    source.increment(1, 'a', 4)
+    since = source.track()
+    source.increment(1, 'a', 2)
+    source.increment(2, 'b', 3)
+    source.increment(3, 'c')
+    source.discard((3, 'c'))
+    patch = source.diff(since)
+    assert list(zip(patch.addedkeys, patch.addedvals)) == [(2, 'b')]
+    replica.increment(1, 'a', 4)
+    replica.apply(patch)
+    assert dict(replica._countitems()) == {(1, 'a'): 6, (2, 'b'): 3}
+    inverse = bagdict()
+    inverse.apply(source.inverse.diff(0))
+    assert dict(inverse._countitems()) == {('a', 1): 6, ('b', 2): 3}
+
+def test_degrees_ignore_copies():
+    bag = bagdict()
+    bag.degree_histogram()
+    bag.increment(1, 'a', 3)
+    bag.increment(1, 'b')
+    bag.decrement(1, 'a')
+    assert bag.degree_histogram() == {2: 1}
@@ -0,0 +1,44 @@
+import pickle
+import random
+from bitmaprelations import SMALLMAX, bitmapmultidict, bitmapset
+from relations import multidict
+
+def test_bitmapset_matches_set():
+    rng = random.Random(0)
+    for size in (0, 5, SMALLMAX + 1, 200, 6000):
+        for bound in (100, 1 << 20, 1 << 70):
+            a = {rng.randrange(bound) for _ in range(size)}
+            b = {rng.randrange(bound) for _ in range(size // 2 + 3)}
+            x, y = bitmapset(a), bitmapset(b)
+            assert set(x) == a and len(x) == len(a)
+            assert set(x & y) == a & b
+            assert set(x | y) == a | b
+            assert set(x - y) == a - b
+            assert set(x ^ y) == a ^ b
+            assert (x <= y) == (a <= b)
+            assert x.isdisjoint(y) == a.isdisjoint(b)
+
+def test_bitmapset_grows_and_shrinks():
+    s = bitmapset()
+    for elem in range(0, 10 * SMALLMAX, 3):
+        s.add(elem)
+    assert s._small is None
+    for elem in range(0, 10 * SMALLMAX, 3):
+        s.discard(elem)
+    assert len(s) == 0 and s._small is not None
+
+def test_bitmapmultidict_matches_multidict():
+    rng = random.Random(1)
+    pairs = [(rng.randrange(50), rng.randrange(10 ** 9))
+             for _ in range(2000)]
+    rel = bitmapmultidict()
+    rel.update(pairs)
+    plain = multidict()
+    plain.update(pairs)
+    assert len(rel) == len(plain) and set(rel) == set(plain)
+    key, val = pairs[0]
+    assert (key, val) in rel and (val, key) in rel.inverse
+    rel.discard((key, val))
+    assert (key, val) not in rel and len(rel.inverse) == len(plain) - 1
+    assert set(pickle.loads(pickle.dumps(rel))) == set(rel)
+    assert not hasattr(rel, '_set')
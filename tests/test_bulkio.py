@@ -0,0 +1,34 @@
+import io
+import pytest
+from bulkio import dump, load
+from objrelations import Manager, ManyToMany, OneToMany
+
+class Holds(OneToMany):
+    def validate(self, key, val):
+        return val.weight < 10
+
+class Item():
+    def __init__(self, weight):
+        self.weight = weight
+
+def test_load_adds_manager_relations_in_bulk():
+    mgr = Manager()
+    a, b = mgr.make_many(Item, [(1,), (2,)])
+    knows = mgr.make(ManyToMany)
+    file = io.StringIO('key,val\n{0},{1}\n{1},{0}\n'.format(a._m_id, b._m_id))
+    assert load(knows, file) == 2
+    assert knows[a] == (b,) and knows.inverse[a] == (b,)
+    out = io.StringIO()
+    assert dump(knows, out, 'jsonl') == 2
+    with pytest.raises(KeyError):
+        load(knows, io.StringIO('{0},999\n'.format(a._m_id)), header=False)
+
+def test_load_validates_when_the_relation_does():
+    mgr = Manager()
+    owner, light, heavy = mgr.make_many(Item, [(0,), (1,), (50,)])
+    holds = mgr.make(Holds)
+    rows = ''.join(
+        '{0},{1}\n'.format(owner._m_id, item._m_id) for item in (light, heavy)
+    )
+    load(holds, io.StringIO(rows), header=False)
+    assert holds[owner] == (light,)
@@ -0,0 +1,46 @@
+import pytest
+from relations import bidict, multidict
+
+def test_diff_and_apply_replicate_changes():
+    source, replica = multidict(), multidict()
+    since = source.track()
+    source[1] = 2
+    source[3] = 4
+    source.discard((1, 2))
+    replica.apply(source.diff(since))
+    assert set(replica) == {(3, 4)}
+    inverse = bidict()
+    inverse.apply(source.inverse.diff(since))
+    assert dict(inverse.items()) == {4: 3}
+
+def test_trim_discards_old_versions():
+    rel = bidict()
+    rel.track()
+    rel[1] = 2
+    rel.trim(rel.version)
+    with pytest.raises(ValueError):
+        rel.diff(0)
+
+def test_diff_holds_net_changes_between_versions():
+    rel = bidict()
+    with pytest.raises(ValueError):
+        rel.diff(0)
+    rel[1] = 'a'
+    since = rel.track()
+    rel[2] = 'b'
+    del rel[2]
+    del rel[1]
+    rel[1] = 'a'
+    assert len(rel.diff(since)) == 0
+    middle = rel.version
+    rel[1] = 'c'
+    patch = rel.diff(middle)
+    assert list(zip(patch.removedkeys, patch.removedvals)) == [(1, 'a')]
+    assert list(zip(patch.addedkeys, patch.addedvals)) == [(1, 'c')]
+    replica = bidict()
+    replica[1] = 'a'
+    replica.apply(rel.diff(since))
+    assert dict(replica.items()) == {1: 'c'}
+    assert len(rel.diff(rel.version)) == 0
+    with pytest.raises(ValueError):
+        rel.diff(rel.version + 1)
@@ -0,0 +1,48 @@
+from relations import bidict, multidict
+from shardedrelations import shardedmultidict
+
+def test_degrees_follow_inserts_and_deletes():
+    rel = multidict()
+    rel.update([(1, 'a'), (1, 'b'), (2, 'a')])
+    assert rel.degree_histogram() == {2: 1, 1: 1}
+    rel[3] = 'a'
+    rel.discard((1, 'b'))
+    assert rel.degree_histogram() == {1: 3}
+    assert rel.top_k_values(1) == [('a', 3)]
+    assert rel.inverse.top_k_keys(1) == [('a', 3)]
+
+def test_sharded_relations_answer_degree_queries():
+    rel = shardedmultidict(4)
+    rel.update([(1, 'a'), (1, 'b'), (2, 'a')])
+    assert rel.top_k_keys(1) == [(1, 2)]
+
+def test_histogram_after_removals():
+    rel = multidict()
+    for key in range(4):
+        for val in range(key + 1):
+            rel[key] = val
+    assert rel.degree_histogram() == {1: 1, 2: 1, 3: 1, 4: 1}
+    del rel[3]
+    rel.discard((0, 0))
+    rel.discard((2, 'missing'))
+    assert rel.degree_histogram() == {2: 1, 3: 1}
+    assert rel.inverse.degree_histogram() == {1: 1, 2: 2}
+    assert [degree for _, degree in rel.top_k_values(3)] == [2, 2, 1]
+    rel.inverse.discard((2, 2))
+    rel.inverse.discard((0, 1))
+    assert rel.degree_histogram() == {1: 1, 2: 1}
+    assert rel.top_k_keys(5) == [(2, 2), (1, 1)]
+    rel.clear()
+    assert rel.degree_histogram() == {} and rel.top_k_keys(3) == []
+    rel[5] = 6
+    assert rel.inverse.degree_histogram() == {1: 1}
+
+def test_histogram_built_after_removals():
+    rel = bidict()
+    rel.update([(1, 'a'), (2, 'b'), (3, 'c')])
+    del rel[2]
+    rel[1] = 'd'
+    assert rel.degree_histogram() == {1: 2}
+    assert sorted(rel.top_k_values(3)) == [('c', 1), ('d', 1)]
+    del rel.inverse['c']
+    assert rel.top_k_keys(3) == [(1, 1)]
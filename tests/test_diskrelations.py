@@ -0,0 +1,50 @@
+import pytest
+import diskrelations
+from diskrelations import diskbidict, diskinversedict, diskmultidict
+
+def test_iteration_reads_every_page(monkeypatch):
+    monkeypatch.setattr(diskrelations, 'PAGESIZE', 3)
+    rel = diskmultidict(batchsize=4)
+    pairs = {(key, val) for key in range(5) for val in ('a', 'b')}
+    pairs.add((None, 'c'))
+    rel.update(pairs)
+    assert set(rel) == pairs
+    assert list(rel.keys()) == [None, 0, 1, 2, 3, 4]
+    assert set(rel.inverse.keys()) == {'a', 'b', 'c'}
+
+def test_length_is_maintained(tmp_path):
+    path = str(tmp_path / 'rel.db')
+    rel = diskbidict(path, batchsize=2)
+    for key in range(5):
+        rel[key] = -key
+    rel[0] = 7
+    del rel.inverse[-1]
+    assert len(rel) == len(rel.inverse) == 4
+    rel.close()
+    reopened = diskbidict(path)
+    assert len(reopened) == 4
+    reopened.clear()
+    assert len(reopened) == 0
+    assert dict(reopened.items()) == {}
+
+def test_inversedict_setting_an_existing_pair_is_a_noop():
+    rel = diskinversedict()
+    rel[1] = 2
+    rel[1] = 2
+    assert set(rel) == {(1, 2)}
+    with pytest.raises(ValueError):
+        rel[3] = 2
+    assert rel.inverse[2] == 1
+
+def test_misses_do_not_evict_cached_sets():
+    rel = diskmultidict(cachesize=2)
+    rel.update([(1, 'a'), (2, 'b')])
+    rel.flush()
+    assert rel[1] == {'a'} and rel[2] == {'b'}
+    for key in range(100, 110):
+        assert key not in rel.keys()
+    assert set(rel._store.caches[0]) == {1, 2}
+    assert list(rel._store.misses[0]) == [108, 109]
+    rel[109] = 'c'
+    assert rel[109] == {'c'}
+    assert 109 not in rel._store.misses[0]
@@ -0,0 +1,74 @@
+import pytest
+from relations import bidict, inversedict, invertibledict, multidict
+
+def test_attributes_are_removed_with_their_pairs():
+    rel = multidict()
+    rel.update([(1, 'a'), (1, 'b'), (2, 'a')])
+    rel.addattribute('qty', 'I', default=1)
+    rel.setattribute(1, 'b', 'qty', 5)
+    rel.inverse.setattribute('a', 2, 'qty', 3)
+    assert sum(rel.attributes('qty')) == 9
+    rel.discard((1, 'a'))
+    assert sorted(rel.attributes('qty')) == [3, 5]
+    assert rel.attribute(1, 'b', 'qty') == 5
+    assert rel.keyattributes(2, 'qty') == [3]
+
+def test_attributes_survive_updates_through_the_inverse():
+    rel = multidict()
+    rel[1] = 'a'
+    rel.addattribute('qty', 'I', default=1)
+    rel.setattribute(1, 'a', 'qty', 7)
+    rel.inverse['a'] = 1
+    rel.inverse['a'] = 2
+    rel.inverse.update([('b', 1), ('a', 3)])
+    assert rel.attribute(1, 'a', 'qty') == 7
+    assert rel.inverse.attribute('a', 2, 'qty') == 1
+    assert sorted(rel.keyattributes(1, 'qty')) == [1, 7]
+    rel.inverse.discard(('a', 2))
+    rel.inverse.discard(('a', 1))
+    rel.inverse['a'] = 1
+    assert rel.attribute(1, 'a', 'qty') == 1
+    assert rel.attribute(1, 'b', 'qty') == 1
+    assert rel.attribute(3, 'a', 'qty') == 1
+
+def test_replaced_values_lose_their_attributes():
+    rel = invertibledict()
+    rel[1] = 'a'
+    rel[2] = 'a'
+    rel.addattribute('qty', 'I')
+    rel.setattribute(1, 'a', 'qty', 4)
+    rel.setattribute(2, 'a', 'qty', 5)
+    rel[1] = 'b'
+    assert rel.inverse.attribute('b', 1, 'qty') == 0
+    assert rel.inverse.attribute('a', 2, 'qty') == 5
+    assert rel.inverse.keyattributes('a', 'qty') == [5]
+    with pytest.raises(KeyError):
+        rel.attribute(1, 'a', 'qty')
+    with pytest.raises(ValueError):
+        rel.inverse['a'] = 1
+    assert rel.attribute(1, 'b', 'qty') == 0
+
+@pytest.mark.parametrize('make, pairs, keyed', [
+    (bidict, [(1, 'a'), (2, 'b'), (3, 'c')], 0),
+    (invertibledict, [(1, 'a'), (2, 'a'), (3, 'b')], 0),
+    (inversedict, [(1, 'a'), (1, 'b'), (2, 'c')], 1),
+    (multidict, [(1, 'a'), (1, 'b'), (2, 'a')], None),
+])
+def test_slots_follow_the_shape_of_the_mapping(make, pairs, keyed):
+    rel = make()
+    for key, val in pairs:
+        rel[key] = val
+    rel.addattribute('weight', 'd', 0.5)
+    table, _ = rel._edgeattributes()
+    assert table.keyed == keyed
+    for pos, (key, val) in enumerate(pairs):
+        rel.setattribute(key, val, 'weight', pos)
+    with pytest.raises(KeyError):
+        rel.attribute(1, 'z', 'weight')
+    first, second, third = pairs
+    rel.inverse._discardpair(first[1], first[0])
+    assert sorted(rel.attributes('weight')) == [1, 2]
+    assert rel.attribute(*third, 'weight') == 2
+    assert rel.inverse.attribute(second[1], second[0], 'weight') == 1
+    with pytest.raises(KeyError):
+        rel.attribute(*first, 'weight')
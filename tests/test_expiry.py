@@ -0,0 +1,86 @@
+import pytest
+from expiry import Expiry
+from objrelations import Manager, ManyToMany, OneToOne
+from relations import bidict, multidict, invertibledict
+
+class Item():
+    pass
+
+def test_nothing_to_expire():
+    rel = multidict()
+    assert rel.expire(now=100) == []
+    rel[1] = 2
+    rel.set(1, 3)
+    assert rel.expire(now=100) == [] and len(rel) == 2
+
+def test_pairs_expire_in_deadline_order():
+    rel = multidict()
+    rel.set(1, 'a', ttl=30, now=0)
+    rel.set(2, 'a', ttl=10, now=0)
+    rel.set(1, 'b', ttl=20, now=0)
+    rel[3] = 'c'
+    assert rel.expire(now=5) == []
+    assert rel.expire(now=25) == [(2, 'a'), (1, 'b')]
+    assert rel.inverse['a'] == {1} and 'b' not in rel.inverse.keys()
+    assert rel.expire(now=30) == [(1, 'a')]
+    assert list(rel) == [(3, 'c')] and rel.expire(now=1000) == []
+
+def test_resetting_and_removing_cancel_deadlines():
+    rel = multidict()
+    rel.set(1, 'a', ttl=10, now=0)
+    rel.set(1, 'a', ttl=50, now=0)
+    rel.set(2, 'b', ttl=10, now=0)
+    rel.set(2, 'b')
+    rel.set(3, 'c', ttl=10, now=0)
+    rel.discard((3, 'c'))
+    rel[3] = 'c'
+    assert rel.expire(now=20) == []
+    assert rel.expire(now=50) == [(1, 'a')]
+    assert sorted(rel) == [(2, 'b'), (3, 'c')]
+
+def test_expiring_through_the_inverse():
+    rel = multidict()
+    rel.set(1, 'a', ttl=10, now=0)
+    rel.inverse.set('b', 2, ttl=5, now=0)
+    assert rel.inverse.expire(now=7) == [('b', 2)]
+    assert rel.expire(now=10) == [(1, 'a')]
+    assert len(rel) == 0 and len(rel.inverse) == 0
+
+def test_replaced_values_of_single_valued_mappings():
+    rel = bidict()
+    rel.set(1, 'a', ttl=10, now=0)
+    rel[1] = 'b'
+    assert rel.expire(now=10) == [] and rel[1] == 'b'
+    rel = invertibledict()
+    rel.set(1, 'a', ttl=10, now=0)
+    rel.set(1, 'b', ttl=20, now=0)
+    assert rel.expire(now=10) == []
+    assert rel.expire(now=20) == [(1, 'b')] and len(rel) == 0
+
+def test_stale_heap_entries_are_compacted():
+    rel = multidict()
+    for now in range(200):
+        rel.set(1, 'a', ttl=1000, now=now)
+    expiry = rel._shared(Expiry)[1]
+    assert len(expiry.deadlines) == 1 and len(expiry._heap) < 70
+    assert rel.expire(now=1100) == []
+    assert rel.expire(now=1199) == [(1, 'a')]
+
+def test_object_relations():
+    mgr = Manager()
+    rel = mgr.make(ManyToMany)
+    buff, hero, villain = mgr.make_many(Item, [()] * 3)
+    rel.set(hero, buff, ttl=5, now=0)
+    rel.inverse.set(buff, villain, ttl=3, now=0)
+    assert rel.expire(now=4) == [(villain, buff)]
+    assert rel.inverse.expire(now=5) == [(buff, hero)]
+    assert len(rel.map) == 0
+
+def test_rejected_pairs_are_not_scheduled():
+    mgr = Manager()
+    rel = mgr.make(OneToOne)
+    a, b, c = mgr.make_many(Item, [()] * 3)
+    rel[a] = b
+    with pytest.raises(ValueError):
+        rel.set(c, b, ttl=1, now=0)
+    assert rel.expire(now=10) == [] and rel[a] is b
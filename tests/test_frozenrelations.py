@@ -0,0 +1,110 @@
+import pickle
+import pytest
+from frozenrelations import (freeze, frozenbidict, frozenmultidict,
+                             frozeninvertibledict)
+from objrelations import Manager, ManyToMany, OneToOne
+from relations import bidict, multidict, invertibledict, inversedict
+
+class Item():
+    pass
+
+def test_empty_relations():
+    for rel, cls in [(bidict(), frozenbidict), (multidict(), frozenmultidict)]:
+        frozen = freeze(rel)
+        assert type(frozen) is cls and len(frozen) == 0
+        assert list(frozen) == [] and len(frozen.inverse) == 0
+        with pytest.raises(KeyError):
+            frozen[1]
+        assert hash(frozen) == hash(freeze(rel))
+
+def test_bidict_and_inverse():
+    rel = bidict()
+    for key in range(-5, 50):
+        rel[key] = str(key)
+    frozen = rel.freeze()
+    assert dict(frozen.items()) == dict(rel.items())
+    assert frozen[-1] == '-1' and frozen[-2] == '-2'
+    assert frozen.inverse['-1'] == -1 and frozen.inverse.inverse is frozen
+    assert 50 not in frozen and [] not in frozen
+    rel[50] = '50'
+    assert 50 not in frozen
+
+def test_multidict_with_colliding_hashes():
+    rel = multidict()
+    for key in (-1, -2, 0):
+        for val in (-1, -2, 'a'):
+            rel[key] = val
+    frozen = freeze(rel)
+    assert hash(-1) == hash(-2)
+    assert frozen[-1] == frozen[-2] == frozenset({-1, -2, 'a'})
+    assert (-2, -1) in frozen and (-2, 'b') not in frozen
+    assert (5, 1) not in frozen and 'ab' not in frozen
+    assert frozen.inverse['a'] == frozenset({-1, -2, 0})
+    assert sorted(frozen.keys(), key=str) == [-1, -2, 0]
+    assert set(frozen) == set(rel) and len(frozen) == 9
+
+@pytest.mark.parametrize('cls, classes', [
+    (invertibledict, (frozeninvertibledict, frozenmultidict)),
+    (inversedict, (frozenmultidict, frozeninvertibledict)),
+])
+def test_single_valued_sides(cls, classes):
+    rel = cls()
+    rel[1] = 'a'
+    rel.inverse['a'] = 2 if cls is invertibledict else 1
+    frozen = freeze(rel)
+    assert (type(frozen), type(frozen.inverse)) == classes
+    assert set(frozen) == set(rel)
+    assert set(frozen.inverse) == set(rel.inverse)
+
+def test_read_only():
+    rel = multidict()
+    rel[1] = 2
+    frozen = freeze(rel)
+    for modify in (lambda: frozen.__setitem__(1, 3),
+                   lambda: frozen.__delitem__(1),
+                   lambda: frozen.discard((1, 2)),
+                   lambda: frozen.update([(1, 3)]),
+                   lambda: frozen.inverse.clear(),
+                   lambda: frozen.pop(1)):
+        with pytest.raises(TypeError):
+            modify()
+    assert set(frozen) == {(1, 2)}
+
+def test_hashable_and_pickled():
+    rel = bidict()
+    rel[1] = 2
+    rel[3] = 4
+    frozen = freeze(rel)
+    assert {frozen: 'x'}[freeze(rel)] == 'x'
+    assert frozen.freeze() is frozen
+    new, inverse = pickle.loads(pickle.dumps((frozen, frozen.inverse)))
+    assert type(new) is frozenbidict and inverse is new.inverse
+    assert hash(new) == hash(frozen) and new[3] == 4
+
+def test_object_relations():
+    mgr = Manager()
+    rel = mgr.make(ManyToMany)
+    a, b, c = mgr.make_many(Item, [()] * 3)
+    rel[a] = b
+    rel[a] = c
+    rel.addindex('last', lambda obj: obj is c)
+    frozen = rel.freeze()
+    assert type(frozen) is ManyToMany and frozen._m_manager is mgr
+    assert set(frozen[a]) == {b, c} and frozen.inverse[c] == (a,)
+    with pytest.raises(TypeError):
+        frozen[b] = c
+    assert frozen.where(a, last=True) == (c,)
+    assert hash(frozen) == hash(rel.freeze())
+    rel[b] = c
+    assert b not in frozen.keys() and frozen.inverse[c] == (a,)
+
+def test_one_to_one():
+    mgr = Manager()
+    rel = mgr.make(OneToOne)
+    a, b = mgr.make_many(Item, [()] * 2)
+    rel[a] = b
+    frozen = rel.freeze()
+    assert frozen[a] is b and frozen.inverse[b] is a
+    assert hash(frozen) == hash(rel.freeze())
+    with pytest.raises(TypeError):
+        del frozen[a]
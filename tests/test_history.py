@@ -0,0 +1,73 @@
+import pytest
+from history import History
+from relations import bidict, multidict
+
+def test_history_without_readers_stays_empty():
+    rel = multidict()
+    rel.versioned()
+    for n in range(1000):
+        rel[1] = n
+        rel.discard((1, n))
+    owner, history = rel._shared(History)
+    assert not history.removed[0] and not history.starts
+    assert history.floor == history.version
+
+def test_views_read_past_versions():
+    rel = multidict()
+    rel[1] = 'a'
+    view = rel.at(rel.versioned())
+    rel.discard((1, 'a'))
+    rel[1] = 'b'
+    assert set(view) == {(1, 'a')}
+    assert set(rel.at(rel.versioned())) == {(1, 'b')}
+
+def test_closing_oldest_view_raises_floor():
+    rel = multidict()
+    old = rel.at(rel.versioned())
+    rel[1] = 'a'
+    rel.discard((1, 'a'))
+    new = rel.at(rel.versioned())
+    rel[2] = 'b'
+    rel.discard((2, 'b'))
+    owner, history = rel._shared(History)
+    old.close()
+    assert history.floor == new.version
+    assert 1 not in history.removed[0]
+    assert 2 in history.removed[0]
+    assert set(new) == set()
+    new.close()
+    assert not history.removed[0] and not history.readers
+
+def test_bidict_reads_at_several_past_versions():
+    rel = bidict()
+    with pytest.raises(ValueError):
+        rel.at(0)
+    rel[1] = 'a'
+    first = rel.at(rel.versioned())
+    rel[1] = 'b'
+    rel[2] = 'a'
+    second = rel.at(rel.versioned())
+    del rel[1]
+    rel[1] = 'c'
+    assert dict(first) == {1: 'a'} and len(first) == 1
+    assert dict(second) == {1: 'b', 2: 'a'}
+    assert dict(rel.at(rel.versioned())) == {1: 'c', 2: 'a'}
+    assert dict(first.inverse) == {'a': 1}
+    assert second.inverse['b'] == 1
+    with pytest.raises(KeyError):
+        first[2]
+    with pytest.raises(ValueError):
+        rel.at(rel.versioned() + 1)
+
+def test_pairs_removed_and_added_again():
+    rel = multidict()
+    views = [rel.at(rel.versioned())]
+    for _ in range(3):
+        rel[1] = 'a'
+        views.append(rel.at(rel.versioned()))
+        rel.inverse.discard(('a', 1))
+        views.append(rel.at(rel.versioned()))
+    assert [(1, 'a') in view for view in views] == [
+        False, True, False, True, False, True, False
+    ]
+    assert views[3][1] == frozenset({'a'}) and list(views[4].keys()) == []
@@ -0,0 +1,81 @@
+import pytest
+from objrelations import Manager, ManyToMany, OneToMany
+
+class Thing():
+    def __init__(self, color=None, size=None):
+        self.color = color
+        self.size = size
+
+@pytest.fixture
+def world():
+    mgr = Manager()
+    owns = mgr.make(ManyToMany)
+    alice, bob = mgr.make_many(Thing, [(), ()])
+    red, blue, big = mgr.make_many(
+        Thing, [('red', 1), ('blue', 1), ('red', 9)]
+    )
+    owns.update([(alice, red), (alice, blue), (alice, big), (bob, red)])
+    return mgr, owns, alice, bob, red, blue, big
+
+def test_where_intersects_criteria(world):
+    mgr, owns, alice, bob, red, blue, big = world
+    owns.addindex('color')
+    owns.addindex('small', lambda thing: thing.size == 1)
+    assert set(owns.where(alice, color='red')) == {red, big}
+    assert owns.where(alice, color='red', small=True) == (red,)
+    assert owns.where(bob, color='blue') == ()
+    assert owns.where(None, color='red') == ()
+
+def test_index_follows_changes_through_the_inverse(world):
+    mgr, owns, alice, bob, red, blue, big = world
+    owns.addindex('color')
+    owns.inverse.discard((red, alice))
+    owns.inverse[blue] = bob
+    assert owns.where(alice, color='red') == (big,)
+    assert owns.where(bob, color='blue') == (blue,)
+    del owns[bob]
+    assert owns.where(bob, color='red') == ()
+
+def test_index_on_the_inverse_groups_keys(world):
+    mgr, owns, alice, bob, red, blue, big = world
+    alice.color = 'green'
+    owns.inverse.addindex('color')
+    assert owns.inverse.where(red, color='green') == (alice,)
+    assert owns.inverse.where(red, color=None) == (bob,)
+
+def test_reindex_after_a_property_changes(world):
+    mgr, owns, alice, bob, red, blue, big = world
+    owns.addindex('color')
+    blue.color = 'red'
+    assert owns.where(alice, color='blue') == (blue,)
+    owns.reindex('color')
+    assert set(owns.where(alice, color='red')) == {red, blue, big}
+
+def test_removed_index_stops_updating(world):
+    mgr, owns, alice, bob, red, blue, big = world
+    owns.addindex('color')
+    index = owns.indexes['color']
+    owns.removeindex('color')
+    owns.discard((alice, red))
+    assert red._m_id in index.lookup(alice._m_id, 'red')
+    with pytest.raises(KeyError):
+        owns.where(alice, color='red')
+
+def test_errors(world):
+    mgr, owns, alice, bob, red, blue, big = world
+    owns.addindex('color')
+    with pytest.raises(ValueError):
+        owns.addindex('color')
+    with pytest.raises(TypeError):
+        owns.where(alice)
+    with pytest.raises(KeyError):
+        owns.where(alice, shape='round')
+
+def test_index_on_an_empty_one_to_many():
+    mgr = Manager()
+    holds = mgr.make(OneToMany)
+    holds.addindex('color')
+    box, ball = mgr.make_many(Thing, [(), ('red',)])
+    assert holds.where(box, color='red') == ()
+    holds[box] = ball
+    assert holds.where(box, color='red') == (ball,)
@@ -0,0 +1,111 @@
+import pickle
+import pytest
+from instrumentation import instrument, uninstrument
+from objrelations import Manager, ManyToMany
+from relations import bidict, multidict
+
+class Item():
+    pass
+
+class Even(ManyToMany):
+    def validate(self, key, val):
+        return val._m_id % 2 == 0
+
+def test_counts_outermost_calls():
+    rel = multidict()
+    rel[1] = 2
+    stats = instrument(rel)
+    assert stats.highwater == 1
+    rel[1] = 3
+    rel[2] = 3
+    rel.discard((2, 3))
+    assert (1, 2) in rel and rel[1] == {2, 3}
+    assert stats.calls == {
+        '__setitem__': 2, 'discard': 1, '__contains__': 1, '__getitem__': 1
+    }
+    assert stats.highwater == 3 and len(rel) == 2
+    histogram = stats.histograms['__setitem__']
+    assert sum(histogram.values()) == 2
+    assert stats.seconds['__setitem__'] > 0
+
+def test_failed_calls_are_recorded():
+    rel = bidict()
+    stats = instrument(rel)
+    with pytest.raises(KeyError):
+        rel[1]
+    assert stats.calls == {'__getitem__': 1}
+    rel[1] = 2
+    assert rel[1] == 2
+
+def test_inverse_is_not_instrumented():
+    rel = bidict()
+    stats = instrument(rel)
+    rel[1] = 2
+    rel.inverse[3] = 4
+    assert rel[4] == 3
+    assert stats.calls['__setitem__'] == 1
+    assert stats.calls['__getitem__'] == 1
+    assert type(rel.inverse) is bidict
+
+def test_instrumenting_twice_and_uninstrumenting():
+    rel = bidict()
+    stats = instrument(rel)
+    assert instrument(rel) is stats
+    assert isinstance(rel, bidict) and type(rel) is not bidict
+    rel[1] = 2
+    assert uninstrument(rel) is stats
+    assert type(rel) is bidict and '_stats' not in vars(rel)
+    rel[3] = 4
+    assert stats.calls == {'__setitem__': 1}
+    with pytest.raises(ValueError):
+        uninstrument(rel)
+
+def test_pickles_uninstrumented():
+    rel = multidict()
+    instrument(rel)
+    rel[1] = 2
+    new = pickle.loads(pickle.dumps(rel))
+    assert type(new) is multidict and new[1] == {2}
+
+def test_rejected_validations():
+    mgr = Manager()
+    rel = mgr.make(Even)
+    a, b, c = mgr.make_many(Item, [()] * 3)
+    stats = instrument(rel)
+    for val in (a, b, c):
+        rel[a] = val
+    assert stats.validations == 3 and stats.rejections == 1
+    assert stats.calls['__setitem__'] == 3
+    assert stats.highwater == 2
+
+def test_inverse_relation_validation():
+    mgr = Manager()
+    rel = mgr.make(Even)
+    a, b = mgr.make_many(Item, [()] * 2)
+    inverse = rel.inverse
+    stats = instrument(inverse)
+    inverse[b] = a
+    inverse[a] = b
+    assert stats.validations == 2 and stats.rejections == 1
+    assert len(rel.map) == 1 and (b._m_id, a._m_id) in rel.map
+    uninstrument(inverse)
+    inverse[b] = b
+    assert stats.validations == 2 and len(rel.map) == 1
+
+def test_manager_stats_and_export():
+    mgr = Manager()
+    assert mgr.stats() == {}
+    rel = mgr.make(ManyToMany)
+    mgr.make(ManyToMany)
+    a, b = mgr.make_many(Item, [()] * 2)
+    instrument(rel)
+    rel[a] = b
+    reports = []
+    mgr.exporters.append(reports.append)
+    mgr.exportstats()
+    assert list(reports[0]) == [rel._m_id]
+    report = reports[0][rel._m_id]
+    assert report['type'] == 'ManyToMany'
+    assert report['calls'] == {'__setitem__': 1}
+    assert report['highwater'] == 1
+    assert report == pickle.loads(pickle.dumps(report))
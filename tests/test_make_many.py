@@ -0,0 +1,73 @@
+import pickle
+import weakref
+import pytest
+from instrumentation import instrument
+from objrelations import Entity, Manager, ManyToMany, OneToOne
+
+class Monster(Entity):
+    __slots__ = ('name', 'level')
+
+    def __init__(self, name, level=1):
+        if level < 1:
+            raise ValueError(level)
+        self.name = name
+        self.level = level
+
+class Item():
+    def __init__(self, name):
+        self.name = name
+
+def test_empty_rows():
+    mgr = Manager()
+    assert mgr.make_many(Item, []) == []
+    assert mgr.nextID == 1 and mgr.objects == {}
+
+def test_consecutive_ids():
+    mgr = Manager()
+    first = mgr.make(Item, 'first')
+    items = mgr.make_many(Item, (('a',), ('b',), ('c',)))
+    last = mgr.make(Item, 'last')
+    assert [item._m_id for item in items] == [2, 3, 4]
+    assert [item.name for item in items] == ['a', 'b', 'c']
+    assert last._m_id == 5 and mgr.nextID == 6
+    assert all(mgr.objects[item._m_id] is item for item in items)
+    assert all(item._m_manager is mgr for item in items + [first])
+
+def test_failing_row_manages_nothing():
+    mgr = Manager()
+    mgr.make(Item, 'first')
+    with pytest.raises(ValueError):
+        mgr.make_many(Monster, [('orc',), ('imp', 0), ('elf',)])
+    assert mgr.nextID == 2 and list(mgr.objects) == [1]
+
+def test_entities_are_slotted():
+    mgr = Manager()
+    orc, imp = mgr.make_many(Monster, [('orc', 3), ('imp',)])
+    assert not hasattr(orc, '__dict__')
+    assert (orc._m_id, orc.name, orc.level) == (1, 'orc', 3)
+    assert imp.level == 1 and weakref.ref(imp)() is imp
+    with pytest.raises(AttributeError):
+        orc.hp = 10
+    new = pickle.loads(pickle.dumps(orc))
+    assert (new._m_id, new.name, new.level) == (1, 'orc', 3)
+
+def test_entities_in_relations():
+    mgr = Manager()
+    rel = mgr.make(OneToOne)
+    orc, imp = mgr.make_many(Monster, [('orc',), ('imp',)])
+    rel[orc] = imp
+    assert rel[orc] is imp and rel.inverse[imp] is orc
+    instrument(rel)
+    assert list(mgr.stats()) == [rel._m_id]
+    assert mgr.memory_usage()['total'] > 0
+
+def test_relations_made_under_a_savepoint_are_rolled_back():
+    mgr = Manager()
+    a, b = mgr.make_many(Item, [('a',), ('b',)])
+    savepoint = mgr.savepoint()
+    rel, other = mgr.make_many(ManyToMany, [(), ()])
+    rel[a] = b
+    other[b] = a
+    mgr.rollback(savepoint)
+    assert len(rel.map) == 0 and len(other.map) == 0
+    assert mgr.objects[rel._m_id] is rel
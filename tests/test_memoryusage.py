@@ -0,0 +1,28 @@
+from sys import getsizeof
+from relations import SAMPLESIZE, bidict, elementsize, multidict
+
+def test_inverse_shares_its_storage():
+    rel = multidict()
+    rel.update((key, -key) for key in range(5000))
+    seen = set()
+    usage = rel.memory_usage(seen)
+    assert usage['elements'] > 0
+    inverse = rel.inverse.memory_usage(seen)
+    assert inverse['total'] == inverse['object']
+
+def test_element_estimate():
+    elems = [str(n) * 3 for n in range(10 * SAMPLESIZE)]
+    exact = sum(map(getsizeof, elems))
+    assert abs(elementsize(elems, set()) - exact) < exact * 0.05
+    small = elems[:10]
+    assert elementsize(small, set()) == sum(map(getsizeof, small))
+
+def test_structures_are_measured():
+    rel = bidict()
+    for key in range(3000):
+        rel[key] = str(key)
+    usage = rel.memory_usage()
+    assert usage['_forward'] == getsizeof(rel._forward)
+    assert usage['total'] == sum(
+        size for name, size in usage.items() if name != 'total'
+    )
@@ -0,0 +1,107 @@
+import pickle
+import pytest
+from objrelations import Manager, ManyToMany, ManyToOne
+from relations import (bidict, multidict, bagdict, invertibledict,
+                       inversedict, indexedmultidict, dictplus, _pack)
+
+class Item():
+    pass
+
+def roundtrip(obj, protocol=pickle.HIGHEST_PROTOCOL):
+    return pickle.loads(pickle.dumps(obj, protocol))
+
+@pytest.mark.parametrize('cls', [bidict, multidict, bagdict, invertibledict,
+                                 inversedict, indexedmultidict])
+def test_empty_relations(cls):
+    rel = roundtrip(cls())
+    assert type(rel) is cls and len(rel) == 0
+    rel[1] = 2
+    assert rel.inverse[2] in (1, {1})
+
+def integerpairs():
+    rel = multidict()
+    for key in range(100):
+        rel[key] = key % 7
+        rel[key] = -key
+    return rel
+
+def test_integer_pairs_use_out_of_band_buffers():
+    rel = integerpairs()
+    buffers = []
+    data = pickle.dumps(rel, 5, buffer_callback=buffers.append)
+    assert len(buffers) == 2
+    with pytest.raises(pickle.UnpicklingError):
+        pickle.loads(data)
+    new = pickle.loads(data, buffers=buffers)
+    assert sorted(new) == sorted(rel)
+    assert new.inverse[3] == rel.inverse[3]
+
+@pytest.mark.parametrize('protocol', [2, 4, 5])
+def test_integer_pairs_are_packed(protocol):
+    rel = integerpairs()
+    keys, vals = _pack(list(rel), protocol)
+    assert memoryview(keys).nbytes == memoryview(vals).nbytes == 8 * len(rel)
+    new = pickle.loads(pickle.dumps(rel, protocol))
+    assert sorted(new) == sorted(rel)
+    assert new.inverse[-3] == {3}
+
+def test_mixed_pairs_are_lists():
+    rel = bidict()
+    rel[1] = 'a'
+    rel[2 ** 70] = 'b'
+    buffers = []
+    data = pickle.dumps(rel, 5, buffer_callback=buffers.append)
+    assert buffers == []
+    new = pickle.loads(data)
+    assert new.inverse['b'] == 2 ** 70 and new[1] == 'a'
+
+def test_inverse_pickles_by_reference():
+    rel = bidict()
+    rel[1] = 2
+    inverse = roundtrip(rel.inverse)
+    assert inverse[2] == 1 and inverse._isinverse
+    assert inverse.inverse[1] == 2
+    rel, inverse = roundtrip((rel, rel.inverse))
+    assert inverse is rel.inverse
+
+def test_inverse_is_rebuilt_lazily():
+    rel = multidict()
+    rel[1] = 2
+    rel.inverse
+    new = roundtrip(rel)
+    assert '_inverse' not in vars(new)
+    assert new.inverse[2] == {1}
+
+def test_bagdict_keeps_counts():
+    bag = bagdict()
+    bag.increment(1, 2, 3)
+    bag[4] = 2
+    new = roundtrip(bag)
+    assert new.count(1, 2) == 3 and new.inverse.count(2, 4) == 1
+    assert new.total() == bag.total()
+
+def test_dictplus():
+    new = roundtrip(dictplus({1: 2, 3: 4}))
+    assert type(new) is dictplus and new == {1: 2, 3: 4}
+
+def test_object_relations_and_inverse():
+    mgr = Manager()
+    owner = mgr.make(ManyToOne)
+    items = mgr.make_many(Item, [()] * 3)
+    for item in items:
+        owner[item] = items[0]
+    owners = owner.inverse
+    assert owners[items[0]] == tuple(items)
+    mgr, owner, owners, items = roundtrip((mgr, owner, owners, items))
+    assert owners is owner.inverse
+    assert owners[items[0]] == tuple(items)
+    with pytest.raises(ValueError):
+        owners[items[1]] = items[2]
+    del owner[items[2]]
+    assert owners[items[0]] == tuple(items[:2])
+
+def test_unlinked_relation():
+    mgr = Manager()
+    rel = mgr.make(ManyToMany)
+    new = roundtrip(rel)
+    assert len(new.map) == 0 and new._m_id == rel._m_id
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from objrelations import Manager, ManyToOne
+from remoterelations import connect, serve
+
+class Thing():
+    pass
+
+async def _session(check):
+    mgr = Manager()
+    rel = mgr.make(ManyToOne)
+    things = [mgr.make(Thing)._m_id for _ in range(3)]
+    server = await serve(mgr)
+    host, port = server.address[:2]
+    client = await connect(host, port, poolsize=2)
+    try:
+        await check(client, client.relation(rel._m_id), things)
+    finally:
+        await client.close()
+        await server.close()
+
+def test_reads_coalesce_until_a_write():
+    async def check(client, rel, things):
+        a, b, c = things
+        rel[a] = b
+        first = rel[a]
+        assert rel[a] is first
+        rel[a] = c
+        second = rel[a]
+        assert second is not first
+        assert await first == b
+        assert await second == c
+    asyncio.run(_session(check))
+
+def test_bad_requests_fail_alone():
+    async def check(client, rel, things):
+        a, b, _ = things
+        rel[a] = b
+        unknown = client.request('_object', rel.relID, a)
+        unencodable = client.request('get', rel.relID, object())
+        read = rel[a]
+        with pytest.raises(ValueError):
+            await unknown
+        with pytest.raises(TypeError):
+            await unencodable
+        assert await read == b
+        assert await rel.size() == 1
+    asyncio.run(_session(check))
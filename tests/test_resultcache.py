@@ -0,0 +1,75 @@
+import pickle
+from objrelations import Manager, ManyToMany, ManyToOne, OneToOne
+
+class Thing():
+    pass
+
+def make(cls, n):
+    mgr = Manager()
+    rel = mgr.make(cls)
+    return mgr, rel, mgr.make_many(Thing, [()] * n)
+
+def test_repeated_lookups_hit_the_cache():
+    mgr, rel, (a, b, c) = make(ManyToMany, 3)
+    rel.update([(a, b), (a, c)])
+    rel.enablecache()
+    assert set(rel[a]) == {b, c}
+    assert set(rel[a]) == {b, c}
+    assert (rel.cache.hits, rel.cache.misses) == (1, 1)
+
+def test_changes_invalidate_only_their_key():
+    mgr, rel, (a, b, c, d) = make(ManyToMany, 4)
+    rel.update([(a, b), (c, d)])
+    rel.enablecache()
+    rel[a], rel[c]
+    rel[a] = c
+    assert set(rel[a]) == {b, c}
+    assert rel[c] == (d,)
+    assert rel.cache.hits == 1
+    rel.inverse.discard((b, a))
+    assert rel[a] == (c,)
+
+def test_cache_on_the_inverse_relation():
+    mgr, rel, (a, b, c) = make(ManyToOne, 3)
+    rel[a] = c
+    rel.inverse.enablecache()
+    assert rel.inverse[c] == (a,)
+    rel[b] = c
+    assert set(rel.inverse[c]) == {a, b}
+    rel[a] = b
+    assert rel.inverse[c] == (b,)
+
+def test_least_recently_used_results_are_evicted():
+    mgr, rel, things = make(OneToOne, 6)
+    for key, val in zip(things[:3], things[3:]):
+        rel[key] = val
+    rel.enablecache(2)
+    rel[things[0]], rel[things[1]], rel[things[0]], rel[things[2]]
+    assert list(rel.cache.results) == [things[0]._m_id, things[2]._m_id]
+
+def test_disabling_and_missing_keys():
+    mgr, rel, (a, b) = make(ManyToMany, 2)
+    rel.enablecache()
+    try:
+        rel[a]
+    except KeyError:
+        pass
+    rel[a] = b
+    assert rel[a] == (b,)
+    rel.disablecache()
+    assert rel.cache is None and not rel.map._listeners
+    rel.discard((a, b))
+    assert (a, b) not in rel
+
+def test_pickled_cache_is_empty_and_listening():
+    mgr, rel, (a, b, c) = make(ManyToMany, 3)
+    rel[a] = b
+    rel.enablecache(16)
+    rel[a]
+    mgr2 = pickle.loads(pickle.dumps(mgr))
+    rel2 = mgr2.objects[rel._m_id]
+    a2, c2 = mgr2.objects[a._m_id], mgr2.objects[c._m_id]
+    assert rel2.cache.maxsize == 16 and not rel2.cache.results
+    rel2[a2]
+    rel2[a2] = c2
+    assert len(rel2[a2]) == 2
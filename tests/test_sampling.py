@@ -0,0 +1,107 @@
+import random
+import pytest
+from objrelations import Manager, ManyToMany
+from relations import indexedset, indexedmultidict
+
+class Loot(ManyToMany):
+    def __init__(self):
+        self.map = indexedmultidict()
+
+class Item():
+    pass
+
+def test_indexedset():
+    s = indexedset(range(5))
+    s.discard(0)
+    s.discard(0)
+    s.discard(4)
+    s.add(3)
+    assert sorted(s) == [1, 2, 3] and len(s) == 3
+    assert all(s._items[pos] == elem for elem, pos in s._pos.items())
+    assert set(s.sample(3)) == {1, 2, 3}
+    with pytest.raises(ValueError):
+        s.sample(4)
+    assert {s.pop() for _ in range(3)} == {1, 2, 3}
+    with pytest.raises(KeyError):
+        s.choice()
+    with pytest.raises(KeyError):
+        s.pop()
+
+def test_empty_indexedmultidict():
+    rel = indexedmultidict()
+    with pytest.raises(KeyError):
+        rel.random_pair()
+    with pytest.raises(KeyError):
+        rel.random_value(1)
+    with pytest.raises(KeyError):
+        rel.pop()
+    assert rel.sample(0) == []
+
+def test_random_choices_reach_every_pair():
+    random.seed(0)
+    rel = indexedmultidict()
+    for key in range(3):
+        for val in range(4):
+            rel[key] = val
+    assert {rel.random_pair() for _ in range(500)} == set(rel)
+    assert {rel.random_value(1) for _ in range(200)} == set(range(4))
+    assert {rel.inverse.random_value(2) for _ in range(200)} == {0, 1, 2}
+    assert set(rel.sample(12)) == set(rel)
+    with pytest.raises(KeyError):
+        rel.random_value(3)
+
+def test_pop_keeps_inverse_consistent():
+    random.seed(1)
+    rel = indexedmultidict()
+    for key in range(10):
+        rel[key] = key % 3
+    popped = set()
+    while rel:
+        key, val = rel.pop()
+        popped.add((key, val))
+        assert (val, key) not in rel.inverse
+        if key not in rel.keys():
+            with pytest.raises(KeyError):
+                rel.random_value(key)
+    assert popped == {(key, key % 3) for key in range(10)}
+    assert len(rel.inverse) == 0 and len(rel.inverse.keys()) == 0
+
+def test_inverse_pop_and_copy():
+    rel = indexedmultidict()
+    rel[1] = 'a'
+    rel[2] = 'a'
+    copy = rel.copy()
+    assert type(copy) is indexedmultidict
+    assert rel.inverse.pop()[0] == 'a'
+    assert len(rel) == 1 and len(copy) == 2
+    assert copy.random_value(1) == 'a'
+
+def test_object_relation_sampling():
+    random.seed(2)
+    mgr = Manager()
+    loot = mgr.make(Loot)
+    chest, gold, gem = mgr.make_many(Item, [()] * 3)
+    with pytest.raises(KeyError):
+        loot.random_value(chest)
+    loot[chest] = gold
+    loot[chest] = gem
+    assert loot.random_value(chest) in (gold, gem)
+    assert loot.inverse.random_value(gem) is chest
+    assert {loot.random_pair() for _ in range(100)} == {
+        (chest, gold), (chest, gem)
+    }
+    assert sorted(loot.sample(2), key=lambda pair: pair[1]._m_id) == [
+        (chest, gold), (chest, gem)
+    ]
+    key, val = loot.pop()
+    assert key is chest and loot[chest] == tuple({gold, gem} - {val})
+
+def test_plain_relation_pop():
+    mgr = Manager()
+    rel = mgr.make(ManyToMany)
+    a, b = mgr.make_many(Item, [()] * 2)
+    rel[a] = b
+    assert rel.pop() == (a, b)
+    assert len(rel.map) == 0
+    with pytest.raises(AttributeError):
+        rel.random_pair()
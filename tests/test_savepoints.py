@@ -0,0 +1,40 @@
+import pytest
+from objrelations import Manager, ManyToMany, OneToOne
+
+class Thing():
+    pass
+
+@pytest.fixture
+def mgr():
+    return Manager()
+
+def test_rollback_undoes_changes(mgr):
+    rel = mgr.make(ManyToMany)
+    a, b, c = (mgr.make(Thing) for _ in range(3))
+    rel[a] = b
+    sp = mgr.savepoint()
+    rel[a] = c
+    rel.discard((a, b))
+    mgr.rollback(sp)
+    assert set(rel[a]) == {b}
+
+def test_nested_savepoints_without_writes_are_distinct(mgr):
+    rel = mgr.make(ManyToMany)
+    a, b = mgr.make(Thing), mgr.make(Thing)
+    sp1 = mgr.savepoint()
+    sp2 = mgr.savepoint()
+    mgr.release(sp2)
+    rel[a] = b
+    mgr.rollback(sp1)
+    assert len(rel.map) == 0
+    with pytest.raises(ValueError):
+        mgr.rollback(sp2)
+
+def test_release_removes_recorders(mgr):
+    rel = mgr.make(OneToOne)
+    sp = mgr.savepoint()
+    assert rel.map._listeners
+    mgr.release(sp)
+    assert not rel.map._listeners
+    with pytest.raises(ValueError):
+        mgr.release(sp)
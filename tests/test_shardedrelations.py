@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from relations import bidict, multidict
+from shardedrelations import shardedbidict, shardedmultidict
+
+def test_shardedmultidict_matches_multidict():
+    pairs = [(key % 13, val) for key in range(100) for val in range(3)]
+    with ThreadPoolExecutor(2) as executor:
+        rel = shardedmultidict(4, executor=executor)
+        rel.update(pairs)
+        plain = multidict()
+        plain.update(pairs)
+        assert len(rel) == len(plain)
+        assert set(rel) == set(plain)
+        assert rel[5] == plain[5]
+        assert rel.inverse[1] == plain.inverse[1]
+        rel.discard((5, 0))
+        assert (5, 0) not in rel and len(rel) == len(plain) - 1
+        other = shardedmultidict(4, executor=executor)
+        other.update([(5, 0), (99, 99)])
+        assert set(rel.union(other)) == set(plain) | {(99, 99)}
+        assert set(rel.intersection(other)) == set()
+        assert len(rel.difference(other)) == len(rel)
+
+def test_shardedbidict_union_keeps_one_to_one():
+    left = shardedbidict(4)
+    right = shardedbidict(4)
+    for key in range(20):
+        left[key] = 'v{}'.format(key)
+    right[100] = 'v3'
+    with pytest.raises(ValueError):
+        left.union(right)
+    right = shardedbidict(4)
+    right[3] = 'other'
+    with pytest.raises(ValueError):
+        left.union(right)
+    right = shardedbidict(4)
+    right[100] = 'new'
+    right[3] = 'v3'
+    both = left.union(right)
+    assert len(both) == 21
+    assert dict(both.inverse.items()) == {
+        val: key for key, val in both.items()
+    }
+    assert isinstance(both.merge(), bidict)
+
+def test_shardedbidict_rejects_duplicate_value():
+    rel = shardedbidict(4)
+    rel[1] = 'x'
+    with pytest.raises(ValueError):
+        rel[2] = 'x'
+    rel[1] = 'y'
+    assert 'x' not in rel.inverse and rel.inverse['y'] == 1
+
+def test_update_runs_in_process_and_skips_duplicates():
+    class refusing():
+        def map(self, func, *iterables):
+            raise AssertionError('update must not use the executor')
+    rel = shardedmultidict(3, executor=refusing())
+    rel.update([(1, 'a'), (1, 'b')], [(1, 'a'), (2, 'a')])
+    assert len(rel) == len(rel.inverse) == 3
+    assert rel.inverse['a'] == {1, 2}
+    rel.update([])
+    assert len(rel) == 3
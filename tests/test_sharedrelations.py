@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+import pytest
+from relations import bidict, inversedict, invertibledict, multidict
+from sharedrelations import (
+    attach, publish, sharedbidict, sharedinvertibledict, sharedmultidict
+)
+
+@contextmanager
+def roundtrip(rel):
+    shared = publish(rel)
+    try:
+        attached = attach(shared.name)
+        try:
+            yield shared, attached
+        finally:
+            attached.close()
+    finally:
+        shared.unlink()
+
+def fill(rel, pairs):
+    for key, val in pairs:
+        rel[key] = val
+    return rel
+
+ONETOONE = [(1, 2), (3, 4), (None, 5)]
+
+@pytest.mark.parametrize('kind, views', [
+    (bidict, (sharedbidict, sharedbidict)),
+    (multidict, (sharedmultidict, sharedmultidict)),
+    (invertibledict, (sharedinvertibledict, sharedmultidict)),
+    (inversedict, (sharedmultidict, sharedinvertibledict)),
+])
+def test_views_keep_the_published_kind(kind, views):
+    rel = fill(kind(), ONETOONE)
+    with roundtrip(rel) as (shared, attached):
+        for view in (shared, attached):
+            assert type(view) is views[0]
+            assert type(view.inverse) is views[1]
+            if views[0] is sharedbidict:
+                assert dict(view.items()) == dict(ONETOONE)
+            else:
+                assert set(view) == set(ONETOONE)
+                assert (1, 2) in view and (2, 1) not in view
+            assert len(view.inverse) == len(ONETOONE)
+
+def test_multidict_pairs_and_inverse():
+    rel = fill(multidict(), [(1, 2), (1, 3), (4, 2)])
+    with roundtrip(rel) as (shared, attached):
+        assert attached[1] == frozenset({2, 3})
+        assert attached.inverse[2] == frozenset({1, 4})
+        assert set(attached.keys()) == {1, 4}
+        with pytest.raises(KeyError):
+            attached[2]
+        with pytest.raises(TypeError):
+            attached[5] = 6
+
+def test_empty_relation():
+    with roundtrip(multidict()) as (shared, attached):
+        assert len(attached) == 0 and list(attached) == []
+        assert (1, 2) not in attached.inverse
+
+def test_non_integer_pairs_are_rejected():
+    with pytest.raises(TypeError):
+        publish(fill(bidict(), [('a', 1)]))
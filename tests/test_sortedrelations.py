@@ -0,0 +1,92 @@
+import random
+import pytest
+from sortedrelations import sortedbidict, sortedlist, sortedmultidict
+
+class smalllist(sortedlist):
+    _load = 8
+
+def check(slist, expected):
+    assert list(slist) == expected
+    assert len(slist) == len(expected)
+    assert slist._maxes == [chunk[-1] for chunk in slist._lists]
+    assert all(chunk for chunk in slist._lists)
+    for pos, elem in enumerate(expected):
+        assert slist[pos] == elem
+        assert elem in slist
+
+def test_insertions_split_chunks():
+    slist = smalllist()
+    elems = random.Random(1).sample(range(1000), 200)
+    for elem in elems:
+        slist.add(elem)
+    check(slist, sorted(elems))
+    assert len(slist._lists) > 1
+    assert slist.bisect_left(elems[0]) == sorted(elems).index(elems[0])
+
+def test_removals_from_the_top_merge_the_last_chunk():
+    slist = sortedlist(range(1000))
+    for elem in range(999, 638, -1):
+        slist.remove(elem)
+    assert 638.5 not in slist
+    assert 639 not in slist
+    slist.discard(700)
+    check(slist, list(range(639)))
+
+def test_random_removals_keep_the_maxima():
+    rng = random.Random(2)
+    elems = list(range(300))
+    slist = smalllist(elems)
+    rng.shuffle(elems)
+    for count, elem in enumerate(elems[:250], 1):
+        slist.remove(elem)
+        if count % 25 == 0:
+            check(slist, sorted(elems[count:]))
+    with pytest.raises(ValueError):
+        slist.remove(elems[0])
+
+def test_ranges_and_slices():
+    slist = smalllist(range(0, 100, 2))
+    assert list(slist.irange(10, 20)) == [10, 12, 14, 16, 18]
+    assert list(slist.irange(10, 20, (False, True), True)) == [
+        20, 18, 16, 14, 12
+    ]
+    assert list(slist.islice(45, 60)) == [90, 92, 94, 96, 98]
+    assert list(sortedlist().irange()) == []
+    with pytest.raises(IndexError):
+        sortedlist()[0]
+
+def test_sortedmultidict_deletes_keys_from_the_top():
+    rel = sortedmultidict()
+    for key in range(3000):
+        rel[key] = key % 7
+    for key in range(2999, 1000, -1):
+        del rel[key]
+        assert key not in rel.keys()
+    assert 1000 in rel.keys()
+    assert rel.nth(-1) == 1000
+    assert list(rel.inverse.keys()) == list(range(7))
+
+def test_sortedmultidict_order_queries_and_inverse():
+    rel = sortedmultidict()
+    rel.update([(5, 'b'), (1, 'a'), (3, 'a'), (5, 'c')])
+    assert list(rel.keys()) == [1, 3, 5]
+    assert rel.rank(3) == 1 and rel.bisect(3) == 2
+    assert list(rel.irange(2, 6)) == [3, 5]
+    assert list(rel.inverse.keys()) == ['a', 'b', 'c']
+    rel.inverse.discard(('a', 1))
+    assert list(rel.keys()) == [3, 5]
+    rel.discard((5, 'b'))
+    assert list(rel.inverse.keys()) == ['a', 'c']
+
+def test_sortedbidict_keeps_keys_and_values_sorted():
+    rel = sortedbidict()
+    for key in (4, 2, 9):
+        rel[key] = -key
+    rel[2] = 10
+    assert list(rel) == [2, 4, 9]
+    assert list(rel.inverse) == [-9, -4, 10]
+    del rel.inverse[-4]
+    assert list(rel) == [2, 9]
+    assert rel.inverse.nth(0) == -9
+    with pytest.raises(KeyError):
+        del rel[4]
@@ -0,0 +1,91 @@
+import pytest
+from objrelations import Manager, ManyToMany
+from relations import bidict, multidict
+from traversal import bfs, components, csrgraph, khop, reachable
+
+class Character():
+    pass
+
+def chain_graph():
+    rel = multidict()
+    for node in range(1, 5):
+        rel[node] = node + 1
+    rel[1] = 3
+    rel[10] = 11
+    return rel
+
+def test_empty_graph():
+    graph = csrgraph(multidict())
+    assert len(graph) == 0 and graph.edgecount == 0
+    assert bfs(graph, [1]) == {} and khop(graph, [1], 3) == set()
+    assert components(graph) == [] and not reachable(graph, 1, 2)
+    with pytest.raises(KeyError):
+        graph.neighbors(1)
+
+def test_csrgraph():
+    graph = csrgraph(chain_graph())
+    assert len(graph) == 7 and graph.edgecount == 6
+    assert sorted(graph.neighbors(1)) == [2, 3]
+    assert graph.neighbors(5) == [] and graph.neighbors(11) == []
+    both = graph.symmetric()
+    assert both.undirected and both.symmetric() is both
+    assert both.edgecount == 12 and sorted(both.neighbors(3)) == [1, 2, 4]
+    assert csrgraph(chain_graph(), undirected=True).edgecount == 12
+
+def test_bfs_distances():
+    rel = chain_graph()
+    assert bfs(rel, [1]) == {1: 0, 2: 1, 3: 1, 4: 2, 5: 3}
+    assert bfs(rel, [1], maxdepth=1) == {1: 0, 2: 1, 3: 1}
+    assert bfs(rel, [4, 10, 99]) == {4: 0, 5: 1, 10: 0, 11: 1}
+    assert bfs(rel, [5]) == {5: 0} and bfs(rel, []) == {}
+    assert bfs(rel, [1], maxdepth=0) == {1: 0}
+
+def test_khop():
+    rel = chain_graph()
+    assert khop(rel, [1], 1) == {2, 3}
+    assert khop(rel, [1], 2) == {2, 3, 4}
+    assert khop(rel, [1, 2], 1) == {3}
+    assert khop(rel, [1], 0) == set() and khop(rel, [99], 2) == set()
+
+def test_cycles_and_reachability():
+    rel = chain_graph()
+    rel[5] = 1
+    graph = csrgraph(rel)
+    assert khop(graph, [1], 10) == {2, 3, 4, 5}
+    assert reachable(graph, 5, 4) and not reachable(graph, 5, 4, 2)
+    assert reachable(graph, 5, 4, 3)
+    assert not reachable(graph, 1, 10) and not reachable(graph, 1, 99)
+    assert reachable(graph, 99, 99) and not reachable(graph, 99, 1)
+
+def test_direction_is_followed():
+    rel = chain_graph()
+    assert not reachable(rel, 5, 1)
+    assert reachable(rel.inverse, 5, 1)
+    assert bfs(csrgraph(rel, undirected=True), [5])[1] == 3
+
+def test_components():
+    rel = chain_graph()
+    rel[20] = 20
+    parts = components(rel)
+    assert parts == [{1, 2, 3, 4, 5}, {10, 11}, {20}]
+    assert components(csrgraph(rel)) == parts
+
+def test_bidict():
+    rel = bidict()
+    rel[1] = 2
+    rel[2] = 3
+    assert bfs(rel, [1]) == {1: 0, 2: 1, 3: 2}
+    assert components(rel) == [{1, 2, 3}]
+
+def test_object_self_relation():
+    mgr = Manager()
+    knows = mgr.make(ManyToMany)
+    a, b, c, d = mgr.make_many(Character, [()] * 4)
+    knows[a] = b
+    knows[b] = c
+    knows[d] = d
+    assert khop(knows.map, [a._m_id], 2) == {b._m_id, c._m_id}
+    assert components(knows.map) == [
+        {a._m_id, b._m_id, c._m_id}, {d._m_id}
+    ]
+    assert csrgraph(knows.map).memory_usage()['total'] > 0
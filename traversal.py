@@ -0,0 +1,224 @@
+"""Traverses self-relations, such as friendships, as graphs.
+
+A relation whose keys and values are drawn from the same objects, such
+as a `ManyToMany` relation between characters, is a directed graph with
+an edge from each key to each of its values. The functions below take
+the ID-level map of such a relation, or a `csrgraph` snapshot of it,
+and answer traversal queries over the IDs.
+
+The traversals run one frontier at a time: the neighbors of a whole
+frontier are gathered by adding slices of a packed array into a set,
+and the nodes already visited are removed with a single set difference,
+so that the work per edge is done by the interpreter's C loops rather
+than by Python code. Building a `csrgraph` once and traversing it many
+times is cheaper than snapshotting the relation on every call.
+
+"""
+from array import array
+from collections import Counter
+from itertools import accumulate, chain, repeat
+from operator import itemgetter
+from customabcs import BiMapping
+from relations import memoryusage
+
+def _graph(rel, undirected=False):
+    if isinstance(rel, csrgraph):
+        return rel
+    return csrgraph(rel, undirected)
+
+class csrgraph():
+    """An immutable snapshot of a relation, as a graph in compressed
+    sparse row form.
+
+    The nodes are numbered in order of appearance, and the numbers of
+    the neighbors of each node are stored contiguously in a packed
+    array, so that the neighbors of a node are a single slice.
+
+    Attributes:
+        nodes (list): The ID of each node, by number.
+        index (dict): A dictionary mapping each ID to its node number.
+        offsets (array of int): The position in `targets` of the
+            neighbors of each node, followed by the number of edges.
+        targets (array of int): The numbers of the neighbors of every
+            node.
+        undirected (bool): Whether every edge was also added in reverse.
+
+    """
+    _structures = ('nodes', 'index', 'offsets', 'targets')
+
+    def __init__(self, rel, undirected=False):
+        """Builds the graph of the given relation.
+
+        Args:
+            rel (BiMapping, MultiMapping, or iterable of 2-tuple): The
+                relation, or the key-value pairs, holding the edges.
+            undirected (bool): Whether to also add every edge in
+                reverse, so that the graph can be traversed both ways.
+
+        """
+        pairs = list(rel.items() if isinstance(rel, BiMapping) else rel)
+        keys = list(map(itemgetter(0), pairs))
+        vals = list(map(itemgetter(1), pairs))
+        del pairs
+        self.nodes = list(dict.fromkeys(chain(keys, vals)))
+        self.index = dict(zip(self.nodes, range(len(self.nodes))))
+        self._build(
+            array('q', map(self.index.__getitem__, keys)),
+            array('q', map(self.index.__getitem__, vals)),
+            undirected
+        )
+
+    def _build(self, sources, dests, undirected):
+        if undirected:
+            sources, dests = sources + dests, dests + sources
+        counts = Counter(sources)
+        self.offsets = array('q', accumulate(
+            map(counts.get, range(len(self.nodes)), repeat(0)), initial=0
+        ))
+        order = sorted(range(len(sources)), key=sources.__getitem__)
+        self.targets = array('q', map(dests.__getitem__, order))
+        self.undirected = undirected
+
+    def symmetric(self):
+        """Returns the undirected graph holding the edges of this graph
+        in both directions, or the graph itself if it is undirected.
+
+        """
+        if self.undirected:
+            return self
+        graph = csrgraph.__new__(csrgraph)
+        graph.nodes = self.nodes
+        graph.index = self.index
+        offsets = self.offsets
+        sources = array('q')
+        for num in range(len(self.nodes)):
+            sources.extend(repeat(num, offsets[num + 1] - offsets[num]))
+        graph._build(sources, self.targets, True)
+        return graph
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def edgecount(self):
+        """The number of edges, counting both directions of the edges of
+        an undirected graph.
+
+        """
+        return len(self.targets)
+
+    def neighbors(self, nodeID):
+        """Returns the list of the IDs of the neighbors of the given
+        node. Raises a KeyError if the node is not in the graph.
+
+        """
+        num = self.index[nodeID]
+        start, end = self.offsets[num], self.offsets[num + 1]
+        return [self.nodes[target] for target in self.targets[start:end]]
+
+    def _numbers(self, nodeIDs):
+        return {self.index[nodeID] for nodeID in nodeIDs
+                if nodeID in self.index}
+
+    def _levels(self, frontier, maxdepth=None):
+        """Yields the sets of node numbers at each distance from the given
+        set of node numbers, starting with that set, up to `maxdepth`.
+
+        """
+        offsets = self.offsets
+        targets = self.targets
+        visited = set(frontier)
+        depth = 0
+        while frontier:
+            yield frontier
+            if depth == maxdepth:
+                return
+            reached = set()
+            for num in frontier:
+                reached.update(targets[offsets[num]:offsets[num + 1]])
+            reached -= visited
+            visited |= reached
+            frontier = reached
+            depth += 1
+
+    def memory_usage(self, seen=None):
+        """Returns the number of bytes used by the graph, broken down by
+        structure. See `relations.memoryusage`.
+
+        """
+        return memoryusage(self, seen)
+
+    def _elements(self):
+        return self.nodes
+
+def bfs(rel, sources, maxdepth=None):
+    """Returns a dictionary mapping the ID of each node reachable from
+    the given nodes, including them, to its distance from the nearest of
+    them, in number of edges. The search stops at `maxdepth` edges, if
+    given. Sources that are not in the graph are ignored.
+
+    Args:
+        rel (csrgraph, BiMapping, or MultiMapping): The graph, or the
+            ID-level map of a self-relation, such as `knows.map`.
+        sources (iterable): The IDs of the nodes to start from.
+        maxdepth (int, optional): The maximum distance to search.
+
+    """
+    graph = _graph(rel)
+    nodes = graph.nodes
+    return {
+        nodes[num]: depth
+        for depth, level in enumerate(
+            graph._levels(graph._numbers(sources), maxdepth)
+        )
+        for num in level
+    }
+
+def khop(rel, sources, k):
+    """Returns the set of the IDs of the nodes at most `k` edges away
+    from the given nodes, not counting those nodes themselves. The
+    arguments are the same as for `bfs`.
+
+    """
+    graph = _graph(rel)
+    levels = graph._levels(graph._numbers(sources), k)
+    next(levels, None)
+    nodes = graph.nodes
+    return {nodes[num] for level in levels for num in level}
+
+def reachable(rel, source, target, maxdepth=None):
+    """Returns whether the node `target` can be reached from the node
+    `source`, in at most `maxdepth` edges if given. The search stops as
+    soon as the target is found. A node can always reach itself.
+
+    """
+    if source == target:
+        return True
+    graph = _graph(rel)
+    goal = graph.index.get(target)
+    if goal is None:
+        return False
+    for level in graph._levels(graph._numbers((source,)), maxdepth):
+        if goal in level:
+            return True
+    return False
+
+def components(rel):
+    """Returns the connected components of the graph, ignoring the
+    direction of the edges, as a list of sets of node IDs, from the
+    largest to the smallest.
+
+    """
+    graph = _graph(rel, True).symmetric()
+    nodes = graph.nodes
+    unvisited = set(range(len(nodes)))
+    result = []
+    while unvisited:
+        start = unvisited.pop()
+        component = set()
+        for level in graph._levels({start}):
+            component |= level
+        unvisited -= component
+        result.append({nodes[num] for num in component})
+    result.sort(key=len, reverse=True)
+    return result